@@ -0,0 +1,2 @@
+from .engine import Backtest, BacktestResult, History
+from .stores import Stores, StrategyStore, InstructionStore, OrderStore
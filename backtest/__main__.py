@@ -0,0 +1,29 @@
+"""Backtest the strategies over recorded market books.
+
+Usage: python -m backtest <from date> <to date> [commission]
+e.g.   python -m backtest 2018-01-01 2018-04-01 0.05
+Books are read from the recorded history (see history) when settings.history_path is set, MongoDB otherwise.
+"""
+import logging
+import sys
+from datetime import datetime
+
+import history
+import settings
+from backtest import Backtest
+
+if len(sys.argv) < 3:
+    print(__doc__)
+    sys.exit(1)
+
+start_date = datetime.strptime(sys.argv[1], '%Y-%m-%d')
+end_date = datetime.strptime(sys.argv[2], '%Y-%m-%d')
+commission = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+# The strategies log every decision at INFO, which would swamp a months long run.
+logging.disable(logging.INFO)
+books = None
+if settings.history_path:
+    books = history.get_reader().get_market_books(start_date, end_date)
+result = Backtest(commission=commission).run(start_date, end_date, books)
+print(result.summary())
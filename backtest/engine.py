@@ -0,0 +1,254 @@
+import heapq
+import logging
+import traceback
+from datetime import timedelta
+
+import betbot_db
+import settings
+from strategies import helpers, registry
+from .stores import Stores
+
+# Set up logging
+logger = logging.getLogger('BTEST')
+logger.setLevel(helpers.get_log_level())
+ch = logging.StreamHandler()
+ch.setLevel(helpers.get_log_level())
+formatter = logging.Formatter('(%(name)s) - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+DEFAULT_STRATEGIES = registry.discover()
+
+# Event kinds, ordered so a market due to settle at the same moment another fires is settled first.
+SETTLE = 0
+FIRE = 1
+
+
+class BacktestResult(object):
+    def __init__(self):
+        self.curves = {}  # keys = strategy refs, vals = list of (settled date, cumulative pnl)
+        self.stats = {}  # keys = strategy refs, vals = bet counts and pnl
+        self.markets_played = 0
+        self.markets_skipped = 0
+
+    def get_pnl(self):
+        return sum(stats['pnl'] for stats in self.stats.values())
+
+    def get_max_drawdown(self):
+        """largest fall from a peak of the combined PnL of all strategies"""
+        orders = sorted((date, pnl) for curve in self.curves.values() for date, pnl in self.deltas(curve))
+        peak = equity = max_drawdown = 0.0
+        for date, pnl in orders:
+            equity += pnl
+            peak = max(peak, equity)
+            max_drawdown = max(max_drawdown, peak - equity)
+        return max_drawdown
+
+    @staticmethod
+    def deltas(curve=None):
+        previous = 0.0
+        for date, pnl in curve:
+            yield date, pnl - previous
+            previous = pnl
+
+    def add(self, order=None):
+        strategy_ref = order['customerStrategyRef']
+        stats = self.stats.setdefault(strategy_ref, {'bets': 0, 'won': 0, 'lost': 0, 'pnl': 0.0})
+        stats['bets'] += 1
+        stats['won' if order['betOutcome'] == 'WON' else 'lost'] += 1
+        stats['pnl'] += order['profit']
+        self.curves.setdefault(strategy_ref, []).append((order['settledDate'], stats['pnl']))
+
+    def summary(self):
+        lines = ['Played %s markets, skipped %s.' % (self.markets_played, self.markets_skipped)]
+        for strategy_ref in sorted(self.stats):
+            stats = self.stats[strategy_ref]
+            lines.append('%s: %s bets (%s won, %s lost), PnL = %.2f' %
+                         (strategy_ref, stats['bets'], stats['won'], stats['lost'], stats['pnl']))
+        return '\n'.join(lines)
+
+
+class History(object):
+    """the decoded markets, winners and market books of a backtest period"""
+    def __init__(self, start_date=None, end_date=None, markets=None, winners=None, books=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.markets = markets
+        self.winners = winners
+        self.books = books
+
+
+# Replays the market books recorded by the Market Book Manager through the strategies, in time order.
+# Books are read with a single cursor sorted by snapshot time and only the latest book of each market
+# still to be played is held in memory. Strategies fire offset seconds before the off, exactly as the
+# Strategy Manager does live, fill at the limit price they ask for (the orders are FILL_OR_KILL and
+# priced from the book's depth) and settle settle_delay seconds after the off using the winners
+# collection. Strategy state, instructions and orders live in memory for the length of the run.
+class Backtest(object):
+    def __init__(self, strategy_classes=None, offset=None, settle_delay=60, commission=0.0, batch_size=1000):
+        self.logger = logging.getLogger('BTEST')
+        self.strategy_classes = strategy_classes or DEFAULT_STRATEGIES
+        self.offset = timedelta(seconds=settings.strategy_fire_offset if offset is None else offset)
+        self.settle_delay = timedelta(seconds=settle_delay)
+        self.commission = commission
+        self.batch_size = batch_size
+        self.now = None
+        self.bet_count = 0
+        self.markets = {}
+        self.winners = {}
+        self.result = None
+
+    def load_markets(self, start_date=None, end_date=None):
+        markets = {}
+        for market in betbot_db.db.markets.find({'marketStartTime': {'$gte': start_date, '$lt': end_date}}):
+            markets[market['marketId']] = market
+        return markets
+
+    def load_winners(self, market_ids=None):
+        winners = {}
+        market_ids = list(market_ids)
+        for i in range(0, len(market_ids), self.batch_size):
+            for winner in betbot_db.db.winners.find({'marketId': {'$in': market_ids[i:i + self.batch_size]}}):
+                winners[winner['marketId']] = winner['selectionId']
+        return winners
+
+    def stream_books(self, start_date=None, end_date=None):
+        return betbot_db.db.market_books.find({
+            'snapshotTime': {'$gte': start_date - self.offset, '$lt': end_date}
+        }).sort('snapshotTime', 1).batch_size(self.batch_size)
+
+    def load_history(self, start_date=None, end_date=None, books=None):
+        """decodes the history of the markets starting between start_date and end_date in one pass,
+           keeping only the book each market is played on. returns History that can be replayed by
+           any number of runs with the same offset.
+        """
+        markets = self.load_markets(start_date, end_date)
+        fire_times = {market_id: market['marketStartTime'] - self.offset for market_id, market in markets.items()}
+        selected = {}  # keys = market ids, vals = book the market is played on
+        for book in books if books is not None else self.stream_books(start_date, end_date):
+            market_id = book['marketId']
+            if market_id not in markets:
+                continue
+            snapshot_time = book['snapshotTime']
+            if snapshot_time <= fire_times[market_id]:  # latest book before the market is played
+                selected[market_id] = book
+            elif market_id not in selected and snapshot_time < markets[market_id]['marketStartTime']:
+                selected[market_id] = book  # first book after, if there was none before
+        books = sorted(selected.values(), key=lambda b: b['snapshotTime'])
+        return History(start_date, end_date, markets, self.load_winners(markets.keys()), books)
+
+    def run(self, start_date=None, end_date=None, books=None, history=None):
+        """backtest the markets starting between start_date and end_date. returns BacktestResult.
+           books: OPTIONAL iterable of market books in snapshot time order (defaults to the
+           market_books collection)
+           history: OPTIONAL History from load_history, replayed without touching the database
+        """
+        if history:
+            start_date, end_date = history.start_date, history.end_date
+            self.markets = history.markets
+            self.winners = history.winners
+            books = history.books
+        else:
+            self.markets = self.load_markets(start_date, end_date)
+            self.winners = self.load_winners(self.markets.keys())
+        self.logger.info('Backtesting %s markets from %s to %s.' % (len(self.markets), start_date, end_date))
+        self.result = BacktestResult()
+        self.events = []
+        for market_id, market in self.markets.items():
+            heapq.heappush(self.events, (market['marketStartTime'] - self.offset, FIRE, market_id))
+        self.latest = {}  # keys = market ids, vals = latest book of markets yet to be played
+        self.waiting = set()  # markets due to be played that had no book yet
+        self.fired = set()  # markets that have been played or skipped
+        self.placed = {}  # keys = market ids, vals = orders awaiting settlement
+        with Stores(lambda: self.now) as self.stores:
+            self.now = start_date - self.offset
+            self.strategies = [strategy_class() for strategy_class in self.strategy_classes]
+            for book in books if books is not None else self.stream_books(start_date, end_date):
+                snapshot_time = book['snapshotTime']
+                self.process_events(snapshot_time)
+                market_id = book['marketId']
+                if market_id in self.waiting:
+                    self.waiting.discard(market_id)
+                    self.now = snapshot_time
+                    market = self.markets[market_id]
+                    if snapshot_time < market['marketStartTime']:
+                        self.play(market, book)
+                    else:
+                        self.result.markets_skipped += 1
+                elif market_id in self.markets and market_id not in self.fired:
+                    self.latest[market_id] = book
+            self.process_events()
+        self.result.markets_skipped += len(self.waiting)
+        return self.result
+
+    def process_events(self, until=None):
+        while self.events and (until is None or self.events[0][0] <= until):
+            event_time, kind, market_id = heapq.heappop(self.events)
+            self.now = event_time
+            if kind == FIRE:
+                self.fired.add(market_id)
+                book = self.latest.pop(market_id, None)
+                if book:
+                    self.play(self.markets[market_id], book)
+                else:  # play on the first book recorded before the off
+                    self.waiting.add(market_id)
+            else:
+                self.settle(market_id, self.winners.get(market_id), self.placed.pop(market_id, []))
+
+    def play(self, market=None, market_book=None):
+        orders = []
+        for strategy in self.strategies:
+            try:
+                bets = strategy.create_bets(market, market_book)
+            except Exception:
+                self.logger.debug('%s failed to create bets: %s' % (strategy.reference, traceback.format_exc()))
+                continue
+            for bet in bets:
+                if not bet['limitOrder']['price']:  # no price available, the order would not have been placed
+                    continue
+                self.bet_count += 1
+                bet_id = 'BT%s' % self.bet_count
+                self.stores.instruction_repo.insert(market, {
+                    'betId': bet_id,
+                    'instruction': bet,
+                    'placedDate': self.now,
+                    'strategyRef': strategy.reference,
+                    'settled': False
+                })
+                order = {
+                    'betId': bet_id,
+                    'marketId': market['marketId'],
+                    'selectionId': bet['selectionId'],
+                    'side': bet['side'],
+                    'placedDate': self.now,
+                    'priceMatched': bet['limitOrder']['price'],
+                    'sizeSettled': bet['limitOrder']['size'],
+                    'customerStrategyRef': strategy.reference
+                }
+                self.stores.order_repo.upsert([order])
+                orders.append(order)
+        if orders:
+            self.placed[market['marketId']] = orders
+            heapq.heappush(self.events, (market['marketStartTime'] + self.settle_delay, SETTLE, market['marketId']))
+        self.result.markets_played += 1
+
+    def settle(self, market_id='', winner=None, orders=None):
+        if winner is None:
+            self.logger.debug('No winner recorded for market %s, voiding %s bet(s).' % (market_id, len(orders)))
+            return
+        for order in orders:
+            selection_won = order['selectionId'] == winner
+            if order['side'] == 'BACK':
+                bet_outcome = 'WON' if selection_won else 'LOST'
+            else:  # LAY
+                bet_outcome = 'LOST' if selection_won else 'WON'
+            profit = helpers.calculate_profit(order['side'], order['sizeSettled'], order['priceMatched'], bet_outcome)
+            if profit > 0:
+                profit *= 1.0 - self.commission
+            settled_order = dict(order)
+            settled_order['betOutcome'] = bet_outcome
+            settled_order['profit'] = profit
+            settled_order['settledDate'] = self.now
+            self.stores.order_repo.upsert([settled_order])
+            self.stores.strategy_ledger.record([settled_order])
+            self.result.add(settled_order)
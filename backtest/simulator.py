@@ -0,0 +1,198 @@
+"""Vectorized Monte Carlo simulator for the staking state machines of the ladder strategies.
+
+Every function works on arrays shaped (paths, days, races per day): prices holds the favourite's
+back price in each race, wins whether the favourite won. The strategies' state machines run one
+race at a time, as they do live, but each step updates every path at once with array operations,
+so thousands of race sequences are simulated in the time the live code takes to play a handful.
+
+e.g. judging a change of stake ladder for the Bet 1-2 strategy:
+
+    prices, wins = sample_races(history_prices, history_wins, 10000, 90, 30)
+    for stake_ladder in [[1, 1, 2, 4, 8], [1, 2, 3, 4, 5, 6]]:
+        pnl = simulate_ladder(prices, wins, stake_ladder, settings.weight_ladder, 2.0, 3.0)
+        print(stake_ladder, risk_report(pnl, bankroll=500))
+"""
+import numpy
+
+import settings
+
+
+def sample_races(history_prices=None, history_wins=None, paths=1000, days=30, races=30, seed=None):
+    """bootstrap race sequences by resampling recorded (favourite price, favourite won) pairs"""
+    rng = numpy.random.RandomState(seed)
+    history_prices = numpy.asarray(history_prices, dtype=float)
+    history_wins = numpy.asarray(history_wins, dtype=bool)
+    index = rng.randint(0, len(history_prices), size=(paths, days, races))
+    return history_prices[index], history_wins[index]
+
+
+def sample_model(paths=1000, days=30, races=30, price_low=1.5, price_high=6.0, edge=1.0, seed=None):
+    """generate race sequences from a simple model: favourite prices drawn uniformly between price_low
+       and price_high, the favourite winning with probability edge / price (edge = 1.0 is a fair book)
+    """
+    rng = numpy.random.RandomState(seed)
+    prices = numpy.round(rng.uniform(price_low, price_high, size=(paths, days, races)), 2)
+    wins = rng.uniform(size=prices.shape) < numpy.minimum(edge / prices, 1.0)
+    return prices, wins
+
+
+def back_profit(stakes=None, prices=None, wins=None, commission=0.0):
+    return numpy.where(wins, stakes * (prices - 1.0) * (1.0 - commission), -stakes)
+
+
+def won_yesterday(day_pnl=None):
+    # betbot_cache.StrategyLedger.won_yesterday: no bets counts as a win
+    return day_pnl >= 0.0
+
+
+def update_weight(weight_pos=None, days_at_max=None, won=None, weight_count=0, played=None):
+    # Once a day weight ladder update shared by the stake ladder strategies. As live, it only sticks where the
+    # first race of the day is played: otherwise the strategy reverts its state and saves it with today's
+    # date, so the update is lost for the day.
+    at_max = weight_pos == weight_count - 1
+    new_days_at_max = numpy.where(won, 0, numpy.where(at_max, days_at_max + 1, days_at_max))
+    new_weight_pos = numpy.where(won, numpy.maximum(weight_pos - 1, 0), numpy.minimum(weight_pos + 1, weight_count - 1))
+    return numpy.where(played, new_weight_pos, weight_pos), numpy.where(played, new_days_at_max, days_at_max)
+
+
+def simulate_ladder(prices=None, wins=None, stake_ladder=None, weight_ladder=None, price_min=1.01,
+                    price_max=1000.0, minimum_stake=None, stake_multiplier=None, commission=0.0):
+    """simulates the stake/weight ladder of the Bet All (any price) and Bet 1-2 (2.0 - 3.0) strategies.
+       returns the profit of every bet, shaped like prices (0 where no bet was placed)
+    """
+    stake_ladder = numpy.asarray(stake_ladder or settings.stake_ladder, dtype=float)
+    weight_ladder = numpy.asarray(weight_ladder or settings.weight_ladder, dtype=float)
+    minimum_stake = settings.minimum_stake if minimum_stake is None else minimum_stake
+    stake_multiplier = settings.stake_multiplier if stake_multiplier is None else stake_multiplier
+    paths, days, races = prices.shape
+    pnl = numpy.zeros(prices.shape)
+    weight_pos = numpy.zeros(paths, dtype=int)
+    days_at_max = numpy.zeros(paths, dtype=int)
+    for day in range(days):
+        if day > 0:
+            first_price = prices[:, day, 0]
+            weight_pos, days_at_max = update_weight(weight_pos, days_at_max, won_yesterday(pnl[:, day - 1].sum(axis=1)),
+                                                    len(weight_ladder), (first_price >= price_min) & (first_price <= price_max))
+        stake_pos = numpy.zeros(paths, dtype=int)
+        bet_today = numpy.zeros(paths, dtype=bool)
+        last_won = numpy.ones(paths, dtype=bool)
+        for race in range(races):
+            price = prices[:, day, race]
+            eligible = (price >= price_min) & (price <= price_max)
+            # Once a race: a win resets the stake ladder, a loss climbs it, a loss at the top resets it.
+            update = eligible & bet_today
+            climb = update & ~last_won & (stake_pos < len(stake_ladder) - 1)
+            reset = update & (last_won | ~climb)
+            stake_pos = numpy.where(climb, stake_pos + 1, numpy.where(reset, 0, stake_pos))
+            stakes = stake_ladder[stake_pos] * weight_ladder[weight_pos] * minimum_stake * stake_multiplier
+            won = wins[:, day, race]
+            pnl[:, day, race] = numpy.where(eligible, back_profit(stakes, price, won, commission), 0.0)
+            last_won = numpy.where(eligible, won, last_won)
+            bet_today |= eligible
+    return pnl
+
+
+def simulate_odds(prices=None, wins=None, weight_ladder=None, max_price=None, max_losses=None, minimum_stake=None,
+                  commission=0.0):
+    """simulates the Bet Odds strategy: backs odds-on favourites, staking to recover the day's lost
+       stakes and stopping for the day after max_losses losses in a row. Unlike the live strategy, whose
+       stop loss is checked before its daily reset, the stop loss is lifted at the start of the next day.
+    """
+    weight_ladder = numpy.asarray(weight_ladder or settings.weight_ladder, dtype=float)
+    max_price = settings.bet_odds_max_price if max_price is None else max_price
+    max_losses = settings.bet_odds_max_losses if max_losses is None else max_losses
+    minimum_stake = settings.minimum_stake if minimum_stake is None else minimum_stake
+    paths, days, races = prices.shape
+    pnl = numpy.zeros(prices.shape)
+    weight_pos = numpy.zeros(paths, dtype=int)
+    days_at_max = numpy.zeros(paths, dtype=int)
+    for day in range(days):
+        if day > 0:
+            weight_pos, days_at_max = update_weight(weight_pos, days_at_max, won_yesterday(pnl[:, day - 1].sum(axis=1)),
+                                                    len(weight_ladder), prices[:, day, 0] < max_price)
+        lost_stake_sum = numpy.zeros(paths)
+        losses = numpy.zeros(paths, dtype=int)
+        stop_loss = numpy.zeros(paths, dtype=bool)
+        bet_today = numpy.zeros(paths, dtype=bool)
+        last_won = numpy.ones(paths, dtype=bool)
+        last_stake = numpy.zeros(paths)
+        for race in range(races):
+            price = prices[:, day, race]
+            eligible = ~stop_loss & (price < max_price)
+            update = eligible & bet_today
+            lost = update & ~last_won
+            losses = numpy.where(update & last_won, 0, numpy.where(lost, losses + 1, losses))
+            lost_stake_sum = numpy.where(update & last_won, 0.0,
+                                         numpy.where(lost, lost_stake_sum + last_stake, lost_stake_sum))
+            adjusted_price = price - 1.0
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                recovery = (lost_stake_sum + adjusted_price) / adjusted_price
+            stakes = numpy.where(lost_stake_sum == 0, minimum_stake, recovery) * weight_ladder[weight_pos]
+            won = wins[:, day, race]
+            pnl[:, day, race] = numpy.where(eligible, back_profit(stakes, price, won, commission), 0.0)
+            last_won = numpy.where(eligible, won, last_won)
+            last_stake = numpy.where(eligible, stakes, last_stake)
+            bet_today |= eligible
+            # The stop loss is set while placing the bet that follows the max_losses-th loss.
+            stop_loss |= lost & (losses == max_losses)
+    return pnl
+
+
+def simulate_group(prices=None, wins=None, stake_ladder=None, starting_stake=100.0, price_min=2.0, price_max=3.0,
+                   commission=0.0):
+    """simulates the Group 5 Bet 1-2 strategy: races are played in groups of len(stake_ladder), climbing
+       the stake ladder after each loss and stopping for the rest of the group after a win
+    """
+    stake_ladder = numpy.asarray(stake_ladder or [1, 1, 2, 2, 4], dtype=float)
+    group_size = len(stake_ladder)
+    paths, days, races = prices.shape
+    pnl = numpy.zeros(prices.shape)
+    group_pos = numpy.full(paths, -1, dtype=int)
+    stop = numpy.zeros(paths, dtype=bool)
+    last_won = numpy.ones(paths, dtype=bool)  # no previous bet counts as a win
+    for day in range(days):
+        for race in range(races):
+            price = prices[:, day, race]
+            next_pos = group_pos + 1
+            next_stop = stop | ((next_pos > 0) & last_won)
+            end_of_group = next_pos == group_size
+            next_pos = numpy.where(end_of_group, 0, next_pos)
+            next_stop &= ~end_of_group
+            eligible = ~next_stop & (price >= price_min) & (price <= price_max)
+            # The state only moves on when a bet is placed or the group is stopped, otherwise it is reverted.
+            commit = eligible | next_stop
+            group_pos = numpy.where(commit, next_pos, group_pos)
+            stop = numpy.where(commit, next_stop, stop)
+            stakes = starting_stake * stake_ladder[numpy.minimum(group_pos, group_size - 1)]
+            won = wins[:, day, race]
+            pnl[:, day, race] = numpy.where(eligible, back_profit(stakes, price, won, commission), 0.0)
+            last_won = numpy.where(eligible, won, last_won)
+    return pnl
+
+
+def risk_report(pnl=None, bankroll=0.0, percentiles=(5, 50, 95)):
+    """summarises simulated profits per path: final PnL and maximum drawdown distributions and the
+       risk of ruin, i.e. the share of paths whose losses reach the bankroll at any point
+    """
+    equity = numpy.cumsum(pnl.reshape(pnl.shape[0], -1), axis=1)
+    drawdown = numpy.maximum.accumulate(numpy.maximum(equity, 0.0), axis=1) - equity
+    max_drawdown = drawdown.max(axis=1)
+    report = {
+        'paths': pnl.shape[0],
+        'meanPnL': float(equity[:, -1].mean()),
+        'finalPnL': dict(zip(percentiles, numpy.percentile(equity[:, -1], percentiles).tolist())),
+        'maxDrawdown': dict(zip(percentiles, numpy.percentile(max_drawdown, percentiles).tolist()))
+    }
+    if bankroll:
+        report['riskOfRuin'] = float((equity.min(axis=1) <= -bankroll).mean())
+    return report
+
+
+def compare_ladders(prices=None, wins=None, stake_ladders=None, weight_ladders=None, bankroll=0.0, **kwargs):
+    """risk reports of simulate_ladder for every combination of candidate stake and weight ladders"""
+    reports = []
+    for stake_ladder in stake_ladders or [settings.stake_ladder]:
+        for weight_ladder in weight_ladders or [settings.weight_ladder]:
+            pnl = simulate_ladder(prices, wins, stake_ladder, weight_ladder, **kwargs)
+            reports.append((stake_ladder, weight_ladder, risk_report(pnl, bankroll)))
+    return reports
@@ -0,0 +1,83 @@
+import logging
+
+import betbot_cache
+import betbot_db
+from strategies import helpers
+
+
+# In-memory stand-ins for the betbot_db repositories (and the betbot_cache strategy ledger) the strategies use.
+# They answer the same queries against the backtest clock so strategy state evolves exactly as it
+# would live, without a single database write.
+class StrategyStore(object):
+    def __init__(self):
+        self.logger = logging.getLogger('BTEST')
+        self.strategies = {}  # keys = strategy refs, vals = strategy states
+
+    def get_by_reference(self, strategy_ref=''):
+        return self.strategies.get(strategy_ref)
+
+    def get_all(self):
+        return list(self.strategies.values())
+
+    def is_live(self, strategy_ref=''):
+        return False
+
+    def upsert(self, strategy_state=None):
+        if strategy_state:
+            strategy_state['updatedDate'] = helpers.utcnow()
+            self.strategies[strategy_state['strategyRef']] = strategy_state
+        return strategy_state
+
+
+class InstructionStore(object):
+    def __init__(self):
+        self.instructions = {}  # keys = bet ids, vals = instructions
+
+    def get_by_id(self, bet_id=''):
+        instruction = self.instructions.get(bet_id)
+        if instruction:
+            return instruction
+        else:
+            msg = 'Failed to find instruction %s' % bet_id
+            raise Exception(msg)
+
+    def insert(self, market=None, instruction=None):
+        instruction['marketId'] = market['marketId']
+        self.instructions[instruction['betId']] = instruction
+
+
+class OrderStore(object):
+    def __init__(self):
+        self.orders = {}  # keys = bet ids, vals = orders
+
+    def upsert(self, order_list=None):
+        for order in order_list or []:
+            self.orders[order['betId']] = order
+
+
+class Stores(object):
+    """installs the in-memory stores (and the backtest clock) in place of betbot_db for the
+       duration of a with block, restoring the real repositories afterwards
+    """
+    def __init__(self, clock=None):
+        self.clock = clock
+        self.strategy_repo = StrategyStore()
+        self.instruction_repo = InstructionStore()
+        self.order_repo = OrderStore()
+        self.strategy_ledger = betbot_cache.StrategyLedger(rehydrate=False)
+        self.saved = None
+
+    def __enter__(self):
+        self.saved = (betbot_db.strategy_repo, betbot_db.instruction_repo, betbot_db.order_repo,
+                      betbot_cache.strategy_ledger, helpers.clock)
+        betbot_db.strategy_repo = self.strategy_repo
+        betbot_db.instruction_repo = self.instruction_repo
+        betbot_db.order_repo = self.order_repo
+        betbot_cache.strategy_ledger = self.strategy_ledger
+        helpers.clock = self.clock
+        return self
+
+    def __exit__(self, *exc_info):
+        (betbot_db.strategy_repo, betbot_db.instruction_repo, betbot_db.order_repo,
+         betbot_cache.strategy_ledger, helpers.clock) = self.saved
+        return False
@@ -0,0 +1,87 @@
+"""Parameter sweep of the strategy settings over a backtest period.
+
+Usage: python -m backtest.sweep <grid.json> <from date> <to date> [processes]
+where grid.json maps settings names to the values to try, e.g.
+    {"stake_multiplier": [1.0, 2.0], "bet_12_max_price": [2.5, 3.0], "stake_ladder": [[1, 1, 2, 4, 8], [1, 2, 4]]}
+"""
+import itertools
+import json
+import logging
+import multiprocessing
+import sys
+from datetime import datetime
+
+import settings
+from .engine import Backtest
+
+# History shared with the worker processes. Workers are forked after it is loaded, so they read the
+# parent's copy rather than each decoding (or being sent) their own.
+history = None
+
+
+def expand_grid(grid=None):
+    """returns one settings dict per combination of the values in the grid"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def set_history(shared_history=None):
+    global history
+    history = shared_history
+
+
+def run_config(config=None, commission=0.0):
+    """backtest the shared history with the given settings, returns a row of the results table"""
+    for name, value in config.items():
+        if not hasattr(settings, name):
+            msg = 'Unknown setting %s in parameter grid.' % name
+            raise Exception(msg)
+        setattr(settings, name, value)
+    result = Backtest(commission=commission).run(history=history)
+    return {
+        'config': config,
+        'pnl': result.get_pnl(),
+        'maxDrawdown': result.get_max_drawdown(),
+        'bets': sum(stats['bets'] for stats in result.stats.values()),
+        'strategies': {strategy_ref: stats['pnl'] for strategy_ref, stats in result.stats.items()}
+    }
+
+
+def sweep(grid=None, start_date=None, end_date=None, processes=None, commission=0.0, shared_history=None):
+    """backtest every combination of the grid over a process pool. returns the results ranked by PnL."""
+    configs = expand_grid(grid)
+    set_history(shared_history or Backtest().load_history(start_date, end_date))
+    logging.getLogger('BTEST').info('Sweeping %s configurations over %s markets.' %
+                                    (len(configs), len(history.markets)))
+    if 'fork' in multiprocessing.get_all_start_methods():
+        pool = multiprocessing.get_context('fork').Pool(processes)
+    else:  # each worker is sent the history once
+        pool = multiprocessing.Pool(processes, set_history, (history, ))
+    try:
+        rows = pool.starmap(run_config, [(config, commission) for config in configs], chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    return sorted(rows, key=lambda row: row['pnl'], reverse=True)
+
+
+def format_table(rows=None):
+    lines = ['%4s %10s %10s %6s  %s' % ('rank', 'pnl', 'drawdown', 'bets', 'settings')]
+    for rank, row in enumerate(rows, 1):
+        lines.append('%4s %10.2f %10.2f %6s  %s' %
+                     (rank, row['pnl'], row['maxDrawdown'], row['bets'], json.dumps(row['config'], sort_keys=True)))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1]) as grid_file:
+        parameter_grid = json.load(grid_file)
+    from_date = datetime.strptime(sys.argv[2], '%Y-%m-%d')
+    to_date = datetime.strptime(sys.argv[3], '%Y-%m-%d')
+    pool_size = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    # The strategies log every decision at INFO, which would swamp the sweep.
+    logging.disable(logging.INFO)
+    print(format_table(sweep(parameter_grid, from_date, to_date, pool_size)))
@@ -0,0 +1,271 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from time import monotonic
+
+import betbot_db
+import settings
+from strategies import helpers
+
+# Set up logging
+logger = logging.getLogger('BBCACHE')
+logger.setLevel(helpers.get_log_level())
+ch = logging.StreamHandler()
+ch.setLevel(helpers.get_log_level())
+formatter = logging.Formatter('(%(name)s) - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+
+class MarketBookCache(object):
+    """thread-safe in-process cache of the latest market book per market, shared by all threads.
+       Books expire after ttl seconds, except CLOSED books which are final and never go stale.
+       When more than max_entries markets are held the least recently used are evicted.
+    """
+    def __init__(self, ttl=5.0, max_entries=200):
+        self.logger = logging.getLogger('BBCACHE')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.books = OrderedDict()  # keys = market ids, vals = (cached time, market book)
+
+    def get(self, market_id='', max_age=None):
+        """returns the cached book for the market if fresh enough, None otherwise"""
+        max_age = self.ttl if max_age is None else max_age
+        with self.lock:
+            entry = self.books.get(market_id)
+            if not entry:
+                return None
+            cached_time, market_book = entry
+            if market_book['status'] != 'CLOSED' and monotonic() - cached_time > max_age:
+                return None
+            self.books.move_to_end(market_id)
+        self.logger.debug('Market book cache hit for market %s.' % market_id)
+        return market_book
+
+    def put(self, market_book=None):
+        if market_book:
+            market_id = market_book['marketId']
+            with self.lock:
+                self.books[market_id] = (monotonic(), market_book)
+                self.books.move_to_end(market_id)
+                while len(self.books) > self.max_entries:
+                    self.books.popitem(last=False)
+        else:
+            msg = 'Failed to cache a market book, None provided.'
+            raise Exception(msg)
+
+    def invalidate(self, market_id=''):
+        with self.lock:
+            self.books.pop(market_id, None)
+
+
+class RunnerBookCache(object):
+    """thread-safe in-process cache of runner books keyed by (marketId, selectionId).
+       A runner book is a market book holding a single runner, as returned by listRunnerBook.
+       Caching a whole market book fills the cache for every runner in it.
+    """
+    def __init__(self, ttl=1.0, max_entries=4000):
+        self.logger = logging.getLogger('BBCACHE')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.books = OrderedDict()  # keys = (market id, selection id), vals = (cached time, runner book)
+
+    def get(self, market_id='', selection_id='', max_age=None):
+        """returns the cached runner book if fresh enough, None otherwise"""
+        max_age = self.ttl if max_age is None else max_age
+        key = (market_id, selection_id)
+        with self.lock:
+            entry = self.books.get(key)
+            if not entry:
+                return None
+            cached_time, runner_book = entry
+            if monotonic() - cached_time > max_age:
+                return None
+            self.books.move_to_end(key)
+        self.logger.debug('Runner book cache hit for selection %s in market %s.' % (selection_id, market_id))
+        return runner_book
+
+    def put_market_book(self, market_book=None):
+        """split the market book into runner books and cache them all. returns the runner books."""
+        if market_book:
+            runner_books = []
+            for runner in market_book['runners']:
+                runner_book = dict(market_book)
+                runner_book['runners'] = [runner]
+                runner_books.append(runner_book)
+            cached_time = monotonic()
+            with self.lock:
+                for runner_book in runner_books:
+                    key = (runner_book['marketId'], runner_book['runners'][0]['selectionId'])
+                    self.books[key] = (cached_time, runner_book)
+                    self.books.move_to_end(key)
+                while len(self.books) > self.max_entries:
+                    self.books.popitem(last=False)
+            return runner_books
+        else:
+            msg = 'Failed to cache runner books, no market book provided.'
+            raise Exception(msg)
+
+
+class WinnersRegistry(object):
+    """thread-safe process-wide map of market id to winning selection id, indicative (from the in-play
+       book) or scraped. Winners are written through to the winners collection only when they change
+       and subscribers are called, outside the lock, as soon as a market's winner is known or changes.
+       Markets not held are looked up in MongoDB once.
+    """
+    def __init__(self, max_entries=2000):
+        self.logger = logging.getLogger('BBCACHE')
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.winners = OrderedDict()  # keys = market ids, vals = selection ids (None if no winner was found)
+        self.subscribers = []  # callbacks taking (market id, selection id)
+
+    def subscribe(self, callback=None):
+        self.subscribers.append(callback)
+
+    def get(self, market_id=''):
+        """returns the winning selection id of the market, None if it isn't known"""
+        with self.lock:
+            if market_id in self.winners:
+                self.winners.move_to_end(market_id)
+                return self.winners[market_id]
+        winner = betbot_db.winners_repo.get_by_market(market_id)
+        selection_id = winner['selectionId'] if winner else None
+        with self.lock:
+            if market_id not in self.winners:  # unless put while it was being looked up
+                self.store(market_id, selection_id)
+            return self.winners[market_id]
+
+    def put(self, market_id='', selection_id=''):
+        with self.lock:
+            if self.winners.get(market_id) == selection_id:
+                self.winners.move_to_end(market_id)
+                return
+            self.store(market_id, selection_id)
+            # Written under the lock so MongoDB ends up with the same winner as memory. Changes are rare.
+            betbot_db.winners_repo.upsert({'marketId': market_id, 'selectionId': selection_id})
+        self.logger.debug('Winner of market %s is %s.' % (market_id, selection_id))
+        for callback in self.subscribers:
+            try:
+                callback(market_id, selection_id)
+            except Exception as exc:
+                self.logger.error('Winner subscriber failed: %s' % exc)
+
+    def store(self, market_id='', selection_id=''):
+        # The lock must be held.
+        self.winners[market_id] = selection_id
+        self.winners.move_to_end(market_id)
+        while len(self.winners) > self.max_entries:
+            self.winners.popitem(last=False)
+
+
+class StrategyLedger(object):
+    """thread-safe per-strategy record of settled orders: the last result, today's and yesterday's PnL
+       and the stake of the last order placed, each read in O(1) so strategies update their state without
+       querying MongoDB. Fed with the orders the Order Manager settles and rehydrated from MongoDB once,
+       on first use or by an explicit load() at startup. Orders are only counted once.
+    """
+    def __init__(self, rehydrate=True):
+        self.logger = logging.getLogger('BBCACHE')
+        self.lock = threading.Lock()
+        self.loaded = not rehydrate
+        self.last_settled = {}  # keys = strategy refs, vals = most recently settled order
+        self.last_placed = {}  # keys = strategy refs, vals = (placed date, stake) of the latest settled order placed
+        self.day_pnls = {}  # keys = (strategy ref, settled date), vals = PnL of the day
+        self.bet_ids = {}  # keys = settled dates, vals = bet ids of the orders recorded that day
+
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            yesterday = helpers.get_start_of_day() - timedelta(days=1)
+            orders = {order['betId']: order for order in betbot_db.order_repo.get_latest_settled_by_strategies()}
+            orders.update((order['betId'], order) for order in betbot_db.order_repo.get_settled_since(yesterday))
+            self.logger.debug('Rehydrating the strategy ledger from %s settled orders.' % len(orders))
+            self.store(orders.values())
+            self.loaded = True
+
+    def record(self, settled_orders=None):
+        """record the orders the Order Manager has settled (orders without a profit are ignored)"""
+        self.load()
+        with self.lock:
+            self.store(settled_orders or [])
+
+    def store(self, settled_orders=None):
+        # The lock must be held.
+        yesterday = helpers.utcnow().date() - timedelta(days=1)
+        for order in settled_orders:
+            if 'profit' not in order or 'settledDate' not in order:
+                continue
+            strategy_ref = order['customerStrategyRef']
+            settled_date = order['settledDate']
+            last_settled = self.last_settled.get(strategy_ref)
+            if not last_settled or settled_date >= last_settled['settledDate']:
+                self.last_settled[strategy_ref] = order
+            last_placed = self.last_placed.get(strategy_ref)
+            if 'placedDate' in order and (not last_placed or order['placedDate'] >= last_placed[0]):
+                self.last_placed[strategy_ref] = (order['placedDate'], order.get('sizeSettled'))
+            day = settled_date.date()
+            if day < yesterday or order['betId'] in self.bet_ids.get(day, ()):
+                continue
+            self.bet_ids.setdefault(day, set()).add(order['betId'])
+            self.day_pnls[(strategy_ref, day)] = self.day_pnls.get((strategy_ref, day), 0.0) + order['profit']
+        for day in [day for day in self.bet_ids if day < yesterday]:
+            del self.bet_ids[day]
+        for key in [key for key in self.day_pnls if key[1] < yesterday]:
+            del self.day_pnls[key]
+
+    def get_pnl(self, strategy_ref='', date=None):
+        """returns the PnL of the orders the strategy settled on the day of date (default today,
+           yesterday is also held), None if it settled none
+        """
+        self.load()
+        day = (date or helpers.utcnow()).date()
+        with self.lock:
+            return self.day_pnls.get((strategy_ref, day))
+
+    def won_yesterday(self, strategy_ref=''):
+        """return True if the strategy made a profit (or settled nothing) yesterday, False otherwise"""
+        pnl = self.get_pnl(strategy_ref, helpers.utcnow() - timedelta(days=1))
+        return pnl is None or pnl >= 0.0
+
+    def won_last_market(self, strategy_ref=''):
+        """return True if the most recent bet made by the strategy WON
+           or if there is no previous bet made by the strategy, False otherwise"""
+        self.load()
+        with self.lock:
+            order = self.last_settled.get(strategy_ref)
+        return not order or order.get('betOutcome') != 'LOST'
+
+    def won_last_market_today(self, strategy_ref=''):
+        """as won_last_market, counting only bets settled today"""
+        self.load()
+        with self.lock:
+            order = self.last_settled.get(strategy_ref)
+        if not order or order['settledDate'] < helpers.get_start_of_day():
+            return True
+        return order.get('betOutcome') != 'LOST'
+
+    def get_last_stake_today(self, strategy_ref=''):
+        """returns the stake of the latest settled order the strategy placed today, None if there isn't one"""
+        self.load()
+        with self.lock:
+            last_placed = self.last_placed.get(strategy_ref)
+        if not last_placed or last_placed[0] < helpers.get_start_of_day():
+            return None
+        return last_placed[1]
+
+
+market_book_cache = MarketBookCache(settings.market_book_cache_ttl, settings.market_book_cache_max_entries)
+runner_book_cache = RunnerBookCache(settings.runner_book_cache_ttl, settings.runner_book_cache_max_entries)
+winners_registry = WinnersRegistry(settings.winners_registry_max_entries)
+strategy_ledger = StrategyLedger()
+
+
+def cache_market_book(market_book=None):
+    """cache the market book and the runner books of all its runners"""
+    market_book_cache.put(market_book)
+    runner_book_cache.put_market_book(market_book)
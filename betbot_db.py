@@ -1,8 +1,13 @@
 import os
+import re
+import json
+import hashlib
 import logging
+import threading
 import dateutil.parser
 import pymongo
-from datetime import datetime, timedelta
+from queue import Queue
+from datetime import datetime, timedelta, timezone
 from pymongo import MongoClient
 from strategies import helpers
 
@@ -25,10 +30,34 @@ if not MONGODB_URI:
 db = MongoClient(MONGODB_URI).get_database()
 logger.info('Connected to MongoDB: %s' % db)
 
+# Betfair API-NG date format, e.g. 2017-05-01T14:30:00.000Z
+BETFAIR_DATE = re.compile(r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?Z$')
+# Date fields of orders, as (parent field or None, field)
+ORDER_DATE_FIELDS = [(None, 'placedDate'), ('itemDescription', 'marketStartTime'), (None, 'settledDate'),
+                     (None, 'matchedDate')]
+
+
+def parse_date(value=''):
+    """parse a Betfair date string to a (naive UTC) datetime, falling back to dateutil for other formats"""
+    match = BETFAIR_DATE.match(value)
+    if match:
+        year, month, day, hour, minute, second, fraction = match.groups()
+        microsecond = int(fraction.ljust(6, '0')) if fraction else 0
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond)
+    date = dateutil.parser.parse(value)
+    if date.tzinfo is not None:  # e.g. an offset other than Z
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    return date
+
+
+def get_content_hash(document=None):
+    return hashlib.md5(json.dumps(document, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
 
 class MarketRepository(object):
     def __init__(self):
         self.logger = logging.getLogger('BBDB')
+        self.content_hashes = {}  # keys = market ids, vals = hash of the market as last written by bulk_upsert
 
     def get_by_id(self, market_id=''):
         self.logger.debug('Retrieving market %s' % market_id)
@@ -44,11 +73,13 @@ class MarketRepository(object):
             market_start_time = market['marketStartTime']
             open_date = market['event']['openDate']
             if market_start_time and type(market_start_time) is str:
-                market['marketStartTime'] = dateutil.parser.parse(market_start_time)
+                market['marketStartTime'] = parse_date(market_start_time)
             if open_date and type(open_date) is str:
-                market['event']['openDate'] = dateutil.parser.parse(open_date)
-            # Pull out the runners and upsert separately.
+                market['event']['openDate'] = parse_date(open_date)
+            # Pull out the runners and upsert separately, keeping their selection ids.
             runners = market.pop('runners', None)
+            if runners and type(runners) is list:
+                market['runnerIds'] = [runner['selectionId'] for runner in runners]
             key = {'marketId': market['marketId']}
             self.logger.debug("Upserting market: %s" % market)
             db.markets.update(key, market, upsert=True)
@@ -59,6 +90,43 @@ class MarketRepository(object):
             msg = 'Failed to upsert a market, None provided.'
             raise Exception(msg)
 
+    def bulk_upsert(self, markets=None):
+        """upsert a refreshed list of markets (and their runners) with unordered bulk writes.
+           Markets are $set rather than replaced so played/errorCode flags survive a refresh, and
+           markets unchanged since the last refresh are not written at all.
+        """
+        if markets:
+            requests = []
+            hashes = {}
+            runners = []
+            for market in markets:
+                # convert datetime strings to proper date times for storing as ISODate
+                market_start_time = market['marketStartTime']
+                open_date = market['event']['openDate']
+                if market_start_time and type(market_start_time) is str:
+                    market['marketStartTime'] = parse_date(market_start_time)
+                if open_date and type(open_date) is str:
+                    market['event']['openDate'] = parse_date(open_date)
+                # Pull out the runners and upsert separately, keeping their selection ids.
+                market_runners = market.pop('runners', None)
+                if market_runners and type(market_runners) is list:
+                    market['runnerIds'] = [runner['selectionId'] for runner in market_runners]
+                    runners.extend(market_runners)
+                market_id = market['marketId']
+                content_hash = get_content_hash(market)
+                if self.content_hashes.get(market_id) != content_hash:
+                    hashes[market_id] = content_hash
+                    requests.append(pymongo.UpdateOne({'marketId': market_id}, {'$set': market}, upsert=True))
+            if requests:
+                self.logger.debug("Bulk upserting %s markets." % len(requests))
+                db.markets.bulk_write(requests, ordered=False)
+                self.content_hashes.update(hashes)
+            self.logger.info("Upserted %s of %s markets." % (len(requests), len(markets)))
+            runner_repo.bulk_upsert(runners)
+        else:
+            msg = 'Failed to upsert markets, None provided.'
+            raise Exception(msg)
+
     def set_played(self, market=None):
         """set the provided market as played (i.e. bets have been placed successfully)"""
         if market:
@@ -116,6 +184,14 @@ class MarketRepository(object):
             self.logger.debug("No next market found.")
             return None
 
+    def get_upcoming(self):
+        """returns all markets yet to start"""
+        self.logger.debug("Finding upcoming markets.")
+        markets = db.markets.find({
+            'marketStartTime': {'$gt': datetime.utcnow()}
+        })
+        return list(markets)
+
     def get_most_recently_played(self):
         self.logger.debug("Finding most recently played market.")
         markets = db.markets.find({
@@ -129,6 +205,10 @@ class MarketRepository(object):
             self.logger.debug("No most recently played market found.")
             return None
 
+    def get_starting_between(self, start_date=None, end_date=None):
+        """returns the markets starting from start_date up to end_date"""
+        return list(db.markets.find({'marketStartTime': {'$gte': start_date, '$lt': end_date}}))
+
     def get_by_time_and_venue(self, start_time=None, venue=None):
         if start_time and venue:
             market = db.markets.find_one({
@@ -179,44 +259,87 @@ class MarketBookRepository(object):
             if 'lastMatchTime' in market_book:
                 last_match_time = market_book['lastMatchTime']
                 if last_match_time and type(last_match_time) is str:
-                    market_book['lastMatchTime'] = dateutil.parser.parse(last_match_time)
-            # add a snapshot datetime
-            market_book['snapshotTime'] = datetime.utcnow()
+                    market_book['lastMatchTime'] = parse_date(last_match_time)
+            # add a snapshot datetime (unless queued with one by insert_async)
+            if 'snapshotTime' not in market_book:
+                market_book['snapshotTime'] = datetime.utcnow()
             db.market_books.insert_one(market_book)
             self.logger.debug("Inserted market book: %s" % market_book)
         else:
             msg = 'Failed to insert a market book, None provided.'
             raise Exception(msg)
 
+    def insert_async(self, market_book=None):
+        """queue a market book for insertion without blocking the caller"""
+        if market_book:
+            # insert() adds keys to the document, copy it so cached books are left untouched.
+            market_book = dict(market_book)
+            market_book['snapshotTime'] = datetime.utcnow()
+            write_behind.submit(self.insert, market_book)
+        else:
+            msg = 'Failed to insert a market book, None provided.'
+            raise Exception(msg)
+
 
 class RunnerBookRepository(object):
+    """runner book snapshots, one document per (marketId, selectionId) holding the latest book"""
     def __init__(self):
         self.logger = logging.getLogger('BBDB')
 
+    @staticmethod
+    def get_key(runner_book=None):
+        return {'marketId': runner_book['marketId'], 'selectionId': runner_book['runners'][0]['selectionId']}
+
     def upsert(self, runner_book=None):
         if runner_book:
+            key = self.get_key(runner_book)
+            runner_book['selectionId'] = key['selectionId']
             # add a snapshot datetime
             runner_book['snapshotTime'] = datetime.utcnow()
-            key = {'marketId': runner_book['marketId']}
             self.logger.debug("Upserting runner book: %s" % runner_book)
-            db.runner_books.update(key, runner_book, upsert=True)
+            db.runner_books.replace_one(key, runner_book, upsert=True)
         else:
             msg = 'Failed to upsert a runner book, None provided.'
             raise Exception(msg)
 
-    def get_recent_snapshot(self, selection_id=''):
-        self.logger.debug("Finding recent runner book snapshot for runner %s." % selection_id)
+    def bulk_upsert(self, runner_books=None):
+        """upsert all the runner books (e.g. every runner of a market book) in a single round-trip"""
+        if runner_books:
+            snapshot_time = datetime.utcnow()
+            requests = []
+            for runner_book in runner_books:
+                key = self.get_key(runner_book)
+                runner_book['selectionId'] = key['selectionId']
+                if 'snapshotTime' not in runner_book:
+                    runner_book['snapshotTime'] = snapshot_time
+                requests.append(pymongo.ReplaceOne(key, runner_book, upsert=True))
+            self.logger.debug("Bulk upserting %s runner books." % len(requests))
+            db.runner_books.bulk_write(requests, ordered=False)
+
+    def bulk_upsert_async(self, runner_books=None):
+        """queue the runner books for a bulk upsert without blocking the caller"""
+        if runner_books:
+            # bulk_upsert() adds keys to the documents, copy them so cached books are left untouched.
+            snapshot_time = datetime.utcnow()
+            copies = []
+            for runner_book in runner_books:
+                runner_book = dict(runner_book)
+                runner_book['snapshotTime'] = snapshot_time
+                copies.append(runner_book)
+            write_behind.submit(self.bulk_upsert, copies)
+
+    def get_recent_snapshot(self, market_id='', selection_id=''):
+        self.logger.debug("Finding recent runner book snapshot for runner %s in market %s." %
+                          (selection_id, market_id))
         one_second_ago = datetime.utcnow() - timedelta(seconds=1)
-        runner_books = db.runner_books.find({
+        runner_book = db.runner_books.find_one({
+            "marketId": market_id,
             "selectionId": selection_id,
             "snapshotTime": {"$gte": one_second_ago}
-        }).sort([("snapshotTime", -1)])
-        if runner_books.count() > 0:
-            runner_book = runner_books.next()
+        })
+        if runner_book:
             self.logger.debug("Found recent runner book snapshot for selection %s: %s" % (selection_id, runner_book))
-            return runner_book
-        else:
-            return None
+        return runner_book
 
 
 class RunnerBookResultRepository(object):
@@ -227,17 +350,19 @@ class RunnerBookResultRepository(object):
         if runner_book:
             # add a snapshot datetime
             runner_book['snapshotTime'] = datetime.utcnow()
-            key = {'marketId': runner_book['marketId']}
+            key = {'marketId': runner_book['marketId'], 'selectionId': runner_book['runners'][0]['selectionId']}
+            runner_book['selectionId'] = key['selectionId']
             self.logger.debug("Upserting runner book result: %s" % runner_book)
             db.runner_book_results.update(key, runner_book, upsert=True)
         else:
             msg = 'Failed to upsert a runner book result, None provided.'
             raise Exception(msg)
 
-    def get_recent_snapshot(self, selection_id=''):
+    def get_recent_snapshot(self, market_id='', selection_id=''):
         self.logger.debug("Finding recent runner book result snapshot for runner %s." % selection_id)
         one_second_ago = datetime.utcnow() - timedelta(seconds=1)
         runner_books = db.runner_book_results.find({
+            "marketId": market_id,
             "selectionId": selection_id,
             "snapshotTime": {"$gte": one_second_ago}
         }).sort([("snapshotTime", -1)])
@@ -252,13 +377,18 @@ class RunnerBookResultRepository(object):
 class RunnerRepository(object):
     def __init__(self):
         self.logger = logging.getLogger('BBDB')
+        self.content_hashes = {}  # keys = selection ids, vals = hash of the runner as last written by bulk_upsert
+
+    @staticmethod
+    def prepare(runner=None):
+        # Remove unnecessary keys if they exist.
+        runner.pop('handicap', None)
+        runner.pop('sortPriority', None)
+        runner['name_lower'] = runner['runnerName'].lower()
 
     def upsert(self, runner=None):
         if runner:
-            # Remove unnecessary keys if they exist.
-            runner.pop('handicap', None)
-            runner.pop('sortPriority', None)
-            runner['name_lower'] = runner['runnerName'].lower()
+            self.prepare(runner)
             key = {'selectionId': runner['selectionId']}
             self.logger.debug("Upserting runner: %s" % runner)
             db.runners.update(key, runner, upsert=True)
@@ -266,6 +396,24 @@ class RunnerRepository(object):
             msg = 'Failed to upsert a runner, None provided.'
             raise Exception(msg)
 
+    def bulk_upsert(self, runners=None):
+        """upsert runners with unordered bulk writes, skipping runners unchanged since the last call"""
+        if runners:
+            requests = {}  # keys = selection ids, a runner entered in several markets is written once
+            hashes = {}
+            for runner in runners:
+                self.prepare(runner)
+                selection_id = runner['selectionId']
+                content_hash = get_content_hash(runner)
+                if self.content_hashes.get(selection_id) != content_hash:
+                    hashes[selection_id] = content_hash
+                    requests[selection_id] = pymongo.UpdateOne(
+                        {'selectionId': selection_id}, {'$set': runner}, upsert=True)
+            if requests:
+                self.logger.debug("Bulk upserting %s runners." % len(requests))
+                db.runners.bulk_write(list(requests.values()), ordered=False)
+                self.content_hashes.update(hashes)
+
     def get_by_id(self, selection_id=''):
         runner = db.runners.find_one({'selectionId': selection_id})
         if runner:
@@ -275,6 +423,10 @@ class RunnerRepository(object):
             msg = 'Failed to find runner %s' % selection_id
             raise Exception(msg)
 
+    def get_by_ids(self, selection_ids=None):
+        """returns the runners with the given selection ids, in one query"""
+        return list(db.runners.find({'selectionId': {'$in': list(selection_ids or [])}}))
+
     def get_by_name(self, runner_name=''):
         runner = db.runners.find_one({
             "$or": [
@@ -309,7 +461,7 @@ class InstructionRepository(object):
             # convert datetime string to proper datetime for storing as ISODate
             placed_date = instruction['placedDate']
             if placed_date and type(placed_date) is str:
-                instruction['placedDate'] = dateutil.parser.parse(placed_date)
+                instruction['placedDate'] = parse_date(placed_date)
             instruction['marketId'] = market_id
             self.logger.debug("Inserting instruction: %s" % instruction)
             db.instructions.insert_one(instruction)
@@ -322,7 +474,7 @@ class InstructionRepository(object):
             # convert datetime string to proper datetime for storing as ISODate
             placed_date = instruction['placedDate']
             if placed_date and type(placed_date) is str:
-                instruction['placedDate'] = dateutil.parser.parse(placed_date)
+                instruction['placedDate'] = parse_date(placed_date)
             key = {'betId': instruction['betId']}
             self.logger.debug("Upserting instruction: %s" % instruction)
             db.instructions.update(key, instruction, upsert=True)
@@ -344,131 +496,107 @@ class InstructionRepository(object):
         return bets
 
     def set_settled(self, cleared_orders=None):
-        if cleared_orders is None:
-            cleared_orders = []
-        self.logger.debug("Setting instructions for cleared orders as settled: %s" % cleared_orders)
-        for order in cleared_orders:
-            bet_id = order['betId']
-            instruction = self.get_by_id(bet_id)
-            if instruction:
-                instruction['settled'] = True
-                self.logger.info('Marking instruction %s as settled: %s' % (bet_id, instruction))
-                self.upsert(instruction)
-            else:
-                msg = 'Instruction %s not found.' % bet_id
-                raise Exception(msg)
+        """mark the instructions of the cleared orders as settled, in a single update"""
+        bet_ids = list(set(order['betId'] for order in cleared_orders or []))
+        if not bet_ids:
+            return
+        self.logger.info('Marking instructions %s as settled.' % ', '.join(bet_ids))
+        result = db.instructions.update_many({'betId': {'$in': bet_ids}}, {'$set': {'settled': True}})
+        if result.matched_count < len(bet_ids):
+            msg = '%s of %s instructions not found.' % (len(bet_ids) - result.matched_count, len(bet_ids))
+            raise Exception(msg)
 
 
 class OrderRepository(object):
     def __init__(self):
         self.logger = logging.getLogger('BBDB')
 
+    @staticmethod
+    def convert_dates(order=None):
+        """convert date strings to datetimes (ISODates in MongoDB)"""
+        for parent, field in ORDER_DATE_FIELDS:
+            document = order.get(parent) if parent else order
+            if document and type(document.get(field)) is str:
+                document[field] = parse_date(document[field])
+        return order
+
     def upsert(self, order_list=None):
-        if order_list is None:
-            order_list = []
+        """upsert the orders with a single unordered bulk write"""
+        if not order_list:
+            return
         self.logger.debug('Upserting %s orders.' % len(order_list))
+        requests = []
         for order in order_list:
-            # convert date strings to datetimes (ISODates in MongoDB)
-            placed_date = None
-            if 'placedDate' in order:
-                placed_date = order['placedDate']
-            market_start_time = None
-            if 'itemDescription' in order:
-                market_start_time = order['itemDescription']['marketStartTime']
-            settled_date = None
-            if 'settledDate' in order:
-                settled_date = order['settledDate']
-            matched_date = None
-            if 'matchedDate' in order:
-                matched_date = order['matchedDate']
-            if placed_date and type(placed_date) is str:
-                order['placedDate'] = dateutil.parser.parse(placed_date)
-            if market_start_time and type(market_start_time) is str:
-                order['itemDescription']['marketStartTime'] = dateutil.parser.parse(market_start_time)
-            if settled_date and type(settled_date) is str:
-                order['settledDate'] = dateutil.parser.parse(settled_date)
-            if matched_date and type(matched_date) is str:
-                order['matchedDate'] = dateutil.parser.parse(matched_date)
-            key = {'betId': order['betId']}
-            self.logger.debug("Upserting order: %s" % order)
-            db.orders.update(key, order, upsert=True)
-
-    def get_settled_yesterday_by_strategy(self, strategy_ref=''):
-        self.logger.debug("Getting yesterday's settled orders for strategy %s." % strategy_ref)
-        now = datetime.utcnow()
-        today_sod = datetime(now.year, now.month, now.day, 0, 0)
-        yesterday_sod = today_sod - timedelta(days=1)
-        return list(db.orders.find({
-            "profit": {"$exists": True},
-            "customerStrategyRef": strategy_ref,
-            "settledDate": {'$gte': yesterday_sod, '$lt': today_sod}
-        }))
-
-    def get_latest_settled_by_strategy(self, strategy_ref=''):
-        self.logger.debug("Getting latest settled order for strategy %s." % strategy_ref)
-        settled_orders = db.orders.find({
-            "profit": {"$exists": True},
-            "customerStrategyRef": strategy_ref
-        }).sort('settledDate', pymongo.DESCENDING).limit(1)
-        if settled_orders.count() > 0:
-            return settled_orders[0]
-        else:
-            return None
-
-    def get_latest_today_by_strategy(self, strategy_ref):
-        now = datetime.utcnow()
-        today_sod = datetime(now.year, now.month, now.day, 0, 0)
-        today_eod = datetime(now.year, now.month, now.day, 23, 59)
-        latest_orders = db.orders.find({
-            "customerStrategyRef": strategy_ref,
-            "placedDate":  {'$gte': today_sod, '$lt': today_eod}
-        }).sort('placedDate', pymongo.DESCENDING).limit(1)
-        if latest_orders.count() > 0:
-            return latest_orders[0]
-        else:
-            return None
-
-    def get_latest_settled_today_by_strategy(self, strategy_ref):
-        now = datetime.utcnow()
-        today_sod = datetime(now.year, now.month, now.day, 0, 0)
-        today_eod = datetime(now.year, now.month, now.day, 23, 59)
-        settled_orders = db.orders.find({
-            "profit": {"$exists": True},
-            "customerStrategyRef": strategy_ref,
-            "settledDate": {'$gte': today_sod, '$lt': today_eod}
-        }).sort('settledDate', pymongo.DESCENDING).limit(1)
-        if settled_orders.count() > 0:
-            return settled_orders[0]
-        else:
-            return None
+            self.convert_dates(order)
+            requests.append(pymongo.ReplaceOne({'betId': order['betId']}, order, upsert=True))
+        db.orders.bulk_write(requests, ordered=False)
 
-    def get_pnls(self, start_date=None):
-        pipeline = []
-        if type(start_date) is datetime:
-            pipeline.append({'$match': {'placedDate': {'$gt': start_date}}})
-        pipeline.append({'$match': {'profit': {'$exists': True}}})
-        pipeline.append({'$group': {'_id': '$customerStrategyRef', 'pnl': {'$sum': '$profit'}}})
-        pnls = db.orders.aggregate(pipeline)
+    def get_settled_since(self, date=None):
+        """returns the orders settled since date, oldest first"""
+        self.logger.debug('Getting orders settled since %s.' % date)
+        return list(db.orders.find({
+            'profit': {'$exists': True},
+            'settledDate': {'$gte': date}
+        }).sort('settledDate', pymongo.ASCENDING))
+
+    def get_latest_settled_by_strategies(self):
+        """returns the most recently settled order of every strategy"""
+        self.logger.debug('Getting the latest settled order of every strategy.')
+        orders = db.orders.aggregate([
+            {'$match': {'profit': {'$exists': True}}},
+            {'$sort': {'settledDate': pymongo.DESCENDING}},
+            {'$group': {'_id': '$customerStrategyRef', 'order': {'$first': '$$ROOT'}}}
+        ], allowDiskUse=True)
+        return [order['order'] for order in orders]
+
+    def get_settled_report_rows(self, start_date=None, end_date=None):
+        """returns a cursor over the orders settled between start_date and end_date, joined to their
+           market and runner, sorted by strategy then settled date. Read from a secondary when there
+           is one, so reporting doesn't compete with order management.
+        """
+        orders = db.orders.with_options(read_preference=pymongo.ReadPreference.SECONDARY_PREFERRED)
+        return orders.aggregate([
+            {'$match': {'profit': {'$exists': True}, 'settledDate': {'$gte': start_date, '$lt': end_date}}},
+            {'$sort': {'customerStrategyRef': 1, 'settledDate': 1}},
+            {'$lookup': {'from': 'markets', 'localField': 'marketId', 'foreignField': 'marketId', 'as': 'market'}},
+            {'$lookup': {'from': 'runners', 'localField': 'selectionId', 'foreignField': 'selectionId', 'as': 'runner'}},
+            {'$project': {
+                '_id': 0, 'placedDate': 1, 'settledDate': 1, 'customerStrategyRef': 1, 'side': 1, 'sizeSettled': 1,
+                'priceMatched': 1, 'betOutcome': 1, 'profit': 1, 'venue': {'$arrayElemAt': ['$market.event.venue', 0]},
+                'marketName': {'$arrayElemAt': ['$market.marketName', 0]},
+                'runnerName': {'$arrayElemAt': ['$runner.runnerName', 0]}
+            }}
+        ], allowDiskUse=True, batchSize=1000)
+
+    def get_period_pnls(self, strategy_refs=None, date=None, end_date=None):
+        """returns the PnL of every strategy (or just strategy_refs) for the periods containing date
+           (default now), keyed by strategy ref then statistic field, e.g. {'BET_ALL': {'dailyPnL': 1.5, ...}}.
+           Orders placed from end_date on are left out, e.g. the PnLs as at the end of a past day.
+           All periods are summed in a single pass over the settled orders.
+        """
+        date = date or helpers.utcnow()
+        match = {'profit': {'$exists': True}}
+        if end_date is not None:
+            match['placedDate'] = {'$lt': end_date}
+        if strategy_refs is not None:
+            match['customerStrategyRef'] = {'$in': list(strategy_refs)}
+        group = {'_id': '$customerStrategyRef'}
+        for period, field, get_start in PNL_PERIODS:
+            start = get_start(date)
+            if start is None:
+                group[field] = {'$sum': '$profit'}
+            else:
+                group[field] = {'$sum': {'$cond': [{'$gte': ['$placedDate', start]}, '$profit', 0]}}
+        pnls = db.orders.aggregate([
+            {'$match': match},
+            {'$project': {'_id': 0, 'customerStrategyRef': 1, 'placedDate': 1, 'profit': 1}},
+            {'$group': group}
+        ])
         strategy_pnls = {}
         for pnl in pnls:
-            strategy_pnls[pnl['_id']] = pnl['pnl']
+            strategy_pnls[pnl.pop('_id')] = pnl
         return strategy_pnls
 
-    def get_daily_pnls(self):
-        return self.get_pnls(helpers.get_start_of_day())
-
-    def get_wtd_pnls(self):
-        return self.get_pnls(helpers.get_start_of_week())
-
-    def get_mtd_pnls(self):
-        return self.get_pnls(helpers.get_start_of_month())
-
-    def get_ytd_pnls(self):
-        return self.get_pnls(helpers.get_start_of_year())
-
-    def get_lifetime_pnls(self):
-        return self.get_pnls()
-
 
 class StrategyRepository(object):
     def __init__(self):
@@ -491,6 +619,7 @@ class StrategyRepository(object):
             strategy_state['updatedDate'] = datetime.utcnow()
             key = {'strategyRef': strategy_state['strategyRef']}
             db.strategies.update(key, strategy_state, upsert=True)
+        return strategy_state
 
 
 class StatisticRepository(object):
@@ -522,6 +651,98 @@ class StatisticRepository(object):
             db.statistics.update(key, statistic, upsert=True)
 
 
+# PnL ledger periods: (period, statistic field, start of the period containing a date)
+PNL_PERIODS = [
+    ('day', 'dailyPnL', helpers.get_start_of_day),
+    ('week', 'weeklyPnL', helpers.get_start_of_week),
+    ('month', 'monthlyPnL', helpers.get_start_of_month),
+    ('year', 'yearlyPnL', helpers.get_start_of_year),
+    ('lifetime', 'lifetimePnL', lambda date: None)
+]
+
+
+# Keeps strategy PnL current without aggregating the orders collection. Every settled order has one
+# entry in pnl_ledger, keyed by bet id, and its profit is added to the day, week, month, year and
+# lifetime buckets (pnl_buckets) of its placed date, so a period's PnL is a single bucket read and a
+# new period simply starts a new bucket. Recording an order again only applies the change in its
+# profit, if any, so settlements can be replayed safely. rebuild() recomputes everything from orders.
+class PnLLedgerRepository(object):
+    def __init__(self):
+        self.logger = logging.getLogger('BBDB')
+
+    @staticmethod
+    def get_bucket_keys(strategy_ref='', date=None):
+        return [{'strategyRef': strategy_ref, 'period': period, 'start': get_start(date)}
+                for period, field, get_start in PNL_PERIODS]
+
+    def record(self, cleared_orders=None):
+        """apply settled orders to the ledger, returns the refs of the strategies whose PnL changed"""
+        settled_orders = [order for order in cleared_orders or [] if 'profit' in order]
+        if not settled_orders:
+            return set()
+        previous_profits = {entry['betId']: entry['profit'] for entry in db.pnl_ledger.find(
+            {'betId': {'$in': [order['betId'] for order in settled_orders]}})}
+        entries = []
+        buckets = []
+        strategy_refs = set()
+        for order in settled_orders:
+            bet_id = order['betId']
+            strategy_ref = order['customerStrategyRef']
+            placed_date = order['placedDate']
+            if type(placed_date) is str:
+                placed_date = parse_date(placed_date)
+            pnl = order['profit'] - previous_profits.get(bet_id, 0.0)
+            bets = 0 if bet_id in previous_profits else 1
+            previous_profits[bet_id] = order['profit']  # the same bet twice in one batch
+            if pnl or bets:
+                entries.append(pymongo.UpdateOne({'betId': bet_id}, {'$set': {
+                    'strategyRef': strategy_ref, 'placedDate': placed_date, 'profit': order['profit']
+                }}, upsert=True))
+                for key in self.get_bucket_keys(strategy_ref, placed_date):
+                    buckets.append(pymongo.UpdateOne(key, {'$inc': {'pnl': pnl, 'bets': bets}}, upsert=True))
+                strategy_refs.add(strategy_ref)
+        if entries:
+            db.pnl_ledger.bulk_write(entries, ordered=False)
+            db.pnl_buckets.bulk_write(buckets, ordered=False)
+        self.logger.debug('Recorded %s order(s) in the PnL ledger.' % len(settled_orders))
+        return strategy_refs
+
+    def get_pnls(self, date=None):
+        """returns the PnL of every strategy for the periods containing date (default now), keyed by
+           strategy ref then statistic field, e.g. {'BET_ALL': {'dailyPnL': 1.5, ...}}
+        """
+        date = date or helpers.utcnow()
+        fields = {period: field for period, field, get_start in PNL_PERIODS}
+        buckets = db.pnl_buckets.find({'$or': [{'period': period, 'start': get_start(date)}
+                                               for period, field, get_start in PNL_PERIODS]})
+        strategy_pnls = {}
+        for bucket in buckets:
+            pnls = strategy_pnls.setdefault(bucket['strategyRef'], {field: 0.0 for field in fields.values()})
+            pnls[fields[bucket['period']]] = bucket['pnl']
+        return strategy_pnls
+
+    def rebuild(self):
+        """recompute the ledger and its buckets from the settled orders, returns the number of orders"""
+        self.logger.info('Rebuilding the PnL ledger from orders.')
+        entries = []
+        buckets = {}
+        for order in db.orders.find({'profit': {'$exists': True}}):
+            strategy_ref = order['customerStrategyRef']
+            entries.append({'betId': order['betId'], 'strategyRef': strategy_ref,
+                            'placedDate': order['placedDate'], 'profit': order['profit']})
+            for key in self.get_bucket_keys(strategy_ref, order['placedDate']):
+                bucket = buckets.setdefault((strategy_ref, key['period'], key['start']), dict(key, pnl=0.0, bets=0))
+                bucket['pnl'] += order['profit']
+                bucket['bets'] += 1
+        db.pnl_ledger.delete_many({})
+        db.pnl_buckets.delete_many({})
+        if entries:
+            db.pnl_ledger.insert_many(entries, ordered=False)
+            db.pnl_buckets.insert_many(list(buckets.values()), ordered=False)
+        self.logger.info('Rebuilt the PnL ledger from %s settled orders.' % len(entries))
+        return len(entries)
+
+
 class AccountFundsRepository(object):
     def __init__(self):
         self.logger = logging.getLogger('BBDB')
@@ -549,6 +770,28 @@ class WinnersRepository(object):
         return winner
 
 
+class WriteBehindQueue(threading.Thread):
+    """performs queued database writes on a background thread, off the caller's hot path"""
+    def __init__(self):
+        threading.Thread.__init__(self, name='WriteBehindQueue', daemon=True)
+        self.logger = logging.getLogger('BBDB')
+        self.queue = Queue()
+
+    def submit(self, write=None, *args):
+        self.queue.put((write, args))
+
+    def run(self):
+        while True:
+            write, args = self.queue.get()
+            try:
+                write(*args)
+            except Exception as exc:
+                self.logger.error('Background write %s failed: %s' % (write.__name__, exc))
+
+
+write_behind = WriteBehindQueue()
+write_behind.start()
+
 market_repo = MarketRepository()
 runner_repo = RunnerRepository()
 market_book_repo = MarketBookRepository()
@@ -558,5 +801,6 @@ instruction_repo = InstructionRepository()
 order_repo = OrderRepository()
 strategy_repo = StrategyRepository()
 statistic_repo = StatisticRepository()
+pnl_ledger_repo = PnLLedgerRepository()
 account_funds_repo = AccountFundsRepository()
 winners_repo = WinnersRepository()
@@ -1,17 +1,18 @@
 import os
 import json
 from .price_mod import convert_price, get_price_spread
-import requests
+from .transport import Transport
 
 class API(object):
     """betfair api-ng library"""
-    def __init__(self, aus = False, ssl_prefix = '', locale = ''):
+    def __init__(self, aus = False, ssl_prefix = '', locale = '', pool_maxsize = 10):
         """initiate the api-ng library.
         @aus: type = boolean. if True, use australian endpoints (default = UK exchange)
         @ssl_prefix: type = string. prefix for ssl certs, e.g. 'USERNAME' if certs
             are named 'USERNAME.key', 'USERNAME.crt' or 'USERNAME.pem'
         @locale: type = string. if empty, defaults to your account language.
             ISO codes: http://en.wikipedia.org/wiki/List_of_ISO_639-1_codes
+        @pool_maxsize: type = integer. keep-alive connections kept open per endpoint.
         """
         self.convert_price = convert_price # alias for price_mod function
         self.get_price_spread = get_price_spread # alias for price_mod function
@@ -21,6 +22,7 @@ class API(object):
         self.app_key = '' # Use create_app_keys() or see online api docs.
         self.locale = locale
         self.session_token = ''
+        self.transport = Transport(self.certs_paths, pool_maxsize)
 
     def load_ssl_cert_paths(self, ssl_prefix = ''):
         """loads the ssl cert filepaths.
@@ -74,11 +76,8 @@ class API(object):
         # check if we need to send app_key
         if 'DeveloperAppKeys' not in data: # NOT a get/createDeveloperAppKeys request
             headers['X-Application'] = self.app_key
-        # send request
-        if data: # POST
-            resp = requests.post(url, data, cert = ssl_cert, headers = headers, timeout = 60)
-        else: # GET
-            resp = requests.get(url, cert = ssl_cert, headers = headers, timeout = 60)
+        # send request over the pooled keep-alive transport
+        resp = self.transport.send(url, data, headers, ssl_cert)
         # check response
         if resp.status_code == 200:
             # save session token
@@ -92,6 +91,10 @@ class API(object):
             msg = 'HTTP %s. json = %s' % (resp.status_code, resp.json)
             raise Exception(msg)
 
+    def get_transport_stats(self):
+        """returns dict of request/handshake/reused connection counters per endpoint"""
+        return self.transport.get_stats()
+
     def login(self, username = '', password = ''):
         """login to betfair api-ng. returns string.
         @username: type = string
@@ -0,0 +1,143 @@
+import threading
+from concurrent.futures import Future
+from time import time, sleep
+
+# Betfair data request weights per market for listMarketBook priceProjection.priceData.
+# A single request must not exceed MAX_REQUEST_WEIGHT (weight per market * number of markets).
+# See: https://docs.developer.betfair.com/display/1smk3cen4v3lu3yomq5qye0ni/Market+Data+Request+Limits
+PRICE_DATA_WEIGHTS = {
+    'SP_AVAILABLE': 3,
+    'SP_TRADED': 7,
+    'EX_BEST_OFFERS': 5,
+    'EX_ALL_OFFERS': 17,
+    'EX_TRADED': 17
+}
+NO_PRICE_DATA_WEIGHT = 2
+MAX_REQUEST_WEIGHT = 200
+
+
+def get_market_weight(price_data = None):
+    """returns the request weight of a single market for the given priceData list.
+    NOTE: EX_ALL_OFFERS and EX_TRADED requested together only count as 17, not 34.
+    """
+    if not price_data:
+        return NO_PRICE_DATA_WEIGHT
+    weight = 0
+    for projection in set(price_data):
+        weight += PRICE_DATA_WEIGHTS[projection]
+    if 'EX_ALL_OFFERS' in price_data and 'EX_TRADED' in price_data:
+        weight -= PRICE_DATA_WEIGHTS['EX_TRADED']
+    return weight
+
+
+def get_max_markets(price_data = None):
+    """returns the maximum number of markets that fit in one listMarketBook request"""
+    return max(1, MAX_REQUEST_WEIGHT // get_market_weight(price_data))
+
+
+class MarketBookBatcher(threading.Thread):
+    """collects market book requests from all threads and serves them with as few
+    listMarketBook calls as possible. requests arriving within the same tick are
+    coalesced (one entry per market, however many callers want it) and packed into
+    requests up to the data weight limit for their priceProjection.
+    when a connected MarketStream is attached, books it holds are served straight from
+    memory and only markets missing from the stream are requested from the API.
+    NOTE: callers asking for the same market in the same tick share one book dict,
+    so books returned by the batcher should be treated as read-only.
+    """
+    def __init__(self, api, price_data = None, interval = 0.2, timeout = 30, market_stream = None):
+        """initiate the batcher.
+        @api: type = API. the betfair api-ng library used to fetch the books.
+        @price_data: type = list. default priceData used when callers don't supply one
+            (an empty list from a caller requests no price data, e.g. for runner statuses only).
+        @interval: type = float. minimum seconds between consecutive ticks.
+        @timeout: type = float. seconds a caller waits for its book before giving up.
+        @market_stream: type = MarketStream. OPTIONAL stream serving full ladder books.
+        """
+        threading.Thread.__init__(self, name='MarketBookBatcher', daemon=True)
+        self.api = api
+        self.price_data = price_data if price_data else ['EX_ALL_OFFERS']
+        self.interval = interval
+        self.timeout = timeout
+        self.market_stream = market_stream
+        self.condition = threading.Condition()
+        self.pending = {}  # keys = tuple of priceData, vals = dict of market id -> list of futures
+        self.last_tick = 0.0
+
+    def submit(self, market_ids = None, price_data = None):
+        """queue the given market ids for the next tick. returns list of futures."""
+        price_key = tuple(sorted(price_data if price_data is not None else self.price_data))
+        futures = []
+        with self.condition:
+            queued = self.pending.setdefault(price_key, {})
+            for market_id in market_ids:
+                future = Future()
+                queued.setdefault(market_id, []).append(future)
+                futures.append(future)
+            self.condition.notify()
+        return futures
+
+    def get_market_books(self, market_ids = None, price_data = None):
+        """returns market books for the given market ids, in the same order"""
+        if not market_ids:
+            return []
+        books = {}
+        if self.market_stream and self.market_stream.connected and price_data is None:
+            # Stale if the stream has been silent for longer than two heartbeats.
+            max_age = self.market_stream.heartbeat_ms * 2 / 1000.0
+            for market_id in market_ids:
+                book = self.market_stream.get_market_book(market_id, max_age)
+                if book:
+                    books[market_id] = book
+        missing = [market_id for market_id in market_ids if market_id not in books]
+        if missing:
+            futures = self.submit(missing, price_data)
+            for market_id, future in zip(missing, futures):
+                books[market_id] = future.result(self.timeout)
+        return [books[market_id] for market_id in market_ids]
+
+    def get_market_book(self, market_id = '', price_data = None):
+        """returns the market book for a single market id"""
+        return self.get_market_books([market_id], price_data)[0]
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+            # Throttle ticks; anything arriving while we wait joins this tick.
+            wait = self.last_tick + self.interval - time()
+            if wait > 0:
+                sleep(wait)
+            with self.condition:
+                pending = self.pending
+                self.pending = {}
+            self.last_tick = time()
+            for price_key, queued in pending.items():
+                self.fetch(list(price_key), queued)
+
+    def fetch(self, price_data = None, queued = None):
+        """fetch queued books in weight-limited chunks and resolve the callers' futures"""
+        market_ids = list(queued.keys())
+        chunk_size = get_max_markets(price_data)
+        for i in range(0, len(market_ids), chunk_size):
+            chunk = market_ids[i:i + chunk_size]
+            try:
+                books = self.api.get_market_books(chunk, price_data)
+                if type(books) is not list:
+                    raise Exception('Failed to get market books: resp = %s' % books)
+                books_by_id = {}
+                for book in books:
+                    books_by_id[book['marketId']] = book
+                for market_id in chunk:
+                    book = books_by_id.get(market_id)
+                    for future in queued[market_id]:
+                        if book:
+                            future.set_result(book)
+                        else:
+                            future.set_exception(Exception('No market book returned for %s' % market_id))
+            except Exception as exc:
+                for market_id in chunk:
+                    for future in queued[market_id]:
+                        if not future.done():
+                            future.set_exception(exc)
@@ -0,0 +1,152 @@
+"""betfair price ladder as integer tick indices.
+prices are compared as integer hundredths so float noise (e.g. 1.1 * 3 / 3) never mis-compares.
+all scalar lookups are O(log n) bisects over the 350 tick ladder, tick arithmetic is O(1).
+"""
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy
+except ImportError: # vectorized conversion falls back to plain python
+    numpy = None
+
+price_increments = [
+    1.01, 1.02, 1.03, 1.04, 1.05, 1.06, 1.07, 1.08, 1.09,
+    1.1, 1.11, 1.12, 1.13, 1.14, 1.15, 1.16, 1.17, 1.18, 1.19, 1.2,
+    1.21, 1.22, 1.23, 1.24, 1.25, 1.26, 1.27, 1.28, 1.29, 1.3, 1.31,
+    1.32, 1.33, 1.34, 1.35, 1.36, 1.37, 1.38, 1.39, 1.4, 1.41, 1.42,
+    1.43, 1.44, 1.45, 1.46, 1.47, 1.48, 1.49, 1.5, 1.51, 1.52, 1.53,
+    1.54, 1.55, 1.56, 1.57, 1.58, 1.59, 1.6, 1.61, 1.62, 1.63, 1.64,
+    1.65, 1.66, 1.67, 1.68, 1.69, 1.7, 1.71, 1.72, 1.73, 1.74, 1.75,
+    1.76, 1.77, 1.78, 1.79, 1.8, 1.81, 1.82, 1.83, 1.84, 1.85, 1.86,
+    1.87, 1.88, 1.89, 1.9, 1.91, 1.92, 1.93, 1.94, 1.95, 1.96, 1.97,
+    1.98, 1.99, 2.0, 2.02, 2.04, 2.06, 2.08, 2.1, 2.12, 2.14, 2.16,
+    2.18, 2.2, 2.22, 2.24, 2.26, 2.28, 2.3, 2.32, 2.34, 2.36, 2.38, 2.4,
+    2.42, 2.44, 2.46, 2.48, 2.5, 2.52, 2.54, 2.56, 2.58, 2.6, 2.62,
+    2.64, 2.66, 2.68, 2.7, 2.72, 2.74, 2.76, 2.78, 2.8, 2.82, 2.84,
+    2.86, 2.88, 2.9, 2.92, 2.94, 2.96, 2.98, 3.0, 3.05, 3.1, 3.15, 3.2,
+    3.25, 3.3, 3.35, 3.4, 3.45, 3.5, 3.55, 3.6, 3.65, 3.7, 3.75, 3.8,
+    3.85, 3.9, 3.95, 4.0, 4.1, 4.2, 4.3, 4.4, 4.5, 4.6, 4.7, 4.8, 4.9,
+    5.0, 5.1, 5.2, 5.3, 5.4, 5.5, 5.6, 5.7, 5.8, 5.9, 6.0, 6.2, 6.4,
+    6.6, 6.8, 7.0, 7.2, 7.4, 7.6, 7.8, 8.0, 8.2, 8.4, 8.6, 8.8, 9.0,
+    9.2, 9.4, 9.6, 9.8, 10.0, 10.5, 11.0, 11.5, 12.0, 12.5, 13.0, 13.5,
+    14.0, 14.5, 15.0, 15.5, 16.0, 16.5, 17.0, 17.5, 18.0, 18.5, 19.0,
+    19.5, 20.0, 21.0, 22.0, 23.0, 24.0, 25.0, 26.0, 27.0, 28.0, 29.0,
+    30.0, 32.0, 34.0, 36.0, 38.0, 40.0, 42.0, 44.0, 46.0, 48.0, 50.0,
+    55.0, 60.0, 65.0, 70.0, 75.0, 80.0, 85.0, 90.0, 95.0, 100.0, 110.0,
+    120.0, 130.0, 140.0, 150.0, 160.0, 170.0, 180.0, 190.0, 200.0,
+    210.0, 220.0, 230.0, 240.0, 250.0, 260.0, 270.0, 280.0, 290.0,
+    300.0, 310.0, 320.0, 330.0, 340.0, 350.0, 360.0, 370.0, 380.0,
+    390.0, 400.0, 410.0, 420.0, 430.0, 440.0, 450.0, 460.0, 470.0,
+    480.0, 490.0, 500.0, 510.0, 520.0, 530.0, 540.0, 550.0, 560.0,
+    570.0, 580.0, 590.0, 600.0, 610.0, 620.0, 630.0, 640.0, 650.0,
+    660.0, 670.0, 680.0, 690.0, 700.0, 710.0, 720.0, 730.0, 740.0,
+    750.0, 760.0, 770.0, 780.0, 790.0, 800.0, 810.0, 820.0, 830.0,
+    840.0, 850.0, 860.0, 870.0, 880.0, 890.0, 900.0, 910.0, 920.0,
+    930.0, 940.0, 950.0, 960.0, 970.0, 980.0, 990.0, 1000.0
+]
+
+# ladder in integer hundredths, e.g. 1.01 -> 101, 1000 -> 100000
+price_cents = [int(round(price * 100)) for price in price_increments]
+MIN_TICK = 0
+MAX_TICK = len(price_increments) - 1
+
+
+def to_cents(price = 0.0):
+    """returns the price in hundredths, rounded to 6dp so representation error is ignored"""
+    return round(price * 100, 6)
+
+def out_of_bounds(price = 0.0, pips = 0):
+    msg = 'PRICE_OUT_OF_BOUNDS (price = %s, pips = %s)' % (price, pips)
+    return Exception(msg)
+
+def price_to_tick(price = 0.0, round_up = True):
+    """returns the tick index of the given price. returns integer.
+    @price: type = float. any price between 1.01 and 1000, e.g. 3.485327
+    @round_up: type = boolean. if True, round UP to the nearest valid price, else round DOWN
+    NOTE: raises exception if price out of bounds (i.e. < 1.01 or > 1000)
+    """
+    cents = to_cents(price)
+    if cents < price_cents[0] or cents > price_cents[-1]:
+        raise out_of_bounds(price)
+    if round_up:
+        return bisect_left(price_cents, cents)
+    return bisect_right(price_cents, cents) - 1
+
+def tick_to_price(tick = 0):
+    """returns the price at the given tick index"""
+    if tick < MIN_TICK or tick > MAX_TICK:
+        msg = 'TICK_OUT_OF_BOUNDS (tick = %s)' % tick
+        raise Exception(msg)
+    return price_increments[tick]
+
+def is_valid_price(price = 0.0):
+    """returns True if the price is exactly on the ladder"""
+    cents = to_cents(price)
+    index = bisect_left(price_cents, cents)
+    return index <= MAX_TICK and price_cents[index] == cents
+
+def clamp_tick(tick = 0):
+    return min(max(tick, MIN_TICK), MAX_TICK)
+
+def clamp_price(price = 0.0, round_up = True):
+    """returns the nearest valid price, prices beyond the ladder are clamped to 1.01/1000"""
+    cents = to_cents(price)
+    if cents <= price_cents[0]:
+        return price_increments[MIN_TICK]
+    if cents >= price_cents[-1]:
+        return price_increments[MAX_TICK]
+    return price_increments[price_to_tick(price, round_up)]
+
+def add_ticks(price = 0.0, ticks = 0, round_up = True, clamp = False):
+    """returns the price the given number of ticks (pips) away. e.g. add_ticks(2.0, -2) = 1.98
+    @clamp: type = boolean. if True, stop at the ends of the ladder, else raise exception
+    """
+    cents = to_cents(price)
+    if cents < price_cents[0] or cents > price_cents[-1]:
+        raise out_of_bounds(price, ticks)
+    tick = price_to_tick(price, round_up) + ticks
+    if clamp:
+        tick = clamp_tick(tick)
+    elif tick < MIN_TICK or tick > MAX_TICK:
+        raise out_of_bounds(price, ticks)
+    return price_increments[tick]
+
+def tick_distance(price_a = 0.0, price_b = 0.0):
+    """returns the signed number of ticks from price_a to price_b (both must be valid prices)"""
+    if not is_valid_price(price_a) or not is_valid_price(price_b):
+        msg = 'INVALID PRICE INCREMENT!'
+        raise Exception(msg)
+    return price_to_tick(price_b) - price_to_tick(price_a)
+
+def prices_to_ticks(prices = None, round_up = True):
+    """vectorized price_to_tick. returns numpy array if numpy is installed, else list.
+    NOTE: raises exception if any price is out of bounds
+    """
+    if numpy is None:
+        return [price_to_tick(price, round_up) for price in prices]
+    cents = numpy.round(numpy.asarray(prices, dtype = float) * 100, 6)
+    if cents.size and (cents.min() < price_cents[0] or cents.max() > price_cents[-1]):
+        raise out_of_bounds(prices)
+    if round_up:
+        return numpy.searchsorted(ladder_cents, cents, side = 'left')
+    return numpy.searchsorted(ladder_cents, cents, side = 'right') - 1
+
+def ticks_to_prices(ticks = None):
+    """vectorized tick_to_price. returns numpy array if numpy is installed, else list."""
+    if numpy is None:
+        return [tick_to_price(tick) for tick in ticks]
+    return ladder_prices[numpy.asarray(ticks, dtype = int)]
+
+def convert_prices(prices = None, round_up = True, pips = 0):
+    """vectorized price conversion to valid betfair prices, see price_mod.convert_price"""
+    if numpy is None:
+        return [add_ticks(price, pips, round_up) for price in prices]
+    ticks = prices_to_ticks(prices, round_up) + pips
+    if ticks.size and (ticks.min() < MIN_TICK or ticks.max() > MAX_TICK):
+        raise out_of_bounds(prices, pips)
+    return ladder_prices[ticks]
+
+
+if numpy is not None:
+    ladder_cents = numpy.array(price_cents, dtype = float)
+    ladder_prices = numpy.array(price_increments, dtype = float)
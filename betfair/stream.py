@@ -0,0 +1,266 @@
+import json
+import socket
+import ssl
+import threading
+import logging
+from time import time, sleep
+
+# Set up logging
+logger = logging.getLogger('STREAM')
+
+
+class RunnerLadder(object):
+    """in-memory price ladder for one runner, built from ESA runner changes (rc)"""
+    def __init__(self, selection_id = 0):
+        self.selection_id = selection_id
+        self.status = 'ACTIVE'
+        self.sort_priority = 0
+        self.back = {} # keys = price, vals = size available to back
+        self.lay = {} # keys = price, vals = size available to lay
+        self.traded = {} # keys = price, vals = size traded
+        self.last_price_traded = None
+        self.total_matched = 0.0
+
+    @staticmethod
+    def update_levels(levels = None, changes = None):
+        """apply [price, size] changes to a ladder. a size of 0 removes the price level"""
+        for price, size in changes:
+            if size == 0:
+                levels.pop(price, None)
+            else:
+                levels[price] = size
+
+    def apply(self, rc = None):
+        """apply a runner change message to the ladder"""
+        if 'atb' in rc:
+            self.update_levels(self.back, rc['atb'])
+        if 'atl' in rc:
+            self.update_levels(self.lay, rc['atl'])
+        if 'trd' in rc:
+            self.update_levels(self.traded, rc['trd'])
+        if 'ltp' in rc:
+            self.last_price_traded = rc['ltp']
+        if 'tv' in rc:
+            self.total_matched = rc['tv']
+
+    def to_runner(self):
+        """returns the runner in listMarketBook format (as consumed by strategies.helpers)"""
+        runner = {
+            'selectionId': self.selection_id,
+            'handicap': 0.0,
+            'status': self.status,
+            'totalMatched': self.total_matched,
+            'ex': {
+                'availableToBack': [{'price': p, 'size': self.back[p]} for p in sorted(self.back, reverse=True)],
+                'availableToLay': [{'price': p, 'size': self.lay[p]} for p in sorted(self.lay)],
+                'tradedVolume': [{'price': p, 'size': self.traded[p]} for p in sorted(self.traded)]
+            }
+        }
+        if self.last_price_traded is not None:
+            runner['lastPriceTraded'] = self.last_price_traded
+        return runner
+
+
+class StreamMarket(object):
+    """in-memory market book for one market, built from ESA market changes (mc)"""
+    def __init__(self, market_id = ''):
+        self.market_id = market_id
+        self.definition = {}
+        self.runners = {} # keys = selection ids, vals = RunnerLadder
+        self.total_matched = 0.0
+        self.publish_time = 0
+        self.version = 0
+
+    def get_runner(self, selection_id = 0):
+        if selection_id not in self.runners:
+            self.runners[selection_id] = RunnerLadder(selection_id)
+        return self.runners[selection_id]
+
+    def apply(self, mc = None, publish_time = 0):
+        """apply a market change message. img = True replaces the cached market"""
+        if mc.get('img'):
+            self.runners = {}
+        if 'marketDefinition' in mc:
+            self.definition = mc['marketDefinition']
+            self.version = self.definition.get('version', self.version)
+            for runner_definition in self.definition.get('runners', []):
+                runner = self.get_runner(runner_definition['id'])
+                runner.status = runner_definition.get('status', runner.status)
+                runner.sort_priority = runner_definition.get('sortPriority', runner.sort_priority)
+        for rc in mc.get('rc', []):
+            self.get_runner(rc['id']).apply(rc)
+        if 'tv' in mc:
+            self.total_matched = mc['tv']
+        self.publish_time = publish_time
+
+    def to_market_book(self):
+        """returns the market in listMarketBook format (as consumed by strategies.helpers)"""
+        ladders = sorted(self.runners.values(), key=lambda r: r.sort_priority)
+        runners = [ladder.to_runner() for ladder in ladders]
+        return {
+            'marketId': self.market_id,
+            'isMarketDataDelayed': False,
+            'status': self.definition.get('status', 'OPEN'),
+            'inplay': self.definition.get('inPlay', False),
+            'betDelay': self.definition.get('betDelay', 0),
+            'complete': self.definition.get('complete', True),
+            'numberOfWinners': self.definition.get('numberOfWinners', 1),
+            'numberOfRunners': len(runners),
+            'numberOfActiveRunners': len([r for r in runners if r['status'] == 'ACTIVE']),
+            'totalMatched': self.total_matched,
+            'version': self.version,
+            'publishTime': self.publish_time,
+            'runners': runners
+        }
+
+
+class MarketStream(threading.Thread):
+    """betfair exchange stream api (ESA) client.
+    holds one persistent market subscription, applies the incremental mcm deltas to an
+    in-memory ladder per runner and serves market books in listMarketBook format.
+    reconnects automatically, resubscribing from the last clk so only missed deltas are sent.
+    """
+    def __init__(self, api, market_filter = None, fields = None, host = 'stream-api.betfair.com',
+            port = 443, use_ssl = True, heartbeat_ms = 5000, conflate_ms = 0, listener = None
+        ):
+        """initiate the stream.
+        @api: type = API. provides app_key and session_token for authentication.
+        @market_filter: type = dict. ESA marketFilter, e.g. {'marketIds': ['1.123']} or
+            {'eventTypeIds': ['7'], 'countryCodes': ['GB'], 'marketTypes': ['WIN']}
+        @fields: type = list. ESA marketDataFilter fields (default = full ladder, LTP and definition)
+        @host/@port/@use_ssl: stream endpoint. point at a local replay server for testing.
+        @listener: type = function. OPTIONAL callback, called with each market book that changed.
+        """
+        threading.Thread.__init__(self, name='MarketStream', daemon=True)
+        self.api = api
+        self.market_filter = market_filter if market_filter else {}
+        self.fields = fields if fields else ['EX_ALL_OFFERS', 'EX_TRADED', 'EX_TRADED_VOL', 'EX_LTP', 'EX_MARKET_DEF']
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.heartbeat_ms = heartbeat_ms
+        self.conflate_ms = conflate_ms
+        self.listener = listener
+        self.lock = threading.Lock()
+        self.markets = {} # keys = market ids, vals = StreamMarket
+        self.sock = None
+        self.reader = None
+        self.connected = False
+        self.running = True
+        self.message_id = 0
+        self.initial_clk = None
+        self.clk = None
+        self.last_message_time = 0.0
+        self.connection_id = None
+
+    def get_market_book(self, market_id = '', max_age = None):
+        """returns the reconstructed book for the market id, None if not held.
+        @max_age: type = float. OPTIONAL seconds since the last message (incl. heartbeats)
+            after which the stream is considered stale and None is returned.
+        """
+        if max_age is not None and time() - self.last_message_time > max_age:
+            return None
+        with self.lock:
+            market = self.markets.get(market_id)
+            return market.to_market_book() if market else None
+
+    def get_market_ids(self):
+        with self.lock:
+            return list(self.markets.keys())
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout = 30)
+        if self.use_ssl:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname = self.host)
+        # the server heartbeats every heartbeat_ms, silence for longer than that means a dead connection.
+        sock.settimeout(max(self.heartbeat_ms / 1000.0 * 3, 5))
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+
+    def send(self, op = '', **kwargs):
+        self.message_id += 1
+        msg = {'op': op, 'id': self.message_id}
+        msg.update(kwargs)
+        self.sock.sendall((json.dumps(msg) + '\r\n').encode('utf-8'))
+        return self.message_id
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError('Stream connection closed by server.')
+        self.last_message_time = time()
+        return json.loads(line.decode('utf-8'))
+
+    def authenticate(self):
+        self.send('authentication', appKey = self.api.app_key, session = self.api.session_token)
+
+    def subscribe(self):
+        params = {
+            'marketFilter': self.market_filter,
+            'marketDataFilter': {'fields': self.fields},
+            'heartbeatMs': self.heartbeat_ms,
+            'conflateMs': self.conflate_ms
+        }
+        if self.initial_clk and self.clk: # resubscribe, only deltas since clk are sent
+            params['initialClk'] = self.initial_clk
+            params['clk'] = self.clk
+        self.send('marketSubscription', **params)
+
+    def on_message(self, msg = None):
+        op = msg.get('op')
+        if op == 'connection':
+            self.connection_id = msg.get('connectionId')
+        elif op == 'status':
+            if msg.get('statusCode') == 'FAILURE':
+                msg = 'Stream error %s: %s' % (msg.get('errorCode'), msg.get('errorMessage'))
+                raise ConnectionError(msg)
+        elif op == 'mcm':
+            self.on_market_change(msg)
+
+    def on_market_change(self, msg = None):
+        if 'initialClk' in msg:
+            self.initial_clk = msg['initialClk']
+        if 'clk' in msg:
+            self.clk = msg['clk']
+        if msg.get('ct') == 'HEARTBEAT':
+            return
+        changed = []
+        with self.lock:
+            for mc in msg.get('mc', []):
+                market_id = mc['id']
+                if market_id not in self.markets:
+                    self.markets[market_id] = StreamMarket(market_id)
+                market = self.markets[market_id]
+                market.apply(mc, msg.get('pt', 0))
+                if self.listener:
+                    changed.append(market.to_market_book())
+        for market_book in changed:
+            self.listener(market_book)
+
+    def run(self):
+        while self.running:
+            try:
+                self.connect()
+                self.authenticate()
+                self.subscribe()
+                self.connected = True
+                logger.info('Market stream connected to %s:%s.' % (self.host, self.port))
+                while self.running:
+                    self.on_message(self.read())
+            except Exception as exc:
+                if self.running:
+                    logger.error('Market stream disconnected: %s' % exc)
+            finally:
+                self.connected = False
+                if self.sock:
+                    self.sock.close()
+            if self.running:
+                sleep(1) # Reconnect after a short pause.
+
+    def stop(self):
+        self.running = False
+        if self.sock:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
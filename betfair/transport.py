@@ -0,0 +1,91 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Transport(object):
+    """pooled, keep-alive http transport for the betfair api-ng library.
+    one requests.Session (and so one urllib3 connection pool) is kept per betfair
+    endpoint and shared by every thread using the API object, so TCP+TLS handshakes
+    are only paid when a pool has no idle connection to hand out.
+    """
+    ENDPOINTS = ['identitysso', 'account', 'betting', 'other']
+
+    def __init__(self, certs_paths = None, pool_maxsize = 10, timeout = 60):
+        """initiate the transport.
+        @certs_paths: type = list. ssl cert filepaths, used for identitysso requests only.
+        @pool_maxsize: type = integer. max idle connections kept open per endpoint.
+            should be at least the number of threads sharing the API object.
+        @timeout: type = integer. request timeout in seconds.
+        """
+        self.certs_paths = certs_paths
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.request_counts = {}
+        for endpoint in self.ENDPOINTS:
+            self.sessions[endpoint] = self.create_session(endpoint)
+            self.request_counts[endpoint] = 0
+
+    def create_session(self, endpoint = ''):
+        """returns a requests.Session with its own connection pool for the given endpoint"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if endpoint == 'identitysso':
+            session.cert = self.certs_paths
+        return session
+
+    @staticmethod
+    def get_endpoint(url = ''):
+        """returns the endpoint name used to pick a connection pool for the given url"""
+        if 'identitysso.betfair.com' in url:
+            return 'identitysso'
+        elif '/exchange/account/' in url:
+            return 'account'
+        elif '/exchange/betting/' in url:
+            return 'betting'
+        else:
+            return 'other'
+
+    def send(self, url = '', data = '', headers = None, cert = None):
+        """send a POST (if data provided) or GET request over the pooled session for the url"""
+        endpoint = self.get_endpoint(url)
+        session = self.sessions[endpoint]
+        with self.lock:
+            self.request_counts[endpoint] += 1
+        if data: # POST
+            return session.post(url, data, cert = cert, headers = headers, timeout = self.timeout)
+        else: # GET
+            return session.get(url, cert = cert, headers = headers, timeout = self.timeout)
+
+    def get_stats(self):
+        """returns dict of connection counters per endpoint, e.g.
+        {'betting': {'requests': 120, 'handshakes': 3, 'reused': 117}, ...}
+        NOTE: handshakes are read from the urllib3 pools, so include reconnects
+        after the server has closed an idle keep-alive connection.
+        """
+        stats = {}
+        for endpoint, session in self.sessions.items():
+            handshakes = 0
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool:
+                        handshakes += pool.num_connections
+            with self.lock:
+                requests_sent = self.request_counts[endpoint]
+            stats[endpoint] = {
+                'requests': requests_sent,
+                'handshakes': handshakes,
+                'reused': max(requests_sent - handshakes, 0)
+            }
+        return stats
+
+    def close(self):
+        """close all pooled connections"""
+        for session in self.sessions.values():
+            session.close()
@@ -1,6 +1,7 @@
 import os
 import logging
 import smtplib
+from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
@@ -46,3 +47,20 @@ def send_with_csv(message='', subject='', csv=''):
     attachment.add_header("Content-Disposition", "attachment", filename="summary.csv")
     msg.attach(attachment)
     send(msg)
+
+
+def send_with_gzip(message='', subject='', data=b'', filename=''):
+    """send a message with a gzip compressed attachment, e.g. a large csv"""
+    msg = MIMEMultipart()  # create a message
+
+    # setup the parameters of the message
+    msg['From'] = smtp_user
+    msg['To'] = recipients
+    msg['Subject'] = subject
+
+    # add in the message body
+    msg.attach(MIMEText(message, 'plain'))
+    attachment = MIMEApplication(data, 'gzip')
+    attachment.add_header("Content-Disposition", "attachment", filename=filename)
+    msg.attach(attachment)
+    send(msg)
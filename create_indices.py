@@ -53,6 +53,9 @@ market_book_indices = db.market_books.index_information()
 if not index_exists('marketId', market_book_indices):
     db.market_books.create_index([('marketId', pymongo.DESCENDING)], name='marketId')
 
+if not index_exists('snapshotTime', market_book_indices):
+    db.market_books.create_index([('snapshotTime', pymongo.ASCENDING)], name='snapshotTime')
+
 # Create indices on collection 'runner_books'
 
 runner_book_indices = db.runner_books.index_information()
@@ -60,6 +63,10 @@ runner_book_indices = db.runner_books.index_information()
 if not index_exists('marketId', runner_book_indices):
     db.runner_books.create_index([('marketId', pymongo.DESCENDING)], name='marketId')
 
+if not index_exists('marketId_selectionId', runner_book_indices):
+    db.runner_books.create_index([('marketId', pymongo.DESCENDING), ('selectionId', pymongo.DESCENDING)],
+                                 name='marketId_selectionId', unique=True)
+
 # Create indices on collection 'runner_book_results'
 
 runner_book_result_indices = db.runner_book_results.index_information()
@@ -67,6 +74,10 @@ runner_book_result_indices = db.runner_book_results.index_information()
 if not index_exists('marketId', runner_book_result_indices):
     db.runner_book_results.create_index([('marketId', pymongo.DESCENDING)], name='marketId')
 
+if not index_exists('marketId_selectionId', runner_book_result_indices):
+    db.runner_book_results.create_index([('marketId', pymongo.DESCENDING), ('selectionId', pymongo.DESCENDING)],
+                                        name='marketId_selectionId')
+
 # Create indices on collection 'instructions'
 
 instruction_indices = db.instructions.index_information()
@@ -100,6 +111,11 @@ if not index_exists('customerStrategyRef', order_indices):
 if not index_exists('profit', order_indices):
     db.orders.create_index([('profit', pymongo.ASCENDING)], name='profit')
 
+# Serves the settled orders PnL aggregation from the index alone
+if not index_exists('profit_placedDate_customerStrategyRef', order_indices):
+    db.orders.create_index([('profit', pymongo.ASCENDING), ('placedDate', pymongo.DESCENDING),
+                            ('customerStrategyRef', pymongo.ASCENDING)], name='profit_placedDate_customerStrategyRef')
+
 # Create indices on collection 'runners'
 
 runner_indices = db.runners.index_information()
@@ -119,3 +135,18 @@ db.winners.create_index([('marketId', pymongo.DESCENDING)], name='marketId')
 if index_exists('selectionId', winner_indices):
     db.winners.drop_index('selectionId')
 db.winners.create_index([('selectionId', pymongo.DESCENDING)], name='selectionId')
+
+# Create indices on collection 'pnl_ledger'
+
+pnl_ledger_indices = db.pnl_ledger.index_information()
+
+if not index_exists('betId', pnl_ledger_indices):
+    db.pnl_ledger.create_index([('betId', pymongo.DESCENDING)], name='betId', unique=True)
+
+# Create indices on collection 'pnl_buckets'
+
+pnl_bucket_indices = db.pnl_buckets.index_information()
+
+if not index_exists('strategyRef_period_start', pnl_bucket_indices):
+    db.pnl_buckets.create_index([('strategyRef', pymongo.ASCENDING), ('period', pymongo.ASCENDING),
+                                 ('start', pymongo.DESCENDING)], name='strategyRef_period_start', unique=True)
@@ -0,0 +1,114 @@
+"""Asyncio runtime for the Betting Bot managers"""
+import asyncio
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import settings
+from strategies import helpers
+
+# Set up logging
+logger = logging.getLogger('ENGIN')
+logger.setLevel(helpers.get_log_level())
+ch = logging.StreamHandler()
+ch.setLevel(helpers.get_log_level())
+formatter = logging.Formatter('(%(name)s) - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+
+def format_crash():
+    msg = traceback.format_exc()
+    http_err = 'ConnectionError:'
+    if http_err in msg:
+        msg = '%s%s' % (http_err, msg.rpartition(http_err)[2])
+    return msg
+
+
+# Runs every manager as a task on a single event loop instead of a thread each.
+# A manager's tick() does one unit of work and returns the seconds to wait before the next tick; the
+# wait is an asyncio sleep so idle managers cost nothing. The blocking Betfair API (pooled transport)
+# and pymongo calls made inside a tick run on a bounded executor, so the number of OS threads stays
+# fixed however many managers and market book watchers are active.
+class Engine(object):
+    def __init__(self, max_workers=None):
+        self.logger = logging.getLogger('ENGIN')
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers or settings.engine_max_workers)
+        self.loop.set_default_executor(self.executor)
+        self.managers = []  # list of (manager, start delay in seconds)
+        self.watchers = {}  # keys = watcher names, vals = tasks
+        self.wakers = {}  # keys = managers, vals = asyncio events that cut their wait short
+
+    def add(self, manager, delay=0):
+        """register a manager (any object with a tick() method) to run once the engine starts"""
+        self.managers.append((manager, delay))
+
+    def call(self, fn, *args):
+        """run a blocking function on the executor, returns an awaitable"""
+        return self.loop.run_in_executor(self.executor, fn, *args)
+
+    async def run_manager(self, manager, delay=0):
+        name = type(manager).__name__
+        waker = self.wakers[manager] = asyncio.Event()
+        await asyncio.sleep(delay)
+        self.logger.info('Started %s task.' % name)
+        while True:
+            try:
+                wait = await self.call(manager.tick)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.logger.error('%s Crashed: %s' % (name, format_crash()))
+                wait = 1 * 60  # Wait for 1 minute before continuing.
+            try:
+                await asyncio.wait_for(waker.wait(), max(wait, 0))
+            except asyncio.TimeoutError:
+                pass
+            waker.clear()
+
+    async def run_watcher(self, name='', step=None, interval=1.0, *args):
+        try:
+            while not await self.call(step, *args):
+                await asyncio.sleep(interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.logger.error('Watcher %s Crashed: %s' % (name, format_crash()))
+        finally:
+            self.watchers.pop(name, None)
+
+    def watch(self, name='', step=None, interval=1.0, *args):
+        """run step(*args) every interval seconds until it returns True, as a cancellable task.
+           Safe to call from the executor threads running manager ticks.
+        """
+        def start():
+            if name not in self.watchers:
+                self.watchers[name] = self.loop.create_task(self.run_watcher(name, step, interval, *args))
+        self.loop.call_soon_threadsafe(start)
+
+    def wake(self, manager=None):
+        """run the manager's next tick now rather than when its wait is over. Safe to call from any thread."""
+        waker = self.wakers.get(manager)
+        if waker:
+            self.loop.call_soon_threadsafe(waker.set)
+
+    def cancel_watchers(self):
+        for task in list(self.watchers.values()):
+            task.cancel()
+
+    def run(self):
+        """run all registered managers until interrupted"""
+        asyncio.set_event_loop(self.loop)
+        tasks = [self.loop.create_task(self.run_manager(manager, delay)) for manager, delay in self.managers]
+        try:
+            self.loop.run_forever()
+        except KeyboardInterrupt:
+            self.logger.info('Shutting down.')
+        finally:
+            self.cancel_watchers()
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.executor.shutdown(wait=False)
+            self.loop.close()
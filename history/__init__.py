@@ -0,0 +1,31 @@
+import atexit
+from datetime import datetime
+
+import settings
+from betbot_db import write_behind
+from .columnar import ColumnarRecorder, ColumnarReader, MarketHistory
+from .delta import DeltaHistoryReader, DeltaReader, DeltaRecorder
+
+if not settings.history_path:
+    recorder = None
+elif settings.history_format == 'delta':
+    recorder = DeltaRecorder(settings.history_path, settings.history_keyframe_interval)
+    atexit.register(recorder.flush)  # segments still being buffered would be lost on exit
+else:
+    recorder = ColumnarRecorder(settings.history_path)
+
+
+def get_reader():
+    """returns a reader of the configured history, None if there is none"""
+    if not settings.history_path:
+        return None
+    elif settings.history_format == 'delta':
+        return DeltaHistoryReader(settings.history_path)
+    else:
+        return ColumnarReader(settings.history_path)
+
+
+def record_async(market_book=None):
+    """queue the market book to be appended to the recorded history, if one is configured"""
+    if recorder and market_book:
+        write_behind.submit(recorder.record, market_book, datetime.utcnow())
@@ -0,0 +1,103 @@
+"""Compression ratio and decode throughput of the delta history on recorded market books.
+
+Usage: python -m history.benchmark <from date> <to date> [keyframe interval]
+Books are read from the recorded history when settings.history_path is set, the market_books
+collection otherwise, and re-encoded to a temporary delta history that is then decoded in full
+and sampled at random times.
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import settings
+from .delta import DeltaHistoryReader, DeltaRecorder
+
+
+def get_size(root=''):
+    return sum(os.path.getsize(os.path.join(path, name)) for path, dirs, names in os.walk(root) for name in names)
+
+
+def get_json_size(market_book=None):
+    book = {key: value for key, value in market_book.items() if key != '_id'}
+    return len(json.dumps(book, default=str, separators=(',', ':')).encode('utf-8'))
+
+
+def benchmark(books=None, keyframe_interval=60, samples=1000):
+    """encodes the books (in snapshot time order) and decodes them back. returns the measurements."""
+    root = tempfile.mkdtemp()
+    try:
+        recorder = DeltaRecorder(root, keyframe_interval)
+        snapshot_count = 0
+        json_bytes = 0
+        times = []
+        started = time.perf_counter()
+        for book in books:
+            recorder.record(book, book['snapshotTime'])
+            snapshot_count += 1
+            json_bytes += get_json_size(book)
+            times.append(book['snapshotTime'])
+        recorder.flush()
+        encode_seconds = time.perf_counter() - started
+        delta_bytes = get_size(root)
+        if not snapshot_count:
+            msg = 'No market books to benchmark.'
+            raise Exception(msg)
+
+        reader = DeltaHistoryReader(root)
+        markets = [reader.get_market(market_id, datetime.strptime(day, '%Y-%m-%d'))
+                   for day in reader.get_days()
+                   for market_id in reader.get_market_ids(datetime.strptime(day, '%Y-%m-%d'))]
+        started = time.perf_counter()
+        decoded_count = sum(1 for market in markets for book in market.get_market_books())
+        decode_seconds = time.perf_counter() - started
+
+        sample_times = [random.choice(times) for i in range(samples)]
+        started = time.perf_counter()
+        for sample_time in sample_times:
+            random.choice(markets).get_market_book(sample_time)
+        seek_seconds = time.perf_counter() - started
+    finally:
+        shutil.rmtree(root)
+    return {
+        'snapshots': snapshot_count,
+        'markets': len(markets),
+        'jsonBytes': json_bytes,
+        'deltaBytes': delta_bytes,
+        'compressionRatio': json_bytes / float(delta_bytes),
+        'encodePerSecond': snapshot_count / encode_seconds,
+        'decodePerSecond': decoded_count / decode_seconds,
+        'seeksPerSecond': samples / seek_seconds
+    }
+
+
+def format_report(report=None):
+    return '\n'.join([
+        '%s snapshots of %s markets' % (report['snapshots'], report['markets']),
+        'JSON: %.1f MB, delta: %.1f MB, ratio %.1fx' %
+        (report['jsonBytes'] / 1e6, report['deltaBytes'] / 1e6, report['compressionRatio']),
+        'encode: %.0f snapshots/s, decode: %.0f snapshots/s, random seek: %.0f/s' %
+        (report['encodePerSecond'], report['decodePerSecond'], report['seeksPerSecond'])
+    ])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    start_date = datetime.strptime(sys.argv[1], '%Y-%m-%d')
+    end_date = datetime.strptime(sys.argv[2], '%Y-%m-%d')
+    interval = int(sys.argv[3]) if len(sys.argv) > 3 else settings.history_keyframe_interval
+    if settings.history_path:
+        import history
+        recorded_books = history.get_reader().get_market_books(start_date, end_date)
+    else:
+        import betbot_db
+        recorded_books = betbot_db.db.market_books.find({
+            'snapshotTime': {'$gte': start_date, '$lt': end_date}
+        }).sort('snapshotTime', 1)
+    print(format_report(benchmark(recorded_books, interval)))
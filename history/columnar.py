@@ -0,0 +1,212 @@
+import logging
+import os
+import threading
+from datetime import datetime
+
+import numpy
+
+from betfair.ladder import price_cents, price_increments
+from strategies import helpers
+
+# Set up logging
+logger = logging.getLogger('HIST')
+logger.setLevel(helpers.get_log_level())
+ch = logging.StreamHandler()
+ch.setLevel(helpers.get_log_level())
+formatter = logging.Formatter('(%(name)s) - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# Column groups and their fixed-width column types. Each column is an append-only file of raw
+# little-endian values, <root>/<yyyy-mm-dd>/<market id>/<group>.<column>.bin, so a column can be
+# read straight into memory with numpy.memmap. Times are milliseconds since the epoch (UTC).
+SCHEMA = {
+    'books': [('time', '<i8'), ('status', 'u1'), ('inplay', 'u1'), ('total_matched', '<f8')],
+    'runners': [('time', '<i8'), ('selection', '<i4'), ('status', 'u1'), ('last_price', '<f8'),
+                ('total_matched', '<f8')],
+    'levels': [('time', '<i8'), ('selection', '<i4'), ('side', 'u1'), ('tick', '<i2'), ('size', '<f8')]
+}
+MARKET_STATUSES = ['INACTIVE', 'OPEN', 'SUSPENDED', 'CLOSED']
+RUNNER_STATUSES = ['ACTIVE', 'WINNER', 'LOSER', 'REMOVED', 'REMOVED_VACANT', 'HIDDEN', 'PLACED']
+# Ladder sides, in the order they are stored.
+SIDES = ['availableToBack', 'availableToLay', 'tradedVolume']
+# keys = price in hundredths, vals = tick index
+TICKS = {cents: tick for tick, cents in enumerate(price_cents)}
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_millis(date_time=None):
+    return int((date_time - EPOCH).total_seconds() * 1000)
+
+
+def from_millis(millis=0):
+    return datetime.utcfromtimestamp(millis / 1000.0)
+
+
+def get_tick(price=0.0):
+    return TICKS[int(round(price * 100))]
+
+
+class ColumnarRecorder(object):
+    """appends market books to columnar files partitioned by day and market.
+       Recording replaces neither the cache nor MongoDB, it is an additional compact history.
+    """
+    def __init__(self, root=''):
+        self.logger = logging.getLogger('HIST')
+        self.root = root
+        self.lock = threading.Lock()
+
+    def get_path(self, market_id='', day=None):
+        return os.path.join(self.root, day.strftime('%Y-%m-%d'), market_id)
+
+    def record(self, market_book=None, snapshot_time=None):
+        """append the market book, as at snapshot_time (defaults to now)"""
+        if not market_book:
+            msg = 'Failed to record a market book, None provided.'
+            raise Exception(msg)
+        snapshot_time = snapshot_time or datetime.utcnow()
+        millis = to_millis(snapshot_time)
+        runners = {name: [] for name, dtype in SCHEMA['runners']}
+        levels = {name: [] for name, dtype in SCHEMA['levels']}
+        for runner in market_book['runners']:
+            selection_id = runner['selectionId']
+            runners['time'].append(millis)
+            runners['selection'].append(selection_id)
+            runners['status'].append(RUNNER_STATUSES.index(runner['status']))
+            runners['last_price'].append(runner.get('lastPriceTraded', numpy.nan))
+            runners['total_matched'].append(runner.get('totalMatched', 0.0))
+            exchange = runner.get('ex', {})
+            for side, side_name in enumerate(SIDES):
+                for level in exchange.get(side_name, []):
+                    levels['time'].append(millis)
+                    levels['selection'].append(selection_id)
+                    levels['side'].append(side)
+                    levels['tick'].append(get_tick(level['price']))
+                    levels['size'].append(level['size'])
+        books = {
+            'time': [millis],
+            'status': [MARKET_STATUSES.index(market_book['status'])],
+            'inplay': [market_book.get('inplay', False)],
+            'total_matched': [market_book.get('totalMatched', 0.0)]
+        }
+        path = self.get_path(market_book['marketId'], snapshot_time)
+        with self.lock:
+            os.makedirs(path, exist_ok=True)
+            for group, columns in [('books', books), ('runners', runners), ('levels', levels)]:
+                self.append(path, group, columns)
+
+    @staticmethod
+    def append(path='', group='', columns=None):
+        for name, dtype in SCHEMA[group]:
+            with open(os.path.join(path, '%s.%s.bin' % (group, name)), 'ab') as column_file:
+                column_file.write(numpy.asarray(columns[name], dtype=dtype).tobytes())
+
+
+class MarketHistory(object):
+    """the recorded history of one market. Columns are numpy memmaps, nothing is parsed or copied
+       until it is used, e.g. history.levels['size'][history.levels['tick'] < 100].sum()
+    """
+    def __init__(self, path='', market_id=''):
+        self.market_id = market_id
+        self.books = self.open_group(path, 'books')
+        self.runners = self.open_group(path, 'runners')
+        self.levels = self.open_group(path, 'levels')
+
+    @staticmethod
+    def open_group(path='', group=''):
+        columns = {}
+        for name, dtype in SCHEMA[group]:
+            column_path = os.path.join(path, '%s.%s.bin' % (group, name))
+            size = os.path.getsize(column_path) if os.path.exists(column_path) else 0
+            rows = size // numpy.dtype(dtype).itemsize  # a value cut part way is left out
+            if rows:
+                columns[name] = numpy.memmap(column_path, dtype=dtype, mode='r', shape=(rows,))
+            else:  # numpy can't map an empty file
+                columns[name] = numpy.zeros(0, dtype=dtype)
+        # A write interrupted part way leaves some columns longer than others, ignore the partial rows.
+        length = min(len(column) for column in columns.values())
+        return {name: column[:length] for name, column in columns.items()}
+
+    def get_snapshot_times(self):
+        return [from_millis(millis) for millis in self.books['time']]
+
+    def get_market_book(self, index=0):
+        """rebuilds snapshot number index in listMarketBook format"""
+        millis = self.books['time'][index]
+        runner_rows = range(*numpy.searchsorted(self.runners['time'], [millis, millis + 1]))
+        level_rows = range(*numpy.searchsorted(self.levels['time'], [millis, millis + 1]))
+        runners = {}
+        for row in runner_rows:
+            selection_id = int(self.runners['selection'][row])
+            runner = {
+                'selectionId': selection_id,
+                'handicap': 0.0,
+                'status': RUNNER_STATUSES[self.runners['status'][row]],
+                'totalMatched': float(self.runners['total_matched'][row]),
+                'ex': {side_name: [] for side_name in SIDES}
+            }
+            last_price = self.runners['last_price'][row]
+            if not numpy.isnan(last_price):
+                runner['lastPriceTraded'] = float(last_price)
+            runners[selection_id] = runner
+        for row in level_rows:
+            runner = runners[int(self.levels['selection'][row])]
+            runner['ex'][SIDES[self.levels['side'][row]]].append({
+                'price': price_increments[self.levels['tick'][row]],
+                'size': float(self.levels['size'][row])
+            })
+        return {
+            'marketId': self.market_id,
+            'status': MARKET_STATUSES[self.books['status'][index]],
+            'inplay': bool(self.books['inplay'][index]),
+            'totalMatched': float(self.books['total_matched'][index]),
+            'numberOfRunners': len(runners),
+            'runners': list(runners.values()),
+            'snapshotTime': from_millis(int(millis))
+        }
+
+    def get_market_books(self):
+        for index in range(len(self.books['time'])):
+            yield self.get_market_book(index)
+
+
+class HistoryReader(object):
+    """reads a history root of <yyyy-mm-dd> day directories. Subclasses list and open the markets
+       recorded on a day, in their own format.
+    """
+    def __init__(self, root=''):
+        self.root = root
+
+    def get_days(self):
+        return sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+
+    def get_market_ids(self, day=None):
+        raise NotImplementedError
+
+    def get_market(self, market_id='', day=None):
+        raise NotImplementedError
+
+    def get_market_books(self, start_date=None, end_date=None):
+        """all recorded books of the days from start_date up to end_date, in snapshot time order.
+           Each day is merged across its markets, so a day is held in memory at a time.
+        """
+        for day in self.get_days():
+            day = datetime.strptime(day, '%Y-%m-%d')
+            if not start_date.date() <= day.date() <= end_date.date():
+                continue
+            books = []
+            for market_id in self.get_market_ids(day):
+                books.extend(self.get_market(market_id, day).get_market_books())
+            books.sort(key=lambda book: book['snapshotTime'])
+            for book in books:
+                if start_date <= book['snapshotTime'] < end_date:
+                    yield book
+
+
+class ColumnarReader(HistoryReader):
+    def get_market_ids(self, day=None):
+        path = os.path.join(self.root, day.strftime('%Y-%m-%d'))
+        return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+    def get_market(self, market_id='', day=None):
+        return MarketHistory(os.path.join(self.root, day.strftime('%Y-%m-%d'), market_id), market_id)
@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime
+
+from .columnar import MARKET_STATUSES, RUNNER_STATUSES, SIDES, HistoryReader, from_millis, get_tick, to_millis
+from betfair.ladder import price_increments
+
+# Each market is one append-only file, <root>/<yyyy-mm-dd>/<market id>.delta, holding a sequence of
+# segments. A segment is a keyframe (the full book) followed by the deltas of the next snapshots
+# (only the market fields, runner fields and price levels that changed, a size of 0 removing a level),
+# JSON encoded and zlib compressed as one block. The block header holds the first and last snapshot
+# times so a reader can seek to a time without decompressing the segments before it.
+HEADER = struct.Struct('<qqI')  # first time (ms), last time (ms), compressed length
+
+
+def encode_book(market_book=None):
+    """returns the book as (market fields, {selection: runner fields}, {(selection, side, tick): size})"""
+    market = [MARKET_STATUSES.index(market_book['status']), int(market_book.get('inplay', False)),
+              market_book.get('totalMatched', 0.0)]
+    runners = {}
+    levels = {}
+    for runner in market_book['runners']:
+        selection_id = runner['selectionId']
+        runners[selection_id] = [RUNNER_STATUSES.index(runner['status']), runner.get('lastPriceTraded'),
+                                 runner.get('totalMatched', 0.0)]
+        exchange = runner.get('ex', {})
+        for side, side_name in enumerate(SIDES):
+            for level in exchange.get(side_name, []):
+                levels[(selection_id, side, get_tick(level['price']))] = level['size']
+    return market, runners, levels
+
+
+def decode_book(market_id='', millis=0, market=None, runners=None, levels=None):
+    """rebuilds the book in listMarketBook format"""
+    books = {}
+    for selection_id, (status, last_price, total_matched) in runners.items():
+        runner = {
+            'selectionId': selection_id,
+            'handicap': 0.0,
+            'status': RUNNER_STATUSES[status],
+            'totalMatched': total_matched,
+            'ex': {side_name: [] for side_name in SIDES}
+        }
+        if last_price is not None:
+            runner['lastPriceTraded'] = last_price
+        books[selection_id] = runner
+    for (selection_id, side, tick) in sorted(levels, key=lambda key: (key[0], key[1], -key[2] if key[1] == 0 else key[2])):
+        books[selection_id]['ex'][SIDES[side]].append({'price': price_increments[tick], 'size': levels[(selection_id, side, tick)]})
+    return {
+        'marketId': market_id,
+        'status': MARKET_STATUSES[market[0]],
+        'inplay': bool(market[1]),
+        'totalMatched': market[2],
+        'numberOfRunners': len(books),
+        'runners': list(books.values()),
+        'snapshotTime': from_millis(millis)
+    }
+
+
+def apply_frame(frame=None, market=None, runners=None, levels=None):
+    """applies a keyframe or delta frame to the decoded state, returns the new market fields"""
+    if frame.get('k'):
+        runners.clear()
+        levels.clear()
+    if 'm' in frame:
+        market = frame['m']
+    for selection_id, status, last_price, total_matched in frame.get('r', []):
+        runners[selection_id] = [status, last_price, total_matched]
+    for selection_id, side, tick, size in frame.get('l', []):
+        if size:
+            levels[(selection_id, side, tick)] = size
+        else:
+            levels.pop((selection_id, side, tick), None)
+    return market
+
+
+class MarketDeltaWriter(object):
+    def __init__(self, path='', keyframe_interval=60):
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.frames = []  # frames of the current segment
+        self.last_millis = 0  # time of the latest snapshot written
+        self.market = None
+        self.runners = {}
+        self.levels = {}
+
+    def write(self, market_book=None, millis=0):
+        market, runners, levels = encode_book(market_book)
+        if not self.frames:  # keyframe
+            frame = {'t': millis, 'k': 1, 'm': market,
+                     'r': [[selection_id] + fields for selection_id, fields in runners.items()],
+                     'l': [list(key) + [size] for key, size in levels.items()]}
+        else:
+            frame = {'t': millis}
+            if market != self.market:
+                frame['m'] = market
+            changed_runners = [[selection_id] + fields for selection_id, fields in runners.items()
+                               if self.runners.get(selection_id) != fields]
+            if changed_runners:
+                frame['r'] = changed_runners
+            changed_levels = [list(key) + [size] for key, size in levels.items() if self.levels.get(key) != size]
+            changed_levels.extend(list(key) + [0] for key in self.levels if key not in levels)
+            if changed_levels:
+                frame['l'] = changed_levels
+        self.frames.append(frame)
+        self.last_millis = millis
+        self.market, self.runners, self.levels = market, runners, levels
+        if len(self.frames) >= self.keyframe_interval:
+            self.flush()
+
+    def flush(self):
+        if self.frames:
+            block = zlib.compress(json.dumps(self.frames, separators=(',', ':')).encode('utf-8'))
+            with open(self.path, 'ab') as delta_file:
+                delta_file.write(HEADER.pack(self.frames[0]['t'], self.frames[-1]['t'], len(block)))
+                delta_file.write(block)
+            self.frames = []
+
+
+class DeltaRecorder(object):
+    """records market books as keyframes plus deltas, see the layout above. A segment is written once
+       it holds keyframe_interval snapshots, when the market closes, when the market has had no snapshot
+       for idle_timeout seconds (e.g. it was never seen CLOSED) or on flush().
+    """
+    def __init__(self, root='', keyframe_interval=60, idle_timeout=60 * 60):
+        self.logger = logging.getLogger('HIST')
+        self.root = root
+        self.keyframe_interval = keyframe_interval
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.writers = {}  # keys = market ids, vals = MarketDeltaWriter
+
+    def get_path(self, market_id='', day=None):
+        return os.path.join(self.root, day.strftime('%Y-%m-%d'), '%s.delta' % market_id)
+
+    def record(self, market_book=None, snapshot_time=None):
+        """append the market book, as at snapshot_time (defaults to now)"""
+        if not market_book:
+            msg = 'Failed to record a market book, None provided.'
+            raise Exception(msg)
+        snapshot_time = snapshot_time or datetime.utcnow()
+        market_id = market_book['marketId']
+        with self.lock:
+            writer = self.writers.get(market_id)
+            if not writer:
+                path = self.get_path(market_id, snapshot_time)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer = self.writers[market_id] = MarketDeltaWriter(path, self.keyframe_interval)
+            millis = to_millis(snapshot_time)
+            writer.write(market_book, millis)
+            if market_book['status'] == 'CLOSED':
+                writer.flush()
+                del self.writers[market_id]
+            self.prune(millis)
+
+    def prune(self, millis=0):
+        # The lock must be held. Writes out and forgets the markets that have gone quiet.
+        cutoff = millis - self.idle_timeout * 1000
+        for market_id in [market_id for market_id, writer in self.writers.items() if writer.last_millis < cutoff]:
+            self.logger.debug('Market %s has had no snapshot for %ss, writing it out.' % (market_id, self.idle_timeout))
+            self.writers.pop(market_id).flush()
+
+    def flush(self):
+        with self.lock:
+            for writer in self.writers.values():
+                writer.flush()
+
+
+class DeltaReader(object):
+    def __init__(self, path='', market_id=''):
+        self.path = path
+        self.market_id = market_id or os.path.basename(path).rpartition('.delta')[0]
+
+    def get_segments(self):
+        """returns (first time, last time, offset, length) of every segment in the file"""
+        segments = []
+        with open(self.path, 'rb') as delta_file:
+            offset = 0
+            while True:
+                header = delta_file.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                first, last, length = HEADER.unpack(header)
+                offset += HEADER.size
+                segments.append((first, last, offset, length))
+                offset += length
+                delta_file.seek(offset)
+        return segments
+
+    def read_segment(self, offset=0, length=0):
+        with open(self.path, 'rb') as delta_file:
+            delta_file.seek(offset)
+            return json.loads(zlib.decompress(delta_file.read(length)).decode('utf-8'))
+
+    def get_market_books(self):
+        """iterates every snapshot in time order"""
+        market, runners, levels = None, {}, {}
+        for first, last, offset, length in self.get_segments():
+            for frame in self.read_segment(offset, length):
+                market = apply_frame(frame, market, runners, levels)
+                yield decode_book(self.market_id, frame['t'], market, runners, levels)
+
+    def get_market_book(self, snapshot_time=None):
+        """returns the snapshot in force at snapshot_time (the latest at or before it), None if none"""
+        millis = to_millis(snapshot_time)
+        segment = None
+        for first, last, offset, length in self.get_segments():
+            if first > millis:
+                break
+            segment = (offset, length)
+        if not segment:
+            return None
+        market, runners, levels = None, {}, {}
+        book_millis = None
+        for frame in self.read_segment(*segment):
+            if frame['t'] > millis:
+                break
+            market = apply_frame(frame, market, runners, levels)
+            book_millis = frame['t']
+        return decode_book(self.market_id, book_millis, market, runners, levels)
+
+
+class DeltaHistoryReader(HistoryReader):
+    """reads a delta history root, same interface as columnar.ColumnarReader"""
+    def get_market_ids(self, day=None):
+        path = os.path.join(self.root, day.strftime('%Y-%m-%d'))
+        if not os.path.isdir(path):
+            return []
+        return sorted(name.rpartition('.delta')[0] for name in os.listdir(path) if name.endswith('.delta'))
+
+    def get_market(self, market_id='', day=None):
+        return DeltaReader(os.path.join(self.root, day.strftime('%Y-%m-%d'), '%s.delta' % market_id), market_id)
@@ -1,12 +1,19 @@
 """Betting Bot Manager"""
 import logging
 import os
+import signal
 from sys import exit
-from time import sleep
 
+import betbot_cache
+import settings
 import threads
 from betfair.api_ng import API
+from betfair.book_batcher import MarketBookBatcher
+from betfair.stream import MarketStream
 from comms import ChatManager
+from engine import Engine
+from results.resolver import ResultResolver
+from results.sources import BookHeuristicSource, MarketStatusSource, SportingLifeSource
 from strategies import helpers
 
 # Set up logging
@@ -26,6 +33,9 @@ APP_KEY = os.environ['BETFAIR_APP_KEY']
 # Retrieve live mode status from the environment (defaults to False)
 LIVE_MODE = 'LIVE_MODE' in os.environ and os.environ['LIVE_MODE'] == 'true'
 
+# Retrieve streaming market data status from the environment (defaults to False, i.e. polling)
+STREAM_MODE = 'STREAM_MODE' in os.environ and os.environ['STREAM_MODE'] == 'true'
+
 if not USERNAME:
     logger.error('BETFAIR_USERNAME is not set, exiting.')
     exit()
@@ -39,26 +49,61 @@ if not APP_KEY:
     exit()
 
 api = API(False, ssl_prefix=USERNAME)
+engine = Engine()
 session_manager = threads.SessionManager(api, USERNAME, PASSWORD, APP_KEY)
-session_manager.start()
-sleep(5)  # Allow the session manager time to log in.
 
-market_manager = threads.MarketManager(api)
-market_book_manager = threads.MarketBookManager(api)
+market_stream = None
+if STREAM_MODE:
+    stream_filter = {'eventTypeIds': ['7'], 'countryCodes': ['GB'], 'marketTypes': ['WIN']}
+    market_stream = MarketStream(api, stream_filter, listener=betbot_cache.cache_market_book)
+
+    def start_market_stream():
+        # The stream authenticates with the session token, so it's started on the first login. It reconnects
+        # (with the current token) by itself, later logins don't start it again.
+        if market_stream.ident is None:  # never started
+            market_stream.start()
+
+    session_manager.subscribe(start_market_stream)
+
+book_batcher = MarketBookBatcher(api, market_stream=market_stream)
+book_batcher.start()
+
+market_scheduler = threads.MarketScheduler()
+market_manager = threads.MarketManager(api, market_scheduler)
+market_book_manager = threads.MarketBookManager(api, book_batcher, engine)
 statistics_manager = threads.StatisticsManager(api)
 account_manager = threads.AccountManager(api)
 order_manager = threads.OrderManager(api)
 report_manager = threads.ReportManager(api)
-strategy_manager = threads.StrategyManager(api, LIVE_MODE)
-result_scraper = threads.ResultScraper()
-
-market_manager.start()
-market_book_manager.start()
-statistics_manager.start()
-account_manager.start()
-order_manager.start()
-report_manager.start()
-strategy_manager.start()
-result_scraper.start()
+strategy_manager = threads.StrategyManager(api, book_batcher, LIVE_MODE)
+result_resolver = ResultResolver([
+    MarketStatusSource(book_batcher, settings.market_status_confidence),
+    SportingLifeSource(settings.sporting_life_confidence, settings.sporting_life_poll_interval),
+    BookHeuristicSource(settings.book_heuristic_confidence)
+])
+
+# Strategies and market book watchers are driven by the scheduler rather than polling for the next market.
+# Markets are played one at a time, as the strategies read and write their persisted state when playing one.
+market_scheduler.subscribe(settings.strategy_fire_offset, strategy_manager.on_market_due, serial=True)
+market_scheduler.subscribe(settings.book_watch_offset, market_book_manager.on_market_due)
+market_scheduler.start()
+
+# Rehydrate the strategy outcome ledger before the first market is played.
+betbot_cache.strategy_ledger.load()
+
+# Settle indicative outcomes as soon as a winner is known rather than on the Order Manager's next cycle.
+betbot_cache.winners_registry.subscribe(lambda market_id, selection_id: engine.wake(order_manager))
+
+engine.add(session_manager)
+engine.add(market_manager, 5)  # Allow the session manager time to log in.
+engine.add(statistics_manager, 5)
+engine.add(account_manager, 5)
+engine.add(order_manager, 5)
+engine.add(report_manager, 5)
+engine.add(result_resolver, 5)
+
+# Heroku stops the worker with SIGTERM, exit normally so shutdown handlers (e.g. the history flush) run.
+signal.signal(signal.SIGTERM, lambda signum, frame: exit(0))
 
 ChatManager.post_message("BetBot started! :tada:")
+engine.run()
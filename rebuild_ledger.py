@@ -0,0 +1,11 @@
+"""Rebuild the PnL ledger from the orders collection, then refresh the strategy statistics from it.
+
+Usage: python rebuild_ledger.py
+Safe to run at any time and as often as needed: the ledger is recomputed from scratch.
+"""
+import betbot_db
+from threads.statistics_manager import update_statistics
+
+order_count = betbot_db.pnl_ledger_repo.rebuild()
+update_statistics()
+print('Rebuilt the PnL ledger from %s settled orders.' % order_count)
@@ -0,0 +1,66 @@
+import logging
+
+
+class Consensus(object):
+    """tallies the winners claimed by each result source. A market is resolved once the confidence
+       of the sources agreeing on one selection reaches the quorum; a source's latest claim replaces
+       its earlier one. A market resolved by claims below the authority can still be corrected by a
+       single claim at or above it (e.g. Betfair's settlement), after which the market is confirmed and
+       no further claims are considered.
+    """
+    def __init__(self, quorum=1.0, authority=1.0):
+        self.logger = logging.getLogger('RESOL')
+        self.quorum = quorum
+        self.authority = authority
+        self.votes = {}  # keys = market ids, vals = {source name: (selection id, confidence)}
+        self.resolved = {}  # keys = market ids, vals = resolved selection ids
+        self.confirmed = set()  # market ids resolved by a single claim reaching the authority
+
+    def add(self, market_id='', source='', selection_id=None, confidence=0.0):
+        """record a source's claim, returns the winner if this claim resolved (or corrected) the market,
+           None otherwise
+        """
+        if market_id in self.confirmed:
+            return None
+        if market_id in self.resolved:
+            if confidence < self.authority:
+                return None
+            self.confirmed.add(market_id)
+            if self.resolved[market_id] == selection_id:
+                return None
+            self.logger.warning('%s corrected the winner of market %s from %s to %s.' %
+                                (source, market_id, self.resolved[market_id], selection_id))
+            self.resolved[market_id] = selection_id
+            return selection_id
+        votes = self.votes.setdefault(market_id, {})
+        votes[source] = (selection_id, confidence)
+        tally = {}
+        for voted_selection_id, voted_confidence in votes.values():
+            tally[voted_selection_id] = tally.get(voted_selection_id, 0.0) + voted_confidence
+        if len(tally) > 1:
+            self.logger.warning('Sources disagree on the winner of market %s: %s' % (market_id, votes))
+        winner, winner_confidence = max(tally.items(), key=lambda item: item[1])
+        if winner_confidence >= self.quorum:
+            self.resolved[market_id] = winner
+            if winner == selection_id and confidence >= self.authority:
+                self.confirmed.add(market_id)
+            self.votes.pop(market_id)
+            return winner
+        return None
+
+    def is_open(self, market_id='', confidence=0.0):
+        """True if a claim of the given confidence on the market would still be considered"""
+        if market_id in self.confirmed:
+            return False
+        return market_id not in self.resolved or confidence >= self.authority
+
+    def get_votes(self, market_id=''):
+        return dict(self.votes.get(market_id, {}))
+
+    def prune(self, market_ids=None):
+        """forget every market not in market_ids"""
+        market_ids = set(market_ids)
+        for markets in [self.votes, self.resolved]:
+            for market_id in [market_id for market_id in markets if market_id not in market_ids]:
+                del markets[market_id]
+        self.confirmed &= market_ids
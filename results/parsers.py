@@ -0,0 +1,62 @@
+"""Result parsers. Pure functions of a fetched page or book so they can be tested against saved fixtures."""
+import re
+from datetime import datetime
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401, the C parser is several times faster than html.parser
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+# Only the race cards are parsed, the rest of the page is skipped by the parser.
+RACE_CARDS = SoupStrainer('div', attrs={'class': 'fast-racecard-item'})
+
+
+def normalize_name(name=''):
+    """lower case alphanumerics only, without a country suffix, e.g. "Rock's Lad (IRE)" -> "rockslad" """
+    return re.sub(r'[^a-z0-9]', '', re.sub(r'\(.*?\)', '', name).lower())
+
+
+def parse_fast_results(page=b'', day=None):
+    """returns the winners on a sportinglife.com fast results page as a list of
+       {'startTime': datetime on day, 'venue': first word of the venue, 'runnerName': name}
+    """
+    soup = BeautifulSoup(page, HTML_PARSER, parse_only=RACE_CARDS)
+    results = []
+    for race_card in soup.find_all('div', attrs={'class': 'fast-racecard-item'}):
+        card_header = race_card.find('div', attrs={'class': 'fast-racecard-header-race'})
+        places = race_card.find_all('div', attrs={'class': 'fast-results-place'})
+        if not card_header or not places:
+            continue
+        race = card_header.text.split()
+        race_time = race[0].split(":")
+        runner = places[0].find('div', attrs={'class': 'fast-results-place-name'}).text
+        results.append({
+            'startTime': datetime(day.year, day.month, day.day, int(race_time[0]), int(race_time[1])),
+            'venue': race[1],
+            'runnerName': runner.split('(')[0].strip()
+        })
+    return results
+
+
+def parse_closed_winner(market_book=None):
+    """returns the selection id of the WINNER runner of a CLOSED market book, None otherwise"""
+    if market_book and market_book.get('status') == 'CLOSED':
+        for runner in market_book['runners']:
+            if runner['status'] == 'WINNER':
+                return runner['selectionId']
+    return None
+
+
+def parse_indicative_winner(market_book=None, max_lay_price=1.5):
+    """returns the selection id of the runner whose best lay price is below max_lay_price, the in-play
+       book's early indication of the winner (see strategies.helpers.get_indicative_winner)
+    """
+    if market_book and market_book.get('status') != 'CLOSED':
+        for runner in market_book['runners']:
+            market_levels = runner.get('ex', {}).get('availableToLay', [])
+            if len(market_levels) > 0 and market_levels[0]['price'] < max_lay_price:
+                return runner['selectionId']
+    return None
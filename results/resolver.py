@@ -0,0 +1,93 @@
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from time import monotonic, sleep
+
+import betbot_cache
+import betbot_db
+import settings
+from strategies import helpers
+from .consensus import Consensus
+
+# Set up logging
+logger = logging.getLogger('RESOL')
+logger.setLevel(helpers.get_log_level())
+ch = logging.StreamHandler()
+ch.setLevel(helpers.get_log_level())
+formatter = logging.Formatter('(%(name)s) - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+
+# Polls every result source concurrently, each at its own interval, for the markets that have started but
+# have no winner yet and publishes a market's winner to the winners registry as soon as the sources calling
+# it reach the quorum (settings.result_quorum), e.g. a scraped result alone. Sources at the authority
+# (settings.result_authority), i.e. Betfair's own settlement, keep polling resolved markets to correct them.
+class ResultResolver(threading.Thread):
+    def __init__(self, sources=None, quorum=None, authority=None):
+        threading.Thread.__init__(self)
+        self.logger = logging.getLogger('RESOL')
+        self.sources = sources or []
+        self.consensus = Consensus(settings.result_quorum if quorum is None else quorum,
+                                   settings.result_authority if authority is None else authority)
+        self.executor = ThreadPoolExecutor(max(len(self.sources), 1))
+        self.polls = {}  # keys = sources, vals = futures of their latest poll
+        self.next_polls = {}  # keys = sources, vals = monotonic time the source is next due to be polled
+
+    def run(self):
+        self.logger.info('Started Result Resolver...')
+        while True:
+            try:
+                sleep(self.tick())
+            except Exception as exc:
+                msg = traceback.format_exc()
+                http_err = 'ConnectionError:'
+                if http_err in msg:
+                    msg = '%s%s' % (http_err, msg.rpartition(http_err)[2])
+                self.logger.error('Result Resolver Crashed: %s' % msg)
+                sleep(1 * 60)  # Wait for 1 minute before continuing.
+
+    def get_pending(self):
+        """markets started within the result window that have not been confirmed"""
+        now = datetime.utcnow()
+        markets = betbot_db.market_repo.get_starting_between(now - timedelta(hours=settings.result_window_hours),
+                                                              now + timedelta(seconds=settings.book_watch_offset))
+        self.consensus.prune(market['marketId'] for market in markets)
+        return [market for market in markets if market['marketId'] not in self.consensus.confirmed]
+
+    def tick(self):
+        markets = self.get_pending()
+        if not markets:
+            return settings.result_poll_interval
+        now = monotonic()
+        for source in self.sources:
+            if source in self.polls:  # a source still busy with an earlier poll is not polled again
+                continue
+            # A resolved market is only left open to the sources that could correct it on their own.
+            source_markets = [market for market in markets
+                              if self.consensus.is_open(market['marketId'], source.confidence)]
+            if source_markets and now >= self.next_polls.get(source, 0):
+                self.next_polls[source] = now + source.poll_interval
+                self.polls[source] = self.executor.submit(source.poll, source_markets)
+        wait(self.polls.values(), timeout=settings.result_poll_timeout)
+        for source, future in list(self.polls.items()):
+            if not future.done():
+                self.logger.warning('Result source %s is taking longer than %ss.' %
+                                    (source.name, settings.result_poll_timeout))
+                continue
+            try:
+                for market_id, selection_id in future.result().items():
+                    self.add(market_id, source, selection_id)
+            except Exception as exc:
+                self.logger.error('Result source %s failed: %s' % (source.name, exc))
+            finally:
+                del self.polls[source]  # the source is polled again once due
+        return settings.result_poll_interval
+
+    def add(self, market_id='', source=None, selection_id=None):
+        winner = self.consensus.add(market_id, source.name, selection_id, source.confidence)
+        if winner is not None:
+            self.logger.info('Resolved the winner of market %s: %s' % (market_id, winner))
+            betbot_cache.winners_registry.put(market_id, winner)
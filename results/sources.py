@@ -0,0 +1,132 @@
+import hashlib
+import logging
+from datetime import datetime
+
+import urllib3
+
+import betbot_cache
+import betbot_db
+import settings
+from .parsers import normalize_name, parse_closed_winner, parse_fast_results, parse_indicative_winner
+
+# Disable non-HTTPS warnings
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+class ResultSource(object):
+    """a source of race results. poll(markets) is given the markets awaiting a result and returns
+       {market id: selection id} for the ones the source can call. confidence weighs the source's
+       claims against the resolver's quorum. The source is polled every poll_interval seconds
+       (default settings.result_poll_interval).
+    """
+    name = ''
+
+    def __init__(self, confidence=1.0, poll_interval=None):
+        self.logger = logging.getLogger('RESOL')
+        self.confidence = confidence
+        self.poll_interval = settings.result_poll_interval if poll_interval is None else poll_interval
+
+    def poll(self, markets=None):
+        raise NotImplementedError
+
+
+class MarketStatusSource(ResultSource):
+    """runner statuses of closed markets, as settled by Betfair"""
+    name = 'market_status'
+
+    def __init__(self, book_batcher=None, confidence=1.0, poll_interval=None):
+        ResultSource.__init__(self, confidence, poll_interval)
+        self.book_batcher = book_batcher
+
+    def poll(self, markets=None):
+        now = datetime.utcnow()
+        market_ids = [market['marketId'] for market in markets if market['marketStartTime'] < now]
+        winners = {}
+        # Runner statuses need no price data, the lightest request weight packs the most markets per call.
+        for market_book in self.book_batcher.get_market_books(market_ids, []) if market_ids else []:
+            selection_id = parse_closed_winner(market_book)
+            if selection_id is not None:
+                winners[market_book['marketId']] = selection_id
+        return winners
+
+
+class BookHeuristicSource(ResultSource):
+    """the runner the in-play book makes a near certainty, from the books cached by the market book watchers"""
+    name = 'book_heuristic'
+
+    def poll(self, markets=None):
+        winners = {}
+        for market in markets:
+            selection_id = parse_indicative_winner(betbot_cache.market_book_cache.get(market['marketId']))
+            if selection_id is not None:
+                winners[market['marketId']] = selection_id
+        return winners
+
+
+class SportingLifeSource(ResultSource):
+    """the sportinglife.com fast results page, fetched with conditional requests over a kept alive pool"""
+    name = 'sporting_life'
+    url = 'https://www.sportinglife.com/racing/fast-results'
+
+    def __init__(self, confidence=1.0, poll_interval=None):
+        ResultSource.__init__(self, confidence, poll_interval)
+        self.http = urllib3.PoolManager()
+        self.timeout = urllib3.Timeout(connect=settings.sporting_life_connect_timeout,
+                                       read=settings.sporting_life_read_timeout)
+        self.validators = {}  # ETag and Last-Modified of the last response
+        self.content_hash = None  # hash of the last page parsed
+        self.results = []  # results parsed from the last page
+        self.runners = {}  # keys = market ids, vals = {normalized runner name: selection id}
+
+    def fetch(self):
+        """returns the results page, None if it hasn't changed since the last fetch"""
+        headers = {}
+        if 'ETag' in self.validators:
+            headers['If-None-Match'] = self.validators['ETag']
+        if 'Last-Modified' in self.validators:
+            headers['If-Modified-Since'] = self.validators['Last-Modified']
+        response = self.http.request('GET', self.url, headers=headers, timeout=self.timeout)
+        if response.status == 304:
+            return None
+        self.validators = {name: response.headers[name] for name in ['ETag', 'Last-Modified'] if name in response.headers}
+        content_hash = hashlib.md5(response.data).hexdigest()
+        if content_hash == self.content_hash:  # the server doesn't support conditional requests
+            return None
+        self.content_hash = content_hash
+        return response.data
+
+    def get_selection_id(self, market=None, runner_name=''):
+        market_id = market['marketId']
+        if market_id not in self.runners:
+            self.runners[market_id] = {normalize_name(runner['runnerName']): runner['selectionId']
+                                       for runner in betbot_db.runner_repo.get_by_ids(market.get('runnerIds', []))}
+        selection_id = self.runners[market_id].get(normalize_name(runner_name))
+        if selection_id is None and 'runnerIds' not in market:  # market stored before runner ids were kept
+            try:
+                selection_id = betbot_db.runner_repo.get_by_name(runner_name.replace("'", ""))['selectionId']
+            except Exception:
+                pass
+        return selection_id
+
+    def poll(self, markets=None):
+        now = datetime.utcnow()
+        page = self.fetch()
+        if page is not None:
+            self.results = parse_fast_results(page, now)
+            self.logger.debug("Found %s results on sportinglife.com" % len(self.results))
+        # Pending markets by start time and the first word of their venue, as the page shows it.
+        index = {(market['marketStartTime'], normalize_name(market['event'].get('venue', '').split(' ')[0])): market
+                 for market in markets}
+        winners = {}
+        for result in self.results:
+            market = index.get((result['startTime'], normalize_name(result['venue'])))
+            if not market:
+                continue
+            selection_id = self.get_selection_id(market, result['runnerName'])
+            if selection_id is not None:
+                winners[market['marketId']] = selection_id
+            else:
+                self.logger.warning("Failed to find runner matching %s" % result['runnerName'])
+        self.runners = {market_id: runners for market_id, runners in self.runners.items()
+                        if any(market['marketId'] == market_id for market in markets)}
+        return winners
@@ -13,3 +13,85 @@ stake_ladder = [1.0, 1.0, 2.0, 4.0, 8.0]
 # Increment ladder for scaling up bet weights
 weight_ladder = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
 # weight_ladder = [1.0, 2.0, 3.0, 4.0, 5.0]  # Safer strategy testing!
+
+# Price band the Bet 1-2 strategy backs the favourite in (1-2 = 2.0-3.0 on Betfair)
+bet_12_min_price = 2.0
+bet_12_max_price = 3.0
+
+# The Bet Odds strategy only backs favourites priced below this (i.e. odds-on)
+bet_odds_max_price = 2.0
+
+# Races lost in a row before the Bet Odds strategy stops for the day
+bet_odds_max_losses = 3
+
+# Seconds a cached market book is considered fresh (CLOSED books never go stale)
+market_book_cache_ttl = 5.0
+
+# Maximum number of market books held in memory, least recently used are evicted first
+market_book_cache_max_entries = 200
+
+# Seconds a cached runner book is considered fresh when (re)pricing orders
+runner_book_cache_ttl = 1.0
+
+# Maximum number of runner books held in memory
+runner_book_cache_max_entries = 4000
+
+# Maximum number of market winners held in memory by the winners registry
+winners_registry_max_entries = 2000
+
+# Worker threads the engine runs blocking Betfair API and database calls on
+engine_max_workers = 16
+
+# Strategy classes (by class name) the strategy registry leaves out, e.g. ['LayAllStrategy']
+disabled_strategies = []
+
+# Seconds each strategy has to create its bets on a market before they're dropped
+strategy_time_budget = 5
+
+# Place each strategy's bets concurrently rather than one strategy after another
+parallel_order_placement = True
+
+# Maximum number of strategies placing bets at the same time
+order_placement_workers = 5
+
+# Seconds before a market starts that strategies create and place their bets
+strategy_fire_offset = 30
+
+# Seconds before a market starts that its book starts being tracked
+book_watch_offset = 5
+
+# Worker threads running market scheduler callbacks (e.g. book watchers), strategies play one market at a time
+scheduler_max_workers = 4
+
+# Directory market books are also recorded to as columnar files (see history.columnar), None to disable
+history_path = None
+
+# Format of the recorded history: 'columnar' (history.columnar) or 'delta' (history.delta, keyframes plus deltas)
+history_format = 'columnar'
+
+# Snapshots per delta history segment, i.e. one keyframe every history_keyframe_interval snapshots
+history_keyframe_interval = 60
+
+# Total confidence the result sources calling a winner must reach for it to be published (see results),
+# and the confidence of a single source that can correct a published winner
+result_quorum = 0.7
+result_authority = 1.0
+
+# Confidence of each result source's calls
+market_status_confidence = 1.0
+sporting_life_confidence = 0.7
+book_heuristic_confidence = 0.4
+
+# Hours after the start of a market its result is looked for
+result_window_hours = 3
+
+# Seconds between result source polls, and the longest a poll is waited for
+result_poll_interval = 5
+result_poll_timeout = 10
+
+# Seconds between scrapes of the sportinglife.com results page (an external site, polled less often)
+sporting_life_poll_interval = 30
+
+# Seconds to connect to sportinglife.com and to wait for its response, a hung request would hold up its polls
+sporting_life_connect_timeout = 5
+sporting_life_read_timeout = 10
@@ -1,9 +1,11 @@
 import logging
+import betbot_cache
 import betbot_db
 import settings
 from copy import deepcopy
 from datetime import datetime
 from strategies import helpers
+from strategies.features import get_features
 
 # Set up logging
 logger = logging.getLogger('ABS1')
@@ -58,7 +60,7 @@ class BetAllStrategy(object):
         self.previous_state = deepcopy(self.state)
         if self.state['updatedDate'] < helpers.get_start_of_day():  # Once a day
             self.logger.info('Updating state at beginning of new day.')
-            if helpers.strategy_won_yesterday(self.reference):
+            if betbot_cache.strategy_ledger.won_yesterday(self.reference):
                 self.logger.info('Won yesterday.')
                 if self.state['weightLadderPosition'] > 0:
                     self.state['weightLadderPosition'] -= 1
@@ -83,7 +85,7 @@ class BetAllStrategy(object):
             self.state['stopLoss'] = False
             self.logger.info('Removed any stop loss from the previous day.')
         else:  # Once a race
-            if helpers.strategy_won_last_market_today(self.reference):
+            if betbot_cache.strategy_ledger.won_last_market_today(self.reference):
                 self.logger.info('Won last race.')
                 self.state['stakeLadderPosition'] = 0
                 self.logger.info('Reset stake ladder.')
@@ -114,7 +116,8 @@ class BetAllStrategy(object):
             if self.state['stopLoss']:
                 self.logger.info('Stop loss triggered, no more bets today.')
             else:
-                runner = helpers.get_favourite(market_book)
+                features = get_features(market_book)
+                runner = features.favourite
                 if runner:
                     stake = helpers.get_stake_by_ladder_position(self.state['stakeLadderPosition'])
                     weight = helpers.get_weight_by_ladder_position(self.state['weightLadderPosition'])
@@ -126,7 +129,7 @@ class BetAllStrategy(object):
                         'orderType': 'LIMIT',
                         'limitOrder': {
                             'size': stake * weight,
-                            'price': helpers.get_back_limit_price(runner, stake * weight),
+                            'price': features.get_back_limit_price(runner['selectionId'], stake * weight),
                             'persistenceType': 'LAPSE',
                             'timeInForce': 'FILL_OR_KILL'
                         }}
@@ -1,9 +1,11 @@
 import logging
+import betbot_cache
 import betbot_db
 import settings
 from copy import deepcopy
 from datetime import datetime
 from strategies import helpers
+from strategies.features import get_features
 
 # Set up logging
 logger = logging.getLogger('BOS1')
@@ -58,7 +60,7 @@ class BetOddsStrategy(object):
         self.previous_state = deepcopy(self.state)
         if self.state['updatedDate'] < helpers.get_start_of_day():  # Once a day
             self.logger.info('Updating state at beginning of new day.')
-            if helpers.strategy_won_yesterday(self.reference):
+            if betbot_cache.strategy_ledger.won_yesterday(self.reference):
                 self.logger.info('Won yesterday.')
                 if self.state['weightLadderPosition'] > 0:
                     self.state['weightLadderPosition'] -= 1
@@ -83,7 +85,7 @@ class BetOddsStrategy(object):
             self.state['stopLoss'] = False
             self.logger.info('Removed any stop loss from the previous day.')
         else:  # Once a race
-            if helpers.strategy_won_last_market_today(self.reference):
+            if betbot_cache.strategy_ledger.won_last_market_today(self.reference):
                 self.logger.info('Won last race.')
                 self.state['sequentialLosses'] = 0
                 self.logger.info('Reset sequential losses to 0.')
@@ -93,18 +95,13 @@ class BetOddsStrategy(object):
                 self.logger.info('Lost last race.')
                 self.state['sequentialLosses'] += 1
                 self.logger.info('Incremented sequential losses by 1.')
-                if self.state['sequentialLosses'] == 3:
+                if self.state['sequentialLosses'] == settings.bet_odds_max_losses:
                     self.state['stopLoss'] = True
-                    self.logger.info('5 races lost in a row, triggering stop loss.')
-                last_order = betbot_db.order_repo.get_latest_today_by_strategy(self.reference)
-                if last_order:
-                    last_instruction = betbot_db.instruction_repo.get_by_id(last_order['betId'])
-                    if last_instruction:
-                        last_stake = last_instruction['instruction']['limitOrder']['size']
-                        self.state['lostStakeSum'] += last_stake
-                        self.logger.info('Incremented lost stake sum by £%s' % last_stake)
-                    else:
-                        self.logger.info('Failed to increment last stake sum, no previous instruction found.')
+                    self.logger.info('%s races lost in a row, triggering stop loss.' % settings.bet_odds_max_losses)
+                last_stake = betbot_cache.strategy_ledger.get_last_stake_today(self.reference)
+                if last_stake is not None:
+                    self.state['lostStakeSum'] += last_stake
+                    self.logger.info('Incremented lost stake sum by £%s' % last_stake)
                 else:
                     self.logger.info('Last stake sum not incremented, no previous order found.')
         betbot_db.strategy_repo.upsert(self.state)
@@ -119,7 +116,8 @@ class BetOddsStrategy(object):
                 self.logger.info('Stop loss triggered, no more bets today.')
                 return bets
             self.update_state()
-            runner = helpers.get_favourite(market_book)
+            features = get_features(market_book)
+            runner = features.favourite
             if runner:
                 adjusted_last_price = runner['lastPriceTraded'] - 1
                 if self.state['lostStakeSum'] == 0:
@@ -127,8 +125,8 @@ class BetOddsStrategy(object):
                 else:
                     stake = (self.state['lostStakeSum'] + adjusted_last_price) / adjusted_last_price
                 weight = helpers.get_weight_by_ladder_position(self.state['weightLadderPosition'])
-                price = helpers.get_back_limit_price(runner, stake * weight)
-                if price < 2:
+                price = features.get_back_limit_price(runner['selectionId'], stake * weight)
+                if price < settings.bet_odds_max_price:
                     new_bet = {
                         'customerOrderRef': helpers.get_unique_ref(self.reference),
                         'selectionId': runner['selectionId'],
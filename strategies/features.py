@@ -0,0 +1,102 @@
+import bisect
+import threading
+from collections import OrderedDict
+
+from betfair import ladder
+from strategies import helpers
+
+SIDES = {'BACK': 'availableToBack', 'LAY': 'availableToLay'}
+
+
+class BookFeatures(object):
+    """features of one market book snapshot, derived in a single pass over its runners and levels and
+       shared read-only by every strategy playing the book. Prices match the strategies.helpers
+       functions they replace, e.g. get_back_limit_price(selection_id, stake) equals
+       helpers.get_back_limit_price(runner, stake).
+    """
+    def __init__(self, market_book=None):
+        self.market_id = market_book['marketId']
+        self.runners = {}  # keys = selection ids, vals = runners as in the book
+        self.best_back = {}  # keys = selection ids, vals = best price available to back (None if none)
+        self.best_lay = {}  # keys = selection ids, vals = best price available to lay (None if none)
+        self.spreads = {}  # keys = selection ids, vals = ticks between best back and best lay (None if one-sided)
+        # keys = (selection id, side), vals = (cumulative sizes, prices) of the levels, best first
+        self.depth_curves = {}
+        favourites = []
+        overround = 0.0
+        for runner in market_book['runners']:
+            selection_id = runner['selectionId']
+            self.runners[selection_id] = runner
+            exchange = runner.get('ex', {})
+            for side, levels_name in SIDES.items():
+                depths = []
+                depth = 0.0
+                for level in exchange.get(levels_name, []):
+                    depth += level['size']
+                    depths.append(depth)
+                self.depth_curves[(selection_id, side)] = (depths, [level['price'] for level in exchange.get(levels_name, [])])
+            back_levels = exchange.get('availableToBack', [])
+            lay_levels = exchange.get('availableToLay', [])
+            self.best_back[selection_id] = back_levels[0]['price'] if back_levels else None
+            self.best_lay[selection_id] = lay_levels[0]['price'] if lay_levels else None
+            if back_levels and lay_levels:
+                self.spreads[selection_id] = ladder.tick_distance(back_levels[0]['price'], lay_levels[0]['price'])
+            else:
+                self.spreads[selection_id] = None
+            if runner['status'] == 'ACTIVE':
+                if back_levels:
+                    overround += 1.0 / back_levels[0]['price']
+                if 'lastPriceTraded' in runner:
+                    favourites.append((runner['lastPriceTraded'], len(favourites), runner))
+        favourites.sort(key=lambda favourite: favourite[:2])  # first listed wins a tie, as in helpers.get_favourite
+        self.favourite = favourites[0][2] if favourites else None
+        self.second_favourite = favourites[1][2] if len(favourites) > 1 else None
+        self.overround = overround  # of the best back prices of the active runners, 1.0 is a fair book
+
+    def get_limit_price(self, selection_id=0, side='BACK', stake=0.0):
+        """price of the level at which the stake would be fully matched, 0.0 if there are no levels"""
+        depths, prices = self.depth_curves.get((selection_id, side), ([], []))
+        if not depths:
+            return 0.0
+        index = bisect.bisect_right(depths, stake)  # first level whose cumulative depth exceeds the stake
+        if index == len(depths):
+            msg = "Insufficient market depth found for a stake of £%s." % stake
+            raise helpers.MarketDepthError(depths[-1], stake, msg)
+        return prices[index]
+
+    def get_back_limit_price(self, selection_id=0, stake=0.0):
+        return self.get_limit_price(selection_id, 'BACK', stake)
+
+    def get_lay_limit_price(self, selection_id=0, stake=0.0):
+        return self.get_limit_price(selection_id, 'LAY', stake)
+
+
+class FeatureCache(object):
+    """memoizes BookFeatures per market book snapshot. Books are never modified once built, so the
+       book object identifies the snapshot; the cache holds a reference to it so the id isn't reused.
+    """
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.features = OrderedDict()  # keys = id of the market book, vals = (market book, features)
+
+    def get(self, market_book=None):
+        key = id(market_book)
+        with self.lock:
+            entry = self.features.get(key)
+            if entry and entry[0] is market_book:
+                return entry[1]
+        features = BookFeatures(market_book)
+        with self.lock:
+            self.features[key] = (market_book, features)
+            while len(self.features) > self.max_entries:
+                self.features.popitem(last=False)
+        return features
+
+
+feature_cache = FeatureCache()
+
+
+def get_features(market_book=None):
+    """returns the (memoized) BookFeatures of the market book"""
+    return feature_cache.get(market_book)
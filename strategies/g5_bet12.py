@@ -1,8 +1,10 @@
 import logging
+import betbot_cache
 import betbot_db
 from copy import deepcopy
 from datetime import datetime
 from strategies import helpers
+from strategies.features import get_features
 
 # Set up logging
 logger = logging.getLogger('G5B12')
@@ -39,7 +41,7 @@ class Group5Bet12Strategy(object):
     def update_state(self):
         self.previous_state = deepcopy(self.state)
         self.state['groupPosition'] += 1
-        if self.state['groupPosition'] > 0 and helpers.strategy_won_last_market(self.reference):
+        if self.state['groupPosition'] > 0 and betbot_cache.strategy_ledger.won_last_market(self.reference):
             self.state['stop'] = True
         self.logger.info('Incremented group position to %s.' % self.state['groupPosition'])
         if self.state['groupPosition'] == 5:
@@ -58,10 +60,11 @@ class Group5Bet12Strategy(object):
             if self.state['stop']:
                 self.logger.info('Group stop triggered, no more bets in this race grouping.')
                 return bets
-            runner = helpers.get_favourite(market_book)
+            features = get_features(market_book)
+            runner = features.favourite
             if runner:
                 stake = self.state['startingStake'] * self.state['stakeLadder'][self.state['groupPosition']]
-                price = helpers.get_back_limit_price(runner, stake)
+                price = features.get_back_limit_price(runner['selectionId'], stake)
                 if not self.state['stop']:
                     if 2.0 <= price <= 3.0:
                         new_bet = {
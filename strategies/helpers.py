@@ -2,11 +2,13 @@ import os
 import logging
 import settings
 import time
-import betbot_db
 from datetime import datetime, timedelta
 
 module_logger = logging.getLogger('betbot_application.betbot_db')
 
+# Returns the current UTC time when set, e.g. the backtester replays history on its own clock.
+clock = None
+
 
 class MarketDepthError(Exception):
     def __init__(self, depth=0.0, stake=0.0, msg=None):
@@ -17,6 +19,10 @@ class MarketDepthError(Exception):
         self.stake = stake
 
 
+def utcnow():
+    return clock() if clock else datetime.utcnow()
+
+
 def get_log_level():
     level = logging.DEBUG
     if 'LOG_LEVEL' in os.environ:
@@ -46,46 +52,6 @@ def get_lay_liability(stake=0.0, price=0.0):
     return stake * (price - 1.0)
 
 
-def strategy_won_yesterday(strategy_ref=''):
-    # Find all cleared orders (profit attribute exists) for this strategy from yesterday and sum the profit.
-    # if sum(profit) < 0 then False otherwise True (profit >= 0 or no cleared orders)
-    orders = betbot_db.order_repo.get_settled_yesterday_by_strategy(strategy_ref)
-    if len(orders) == 0:
-        return True  # if there are no orders default to True
-    profit = 0.0
-    for order in orders:
-        profit += order['profit']
-    return profit >= 0.0
-
-
-def strategy_won_last_market(strategy_ref=''):
-    """return True if the most recent bet made by the strategy WON
-       or if there is no previous bet made by the strategy, False otherwise"""
-    module_logger.info("Getting last settled order for strategy %s" % strategy_ref)
-    order = betbot_db.order_repo.get_latest_settled_by_strategy(strategy_ref)
-    module_logger.info(order)
-    if order:
-        if order['betOutcome'] == 'LOST':
-            return False
-        else:
-            return True
-    else:
-        return True
-
-
-def strategy_won_last_market_today(strategy_ref=''):
-    """return True if the most recent bet made by the strategy WON
-       or if there is no previous bet made by the strategy, False otherwise"""
-    order = betbot_db.order_repo.get_latest_settled_today_by_strategy(strategy_ref)
-    if order:
-        if 'betOutcome' in order and order['betOutcome'] == 'LOST':
-            return False
-        else:
-            return True
-    else:
-        return True
-
-
 def get_favourite(market_book=None):
     favourite = None
     best_price = float("inf")
@@ -137,30 +103,45 @@ def get_limit_price(market_levels=None, stake=0.0):
         return 0.0
 
 
-def get_start_of_day():
-    now = datetime.utcnow()
+# TODO: Check calculation for LAY profit/loss
+# TODO: Factor in Betfair commission including point reduction
+def calculate_profit(side='', size=0.0, price=0.0, bet_outcome=''):
+    if side == "BACK":
+        if bet_outcome == 'WON':
+            return size * (price - 1.0)
+        else:  # LOST
+            return size * -1.0
+    else:  # side == 'LAY'
+        if bet_outcome == 'WON':
+            return size
+        else:
+            return size * price * -1
+
+
+def get_start_of_day(date=None):
+    now = date or utcnow()
     return datetime(now.year, now.month, now.day, 0, 0)
 
 
 def get_tomorrow_start_of_day():
-    now = datetime.utcnow()
+    now = utcnow()
     sod = datetime(now.year, now.month, now.day, 0, 0)
     return sod + timedelta(days=1)
 
 
-def get_start_of_week():
-    now = datetime.utcnow()
+def get_start_of_week(date=None):
+    now = date or utcnow()
     sod = datetime(now.year, now.month, now.day, 0, 0)
-    return sod - timedelta(days=(datetime.today().isoweekday() % 7) - 1)
+    return sod - timedelta(days=now.weekday())  # Monday
 
 
-def get_start_of_month():
-    now = datetime.utcnow()
+def get_start_of_month(date=None):
+    now = date or utcnow()
     return datetime(now.year, now.month, 1, 0, 0)
 
 
-def get_start_of_year():
-    now = datetime.utcnow()
+def get_start_of_year(date=None):
+    now = date or utcnow()
     return datetime(now.year, 1, 1, 0, 0)
 
 
@@ -1,9 +1,11 @@
 import logging
+import betbot_cache
 import betbot_db
 import settings
 from copy import deepcopy
 from datetime import datetime
 from strategies import helpers
+from strategies.features import get_features
 
 # Set up logging
 logger = logging.getLogger('ALS1')
@@ -46,7 +48,7 @@ class LayAllStrategy(object):
         self.previous_state = deepcopy(self.state)
         if self.state['updatedDate'] < helpers.get_start_of_day():
             self.logger.info('Updating state at beginning of new day.')
-            if helpers.strategy_won_yesterday(self.reference):
+            if betbot_cache.strategy_ledger.won_yesterday(self.reference):
                 self.logger.info('Won yesterday.')
                 if self.state['weightLadderPosition'] > 0:
                     self.state['weightLadderPosition'] -= 1
@@ -75,7 +77,8 @@ class LayAllStrategy(object):
                 self.update_state()
                 stake = helpers.get_stake_by_ladder_position(0)  # fixed staking plan
                 weight = helpers.get_weight_by_ladder_position(self.state['weightLadderPosition'])
-                runner = helpers.get_favourite(market_book)
+                features = get_features(market_book)
+                runner = features.favourite
                 if runner:
                     new_bet = {
                         'customerOrderRef': helpers.get_unique_ref(self.reference),
@@ -85,7 +88,7 @@ class LayAllStrategy(object):
                         'orderType': 'LIMIT',
                         'limitOrder': {
                             'size': stake * weight,
-                            'price': helpers.get_lay_limit_price(runner, stake * weight),
+                            'price': features.get_lay_limit_price(runner['selectionId'], stake * weight),
                             'persistenceType': 'LAPSE',
                             'timeInForce': 'FILL_OR_KILL'
                         }}
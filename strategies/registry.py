@@ -0,0 +1,116 @@
+import importlib
+import inspect
+import logging
+import pkgutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from copy import deepcopy
+from time import monotonic
+
+import betbot_db
+import settings
+from strategies import helpers
+
+# Set up logging
+logger = logging.getLogger('STREG')
+logger.setLevel(helpers.get_log_level())
+ch = logging.StreamHandler()
+ch.setLevel(helpers.get_log_level())
+formatter = logging.Formatter('(%(name)s) - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# Modules of the strategies package that hold shared code rather than strategies
+SUPPORT_MODULES = ['features', 'helpers', 'registry']
+
+
+def discover():
+    """returns the strategy classes of the strategies package, i.e. the classes named *Strategy with a
+       create_bets method defined in its modules, ordered by module then class name. Classes named in
+       settings.disabled_strategies are left out.
+    """
+    import strategies
+    strategy_classes = []
+    for module_info in sorted(pkgutil.iter_modules(strategies.__path__), key=lambda info: info[1]):
+        module_name = module_info[1]
+        if module_name in SUPPORT_MODULES:
+            continue
+        module = importlib.import_module('%s.%s' % (strategies.__name__, module_name))
+        for class_name, strategy_class in sorted(inspect.getmembers(module, inspect.isclass)):
+            if strategy_class.__module__ != module.__name__ or not class_name.endswith('Strategy'):
+                continue
+            if not callable(getattr(strategy_class, 'create_bets', None)):
+                continue
+            if class_name in settings.disabled_strategies:
+                logger.info('Strategy %s is disabled.' % class_name)
+                continue
+            strategy_classes.append(strategy_class)
+    return strategy_classes
+
+
+class StrategyRegistry(object):
+    """the discovered strategies, evaluated concurrently against a market. Each strategy has its own time
+       budget (a time_budget attribute, else settings.strategy_time_budget) counted from when evaluation
+       starts; a strategy missing it is logged and left out of that market rather than holding up the others,
+       and once it finishes its state is reverted to what it was before that market. A strategy is marked busy
+       before it is submitted and skipped until it finishes, so no strategy ever runs twice at once.
+    """
+    def __init__(self, strategy_classes=None):
+        self.logger = logging.getLogger('STREG')
+        self.strategies = [strategy_class() for strategy_class in (strategy_classes or discover())]
+        self.executor = ThreadPoolExecutor(max(len(self.strategies), 1))
+        self.lock = threading.Lock()
+        self.busy = set()  # strategies submitted and not yet finished
+        self.discarded = set()  # busy strategies whose evaluation missed its time budget
+        self.logger.info('Registered strategies: %s' % ', '.join(strategy.reference for strategy in self.strategies))
+
+    def get_time_budget(self, strategy=None):
+        return getattr(strategy, 'time_budget', settings.strategy_time_budget)
+
+    def evaluate(self, market=None, market_book=None):
+        """returns {strategy ref: bets} of the strategies that created their bets within their time budget"""
+        started = monotonic()
+        futures = {}
+        states = {}  # keys = strategies, vals = their state before this market
+        for strategy in self.strategies:
+            with self.lock:
+                if strategy in self.busy:
+                    self.logger.warning('Strategy %s is still busy with an earlier market, skipping %s.' %
+                                        (strategy.reference, market['marketId']))
+                    continue
+                self.busy.add(strategy)
+            states[strategy] = deepcopy(strategy.state)
+            futures[strategy] = self.executor.submit(self.run, strategy, states[strategy], market, market_book)
+        strategy_bets = {}
+        for strategy, future in futures.items():
+            timeout = max(started + self.get_time_budget(strategy) - monotonic(), 0)
+            try:
+                strategy_bets[strategy.reference] = future.result(timeout)
+            except TimeoutError:
+                self.logger.warning('Strategy %s missed its %ss budget on %s, dropping its bets.' %
+                                    (strategy.reference, self.get_time_budget(strategy), market['marketId']))
+                with self.lock:
+                    if strategy in self.busy:
+                        self.discarded.add(strategy)  # reverted by run() when it finishes
+                    else:  # finished since timing out
+                        self.revert(strategy, states[strategy])
+            except Exception as exc:
+                self.logger.error('Strategy %s failed to create bets on %s: %s' %
+                                  (strategy.reference, market['marketId'], exc))
+        return strategy_bets
+
+    def run(self, strategy=None, state=None, market=None, market_book=None):
+        try:
+            return strategy.create_bets(market, market_book)
+        finally:
+            with self.lock:
+                if strategy in self.discarded:
+                    self.discarded.remove(strategy)
+                    self.revert(strategy, state)
+                self.busy.remove(strategy)
+
+    def revert(self, strategy=None, state=None):
+        # The lock must be held.
+        strategy.state = deepcopy(state)
+        betbot_db.strategy_repo.upsert(strategy.state)
+        self.logger.info('Reverted strategy %s to its state before the market it missed.' % strategy.reference)
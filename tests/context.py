@@ -2,4 +2,5 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# do imports here
\ No newline at end of file
+# do imports here
+import betfair
@@ -0,0 +1,127 @@
+import os
+import random
+from copy import deepcopy
+
+import pytest
+
+from context import betfair
+from betfair import ladder
+pytest.importorskip('pymongo')  # the strategies package imports betbot_db
+pytest.importorskip('dateutil')
+os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017/betbot')  # never connected to
+from strategies import helpers
+from strategies.features import BookFeatures, FeatureCache, get_features
+
+
+def get_book(rng=None, market_id='1.1'):
+    """a random book on the price ladder. Last traded prices are drawn from a few ticks so favourites
+       tie, and some runners are removed, haven't traded or have an empty side.
+    """
+    runners = []
+    for selection_id in range(1, rng.randint(1, 10) + 1):
+        runner = {'selectionId': selection_id, 'status': 'REMOVED' if rng.random() < 0.1 else 'ACTIVE',
+                  'ex': {'availableToBack': [], 'availableToLay': []}}
+        if rng.random() < 0.9:
+            runner['lastPriceTraded'] = ladder.tick_to_price(rng.randint(10, 14))
+        best_back = rng.randint(ladder.MIN_TICK, ladder.MAX_TICK - 20)
+        best_lay = best_back + rng.randint(1, 5)
+        for side, tick, step in [('availableToBack', best_back, -1), ('availableToLay', best_lay, 1)]:
+            if rng.random() < 0.1:
+                continue
+            for level in range(rng.randint(1, 3)):
+                tick = ladder.clamp_tick(tick + step * level)
+                runner['ex'][side].append({'price': ladder.tick_to_price(tick), 'size': float(rng.randint(1, 50))})
+        runners.append(runner)
+    return {'marketId': market_id, 'status': 'OPEN', 'inplay': False, 'runners': runners}
+
+
+def get_books(count=200):
+    rng = random.Random(7)
+    return [get_book(rng) for i in range(count)]
+
+
+def get_limit_price(get_price=None, *args):
+    """the price, or the exception class when the book is too thin"""
+    try:
+        return get_price(*args)
+    except helpers.MarketDepthError:
+        return helpers.MarketDepthError
+
+
+class TestBookFeatures(object):
+    def test_favourites_match_helpers(self):
+        ties = 0
+        for market_book in get_books():
+            features = BookFeatures(market_book)
+            favourite = helpers.get_favourite(market_book)
+            assert features.favourite is favourite
+            others = dict(market_book, runners=[runner for runner in market_book['runners'] if runner is not favourite])
+            assert features.second_favourite is helpers.get_favourite(others)
+            if favourite and features.second_favourite:
+                ties += favourite['lastPriceTraded'] == features.second_favourite['lastPriceTraded']
+        assert ties > 0
+
+    def test_best_prices_spreads_and_overround(self):
+        for market_book in get_books():
+            features = BookFeatures(market_book)
+            overround = 0.0
+            for runner in market_book['runners']:
+                back_levels = runner['ex']['availableToBack']
+                lay_levels = runner['ex']['availableToLay']
+                best_back = back_levels[0]['price'] if back_levels else None
+                best_lay = lay_levels[0]['price'] if lay_levels else None
+                assert features.best_back[runner['selectionId']] == best_back
+                assert features.best_lay[runner['selectionId']] == best_lay
+                spread = None
+                if best_back and best_lay:
+                    spread = ladder.price_to_tick(best_lay) - ladder.price_to_tick(best_back)
+                assert features.spreads[runner['selectionId']] == spread
+                if runner['status'] == 'ACTIVE' and best_back:
+                    overround += 1.0 / best_back
+            assert features.overround == pytest.approx(overround)
+
+    def test_limit_prices_match_helpers(self):
+        sides = [('availableToBack', 'get_back_limit_price'), ('availableToLay', 'get_lay_limit_price')]
+        for market_book in get_books():
+            features = BookFeatures(market_book)
+            for runner in market_book['runners']:
+                for levels_name, function_name in sides:
+                    depths = [0.0]
+                    for level in runner['ex'][levels_name]:
+                        depths.append(depths[-1] + level['size'])
+                    # Stakes exactly at the cumulative depths, between them and beyond them.
+                    for stake in depths + [depth + 0.5 for depth in depths]:
+                        assert get_limit_price(getattr(features, function_name), runner['selectionId'], stake) == \
+                            get_limit_price(getattr(helpers, function_name), runner, stake)
+
+    def test_unknown_selection_has_no_limit_price(self):
+        features = BookFeatures({'marketId': '1.1', 'runners': []})
+        assert features.get_back_limit_price(1, 2.0) == 0.0
+        assert features.favourite is None and features.second_favourite is None
+
+
+class TestFeatureCache(object):
+    def test_memoizes_by_book(self):
+        cache = FeatureCache()
+        market_book = get_books(1)[0]
+        features = cache.get(market_book)
+        assert cache.get(market_book) is features
+        # An equal book is a different snapshot.
+        assert cache.get(deepcopy(market_book)) is not features
+
+    def test_evicts_the_oldest_books(self):
+        cache = FeatureCache(max_entries=2)
+        market_books = get_books(3)
+        features = [cache.get(market_book) for market_book in market_books]
+        assert len(cache.features) == 2
+        assert cache.get(market_books[2]) is features[2]
+        assert cache.get(market_books[0]) is not features[0]
+
+    def test_holds_the_book_so_its_id_is_not_reused(self):
+        cache = FeatureCache()
+        features = cache.get(get_books(1)[0])
+        assert all(cache.get(get_book(random.Random(i), '1.%s' % i)) is not features for i in range(50))
+
+    def test_strategies_share_the_features_of_a_book(self):
+        market_book = get_books(1)[0]
+        assert get_features(market_book) is get_features(market_book)
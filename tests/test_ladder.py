@@ -0,0 +1,53 @@
+import pytest
+
+from context import betfair
+from betfair import ladder
+from betfair.price_mod import convert_price, get_price_spread
+
+
+class TestLadder(object):
+    def test_rounds_to_valid_prices(self):
+        assert convert_price(3.485327) == 3.5
+        assert convert_price(3.485327, False) == 3.45
+        assert convert_price(2.0) == 2.0
+        assert convert_price(2.0, False) == 2.0
+        assert convert_price(1000) == 1000.0
+
+    def test_ignores_float_noise(self):
+        assert convert_price(1.1 * 3 / 3, False) == 1.1
+        assert convert_price(0.1 + 0.2 + 1, True) == 1.3
+        assert ladder.is_valid_price(0.1 + 0.2 + 1)
+
+    def test_adds_pips(self):
+        assert convert_price(1.99, True, 2) == 2.02
+        assert convert_price(2.02, True, -2) == 1.99
+        assert ladder.add_ticks(1000, 5, clamp=True) == 1000.0
+        assert ladder.add_ticks(1.02, -5, clamp=True) == 1.01
+
+    def test_out_of_bounds(self):
+        for price, pips in [(1.0, 0), (1000.5, 0), (1.01, -1), (1000, 1)]:
+            with pytest.raises(Exception) as exc:
+                convert_price(price, True, pips)
+            assert 'PRICE_OUT_OF_BOUNDS' in str(exc.value)
+
+    def test_tick_distance(self):
+        assert get_price_spread(2.0, 1.98) == 2
+        assert get_price_spread(1.98, 2.0) == 2
+        assert ladder.tick_distance(2.0, 1.98) == -2
+        assert ladder.tick_distance(1.01, 1000) == len(ladder.price_increments) - 1
+        with pytest.raises(Exception):
+            get_price_spread(2.01, 2.0)
+
+    def test_clamp_price(self):
+        assert ladder.clamp_price(0.5) == 1.01
+        assert ladder.clamp_price(5000) == 1000.0
+        assert ladder.clamp_price(4.05) == 4.1
+
+    def test_vectorized_matches_scalar(self):
+        prices = [1.011, 1.5, 2.01, 3.485327, 19.9, 989.9]
+        for round_up in [True, False]:
+            expected = [convert_price(p, round_up, 1) for p in prices]
+            assert list(ladder.convert_prices(prices, round_up, 1)) == expected
+            ticks = ladder.prices_to_ticks(prices, round_up)
+            assert list(ticks) == [ladder.price_to_tick(p, round_up) for p in prices]
+            assert list(ladder.ticks_to_prices(ticks)) == [convert_price(p, round_up) for p in prices]
@@ -0,0 +1,100 @@
+import os
+import threading
+from time import sleep
+
+import pytest
+
+from context import betfair
+pytest.importorskip('pymongo')  # the strategies import betbot_db
+pytest.importorskip('dateutil')
+os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017/betbot')  # never connected to
+import betbot_db
+from strategies.registry import StrategyRegistry
+
+
+class FakeStrategyRepository(object):
+    def __init__(self):
+        self.states = []  # every state upserted
+
+    def upsert(self, strategy_state=None):
+        self.states.append(dict(strategy_state))
+        return strategy_state
+
+
+class SlowStrategy(object):
+    """climbs its stake ladder on every market once released"""
+    time_budget = 0.05
+
+    def __init__(self, reference='SLOW'):
+        self.reference = reference
+        self.state = {'strategyRef': self.reference, 'stakeLadderPosition': 0}
+        self.release = threading.Event()
+        self.running = 0
+        self.peak = 0  # most evaluations ever running at once
+        self.calls = 0
+
+    def create_bets(self, market=None, market_book=None):
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.release.wait()
+        self.state['stakeLadderPosition'] += 1
+        betbot_db.strategy_repo.upsert(self.state)
+        self.running -= 1
+        return [{'selectionId': 1}]
+
+
+class FastStrategy(SlowStrategy):
+    def __init__(self):
+        SlowStrategy.__init__(self, 'FAST')
+        self.release.set()
+
+
+class TestStrategyRegistry(object):
+    def setup_method(self, method):
+        self.saved = betbot_db.strategy_repo
+        betbot_db.strategy_repo = FakeStrategyRepository()
+        self.registry = StrategyRegistry([SlowStrategy, FastStrategy])
+        self.slow, self.fast = self.registry.strategies
+
+    def teardown_method(self, method):
+        self.slow.release.set()
+        self.registry.executor.shutdown()
+        betbot_db.strategy_repo = self.saved
+
+    def wait_until_idle(self):
+        for i in range(100):
+            if not self.registry.busy:
+                return
+            sleep(0.01)
+
+    def test_late_strategy_is_dropped_and_skipped_until_it_finishes(self):
+        assert self.registry.evaluate({'marketId': '1.1'}, {}) == {'FAST': [{'selectionId': 1}]}
+        assert self.registry.evaluate({'marketId': '1.2'}, {}) == {'FAST': [{'selectionId': 1}]}
+        assert self.slow.calls == 1 and self.fast.calls == 2
+        self.slow.release.set()
+        self.wait_until_idle()
+        assert self.registry.evaluate({'marketId': '1.3'}, {}) == {'FAST': [{'selectionId': 1}],
+                                                                   'SLOW': [{'selectionId': 1}]}
+
+    def test_late_strategy_state_is_reverted_once_it_finishes(self):
+        self.registry.evaluate({'marketId': '1.1'}, {})
+        self.slow.release.set()
+        self.wait_until_idle()
+        # The in-flight update was made, then undone both in memory and in MongoDB.
+        assert [state['stakeLadderPosition'] for state in betbot_db.strategy_repo.states
+                if state['strategyRef'] == 'SLOW'] == [1, 0]
+        assert self.slow.state['stakeLadderPosition'] == 0
+        assert self.fast.state['stakeLadderPosition'] == 1
+
+    def test_strategy_never_runs_twice_at_once(self):
+        threads = [threading.Thread(target=self.registry.evaluate, args=({'marketId': '1.%s' % i}, {}))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.slow.release.set()
+        self.wait_until_idle()
+        assert self.slow.calls == 1 and self.slow.peak == 1
+        assert self.fast.peak == 1
@@ -0,0 +1,139 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from context import betfair
+pytest.importorskip('bs4')
+from results.consensus import Consensus
+from results.parsers import normalize_name, parse_closed_winner, parse_fast_results, parse_indicative_winner
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_fixture(filename):
+    with open(os.path.join(FIXTURES, filename), 'rb') as f:
+        return f.read()
+
+
+class TestParsers(object):
+    def test_parses_fast_results(self):
+        results = parse_fast_results(load_fixture('fast_results.html'), datetime(2018, 3, 1))
+        assert results == [
+            {'startTime': datetime(2018, 3, 1, 14, 30), 'venue': 'Ascot', 'runnerName': "Rock's Lad"},
+            {'startTime': datetime(2018, 3, 1, 14, 45), 'venue': 'Newton', 'runnerName': 'Blue Lagoon'}
+        ]
+
+    def test_normalizes_names(self):
+        assert normalize_name("Rock's Lad (IRE)") == normalize_name('ROCKS LAD') == 'rockslad'
+
+    def test_parses_closed_market_book(self):
+        market_book = json.loads(load_fixture('market_book_closed.json').decode('utf-8'))
+        assert parse_closed_winner(market_book) == 23456
+        market_book['status'] = 'OPEN'
+        assert parse_closed_winner(market_book) is None
+
+    def test_parses_indicative_winner(self):
+        market_book = {'status': 'OPEN', 'runners': [
+            {'selectionId': 1, 'ex': {'availableToLay': [{'price': 3.0, 'size': 10.0}]}},
+            {'selectionId': 2, 'ex': {'availableToLay': [{'price': 1.02, 'size': 10.0}]}}
+        ]}
+        assert parse_indicative_winner(market_book) == 2
+        assert parse_indicative_winner(market_book, 1.01) is None
+
+
+class TestConsensus(object):
+    def test_resolves_at_quorum(self):
+        consensus = Consensus(1.0)
+        assert consensus.add('1.1', 'book_heuristic', 2, 0.4) is None
+        assert consensus.add('1.1', 'sporting_life', 2, 0.7) == 2
+        assert consensus.add('1.1', 'market_status', 2, 1.0) is None  # already resolved
+        assert consensus.resolved == {'1.1': 2}
+
+    def test_disagreeing_sources(self):
+        consensus = Consensus(1.0)
+        assert consensus.add('1.1', 'book_heuristic', 2, 0.4) is None
+        assert consensus.add('1.1', 'sporting_life', 3, 0.7) is None
+        assert consensus.add('1.1', 'book_heuristic', 3, 0.4) == 3  # a source's latest claim counts
+
+    def test_authoritative_claim_corrects_the_winner(self):
+        consensus = Consensus(1.0)
+        consensus.add('1.1', 'book_heuristic', 3, 0.4)
+        consensus.add('1.1', 'sporting_life', 3, 0.7)
+        assert consensus.is_open('1.1', 1.0) and not consensus.is_open('1.1', 0.7)
+        assert consensus.add('1.1', 'sporting_life', 2, 0.7) is None
+        assert consensus.add('1.1', 'market_status', 2, 1.0) == 2
+        assert consensus.resolved == {'1.1': 2} and not consensus.is_open('1.1', 1.0)
+        assert consensus.add('1.1', 'other_status', 3, 1.0) is None  # confirmed
+
+    def test_scraped_result_publishes_until_settled(self):
+        consensus = Consensus(0.7, 1.0)
+        assert consensus.add('1.1', 'book_heuristic', 3, 0.4) is None
+        assert consensus.add('1.2', 'sporting_life', 3, 0.7) == 3
+        assert consensus.is_open('1.2', 1.0) and not consensus.is_open('1.2', 0.7)
+        assert consensus.add('1.2', 'market_status', 2, 1.0) == 2
+
+    def test_prunes_markets(self):
+        consensus = Consensus(1.0)
+        consensus.add('1.1', 'market_status', 2, 1.0)
+        consensus.add('1.2', 'book_heuristic', 2, 0.4)
+        consensus.prune(['1.3'])
+        assert consensus.resolved == {} and consensus.votes == {} and consensus.confirmed == set()
+
+
+class FakeResponse(object):
+    def __init__(self, status=200, data=b'', headers=None):
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+
+class FakeHttp(object):
+    def __init__(self, responses=None):
+        self.responses = list(responses)
+        self.requests = []  # headers of every request made
+
+    def request(self, method='GET', url='', headers=None, timeout=None):
+        assert timeout is not None
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+class TestSportingLifeSource(object):
+    def setup_method(self, method):
+        pytest.importorskip('pymongo')  # the sources look runners up through betbot_db
+        pytest.importorskip('urllib3')
+        os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017/betbot')  # never connected to
+
+    def get_source(self, responses=None):
+        from results.sources import SportingLifeSource
+        source = SportingLifeSource()
+        source.http = FakeHttp(responses)
+        return source
+
+    def test_fetches_conditionally(self):
+        page = load_fixture('fast_results.html')
+        source = self.get_source([FakeResponse(200, page, {'ETag': '"v1"'}), FakeResponse(304)])
+        assert source.fetch() == page
+        assert source.fetch() is None
+        assert source.http.requests == [{}, {'If-None-Match': '"v1"'}]
+
+    def test_skips_unchanged_pages(self):
+        page = load_fixture('fast_results.html')
+        source = self.get_source([FakeResponse(200, page), FakeResponse(200, page)])  # no validators
+        assert source.fetch() == page
+        assert source.fetch() is None
+
+    def test_matches_results_to_pending_markets(self, monkeypatch):
+        import betbot_db
+        today = datetime.utcnow()
+        runners = [{'selectionId': 23456, 'runnerName': "Rock's Lad"}, {'selectionId': 34567, 'runnerName': 'Dusty Road'}]
+        monkeypatch.setattr(betbot_db.runner_repo, 'get_by_ids', lambda ids: [r for r in runners if r['selectionId'] in ids])
+        market = {'marketId': '1.1', 'marketStartTime': datetime(today.year, today.month, today.day, 14, 30),
+                  'event': {'venue': 'Ascot'}, 'runnerIds': [23456, 34567]}
+        other = {'marketId': '1.2', 'marketStartTime': datetime(today.year, today.month, today.day, 16, 0),
+                 'event': {'venue': 'Ascot'}, 'runnerIds': []}
+        source = self.get_source([FakeResponse(200, load_fixture('fast_results.html')), FakeResponse(304)])
+        assert source.poll([market, other]) == {'1.1': 23456}
+        assert source.poll([market]) == {'1.1': 23456}  # results of an unchanged page are kept
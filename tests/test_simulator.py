@@ -0,0 +1,116 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from context import betfair
+numpy = pytest.importorskip('numpy')
+pytest.importorskip('pymongo')  # the backtest package imports betbot_db
+pytest.importorskip('dateutil')
+os.environ.setdefault('MONGODB_URI', 'mongodb://localhost:27017/betbot')  # never connected to
+from backtest import simulator
+
+PRICES = [1.5, 1.8, 2.0, 2.5, 3.0, 4.0]
+
+
+def races(prices, wins):
+    """a single path of one day of races, or of several days given lists of lists"""
+    prices = numpy.array(prices, dtype=float)
+    wins = numpy.array(wins, dtype=bool)
+    if prices.ndim == 1:
+        prices, wins = prices[None, :], wins[None, :]
+    return prices[None, :], wins[None, :]
+
+
+class TestLadder(object):
+    def test_climbs_and_resets_the_stake_ladder(self):
+        prices, wins = races([2.0] * 5, [False, False, False, False, True])
+        pnl = simulator.simulate_ladder(prices, wins, [1, 2, 4], [1], minimum_stake=2.0, stake_multiplier=1.0)
+        # A loss at the top of the ladder resets it.
+        assert pnl[0, 0].tolist() == [-2.0, -4.0, -8.0, -2.0, 4.0]
+
+    def test_races_outside_the_price_band_are_not_played(self):
+        prices, wins = races([2.0, 5.0, 2.5], [False, False, True])
+        pnl = simulator.simulate_ladder(prices, wins, [1, 2, 4], [1], 2.0, 3.0, minimum_stake=2.0,
+                                        stake_multiplier=1.0)
+        assert pnl[0, 0].tolist() == [-2.0, 0.0, 6.0]
+
+    def test_weights_up_after_a_losing_day(self):
+        prices, wins = races([[2.0, 2.0], [2.0, 2.0]], [[False, False], [True, False]])
+        pnl = simulator.simulate_ladder(prices, wins, [1, 2], [1, 3], minimum_stake=1.0, stake_multiplier=1.0)
+        assert pnl[0].tolist() == [[-1.0, -2.0], [3.0, -3.0]]
+
+    def test_weight_update_is_lost_when_the_first_race_is_not_played(self):
+        prices, wins = races([[2.0, 2.0], [5.0, 2.0]], [[False, False], [False, True]])
+        pnl = simulator.simulate_ladder(prices, wins, [1, 2], [1, 3], 2.0, 3.0, minimum_stake=1.0,
+                                        stake_multiplier=1.0)
+        assert pnl[0].tolist() == [[-1.0, -2.0], [0.0, 1.0]]
+
+
+class TestOdds(object):
+    def test_stops_after_the_bet_following_the_last_allowed_loss(self):
+        prices, wins = races([1.5] * 4, [False] * 4)
+        pnl = simulator.simulate_odds(prices, wins, [1], 2.0, 2, minimum_stake=2.0)
+        # Stakes recover the day's lost stakes: (2 + 0.5) / 0.5 = 5, then (7 + 0.5) / 0.5 = 15.
+        assert pnl[0, 0].tolist() == [-2.0, -5.0, -15.0, 0.0]
+
+    def test_stop_loss_is_lifted_the_next_day(self):
+        prices, wins = races([[1.5] * 4, [1.5] * 4], [[False] * 4, [True, False, False, False]])
+        pnl = simulator.simulate_odds(prices, wins, [1, 2], 2.0, 2, minimum_stake=2.0)
+        # Weighted up after the losing day, the lost stakes recovered include the weighting: (4 + 0.5) / 0.5 x 2.
+        assert pnl[0, 1].tolist() == [2.0, -4.0, -18.0, -90.0]
+
+    def test_only_backs_odds_on_favourites(self):
+        prices, wins = races([2.0, 1.5], [True, True])
+        pnl = simulator.simulate_odds(prices, wins, [1], 2.0, 3, minimum_stake=2.0)
+        assert pnl[0, 0].tolist() == [0.0, 1.0]
+
+
+class TestGroup(object):
+    def test_stops_the_group_after_a_win_and_reverts_unplayed_races(self):
+        prices, wins = races([2.0, 5.0, 2.0, 2.0, 2.0, 2.0], [False, False, True, False, False, False])
+        pnl = simulator.simulate_group(prices, wins, [1, 2, 4], 10.0)
+        # The 5.0 race doesn't move the group on, the win stops it until the next group starts.
+        assert pnl[0, 0].tolist() == [-10.0, 0.0, 20.0, 0.0, -10.0, -20.0]
+
+
+class TestAgainstBacktest(object):
+    """the simulators against the strategy classes driven through the backtest engine"""
+    def get_history(self, prices=None, wins=None):
+        from backtest.engine import History
+        start_date = datetime(2018, 3, 5)
+        markets, winners, books = {}, {}, []
+        paths, days, races_per_day = prices.shape
+        for day in range(days):
+            for race in range(races_per_day):
+                start_time = start_date + timedelta(days=day, hours=12, minutes=30 * race)
+                market_id = '1.%s%02d' % (day, race)
+                markets[market_id] = {'marketId': market_id, 'marketStartTime': start_time, 'marketName': 'R%s' % race,
+                                      'event': {'venue': 'Ascot'}}
+                books.append({'marketId': market_id, 'snapshotTime': start_time - timedelta(seconds=40),
+                              'status': 'OPEN', 'inplay': False, 'runners': [
+                                  self.get_runner(1, float(prices[0, day, race])), self.get_runner(2, 10.0)]})
+                winners[market_id] = 1 if wins[0, day, race] else 2
+        return History(start_date, start_date + timedelta(days=days), markets, winners, books)
+
+    @staticmethod
+    def get_runner(selection_id=0, price=0.0):
+        levels = [{'price': price, 'size': 100000.0}]
+        return {'selectionId': selection_id, 'status': 'ACTIVE', 'lastPriceTraded': price,
+                'ex': {'availableToBack': levels, 'availableToLay': levels}}
+
+    def test_matches_the_strategies(self):
+        import backtest
+        rng = numpy.random.RandomState(3)
+        prices = numpy.array(PRICES)[rng.randint(0, len(PRICES), size=(1, 4, 10))]
+        wins = rng.uniform(size=prices.shape) < 0.45
+        result = backtest.Backtest().run(history=self.get_history(prices, wins))
+        simulated = {
+            'ABS1': simulator.simulate_ladder(prices, wins),
+            'B12S1': simulator.simulate_ladder(prices, wins, price_min=2.0, price_max=3.0),
+            'BOS1': simulator.simulate_odds(prices, wins),
+            'G5B12': simulator.simulate_group(prices, wins)
+        }
+        for strategy_ref, pnl in simulated.items():
+            bets = [pytest.approx(profit) for date, profit in result.deltas(result.curves[strategy_ref])]
+            assert pnl[pnl != 0].tolist() == bets, strategy_ref
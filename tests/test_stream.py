@@ -0,0 +1,92 @@
+import json
+import os
+import socket
+import threading
+from time import sleep
+
+from context import betfair
+from betfair.stream import MarketStream
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class FakeAPI(object):
+    app_key = 'APP_KEY'
+    session_token = 'SESSION_TOKEN'
+
+
+class ReplayServer(threading.Thread):
+    """local stand-in for the stream api, replays recorded messages to one client"""
+    def __init__(self, filename):
+        threading.Thread.__init__(self, daemon=True)
+        with open(os.path.join(FIXTURES, filename)) as f:
+            self.lines = [line.strip() for line in f if line.strip()]
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.requests = []
+        self.done = threading.Event()
+
+    def send(self, conn, msg):
+        conn.sendall((msg + '\r\n').encode('utf-8'))
+
+    def run(self):
+        conn, _ = self.server.accept()
+        reader = conn.makefile('rb')
+        self.send(conn, json.dumps({'op': 'connection', 'connectionId': '001-replay'}))
+        for _ in range(2):  # authentication then marketSubscription
+            request = json.loads(reader.readline().decode('utf-8'))
+            self.requests.append(request)
+            self.send(conn, json.dumps({'op': 'status', 'id': request['id'], 'statusCode': 'SUCCESS'}))
+        for line in self.lines:
+            self.send(conn, line)
+        self.done.set()
+        sleep(1)
+        conn.close()
+        self.server.close()
+
+
+class TestMarketStream(object):
+    def replay(self, filename):
+        server = ReplayServer(filename)
+        server.start()
+        books = []
+        stream = MarketStream(FakeAPI(), {'marketIds': ['1.150000001']}, host='127.0.0.1', port=server.port,
+                              use_ssl=False, listener=books.append)
+        stream.start()
+        server.done.wait(5)
+        sleep(0.2)
+        stream.stop()
+        return server, stream, books
+
+    def test_authenticates_and_subscribes(self):
+        server, stream, books = self.replay('stream_replay.txt')
+        assert server.requests[0]['op'] == 'authentication'
+        assert server.requests[0]['session'] == 'SESSION_TOKEN'
+        assert server.requests[1]['op'] == 'marketSubscription'
+        assert server.requests[1]['marketFilter'] == {'marketIds': ['1.150000001']}
+        assert stream.initial_clk == 'AAA='
+        assert stream.clk == 'AAF='
+
+    def test_applies_deltas_to_ladder(self):
+        server, stream, books = self.replay('stream_replay.txt')
+        assert len(books) == 4  # heartbeats don't publish a book
+        book = stream.get_market_book('1.150000001')
+        assert book['status'] == 'SUSPENDED'
+        assert book['inplay'] is True
+        runners = {runner['selectionId']: runner for runner in book['runners']}
+        assert runners[101]['ex']['availableToBack'] == [{'price': 2.48, 'size': 75.0}, {'price': 2.46, 'size': 100.0}]
+        assert runners[101]['lastPriceTraded'] == 2.48
+        assert runners[102]['ex']['availableToBack'][0] == {'price': 3.55, 'size': 5.0}
+        assert runners[102]['ex']['availableToLay'] == [{'price': 3.65, 'size': 25.0}]
+        assert runners[103]['status'] == 'REMOVED'
+
+    def test_books_match_list_market_book_shape(self):
+        server, stream, books = self.replay('stream_replay.txt')
+        first = books[0]
+        favourite = min(first['runners'], key=lambda r: r['lastPriceTraded'])
+        assert favourite['selectionId'] == 101
+        assert [r['selectionId'] for r in first['runners']] == [101, 102, 103]
+        lay_prices = [level['price'] for level in favourite['ex']['availableToLay']]
+        assert lay_prices == sorted(lay_prices)
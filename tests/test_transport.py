@@ -0,0 +1,79 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from context import betfair
+requests = pytest.importorskip('requests')
+from betfair.transport import Transport
+
+BETTING_URL = 'https://api.betfair.com/exchange/betting/json-rpc/v1'
+ACCOUNT_URL = 'https://api.betfair.com/exchange/account/json-rpc/v1'
+
+
+class FakeAdapter(requests.adapters.HTTPAdapter):
+    """answers every request itself, recording the session (by its adapter) that sent it"""
+    sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append((self, request.url))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{}'
+        response.url = request.url
+        response.request = request
+        return response
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTransport(object):
+    def setup_method(self, method):
+        FakeAdapter.sent = []
+
+    def get_transport(self, monkeypatch):
+        monkeypatch.setattr('betfair.transport.HTTPAdapter', FakeAdapter)
+        return Transport()
+
+    def test_same_endpoint_reuses_its_session(self, monkeypatch):
+        transport = self.get_transport(monkeypatch)
+        transport.send(BETTING_URL, '{"id": 1}')
+        transport.send(BETTING_URL, '{"id": 2}')
+        assert len(FakeAdapter.sent) == 2
+        assert FakeAdapter.sent[0][0] is FakeAdapter.sent[1][0]
+        assert FakeAdapter.sent[0][0] is transport.sessions['betting'].get_adapter(BETTING_URL)
+
+    def test_endpoints_have_their_own_sessions(self, monkeypatch):
+        transport = self.get_transport(monkeypatch)
+        transport.send(BETTING_URL, '{"id": 1}')
+        transport.send(ACCOUNT_URL, '{"id": 2}')
+        assert FakeAdapter.sent[0][0] is not FakeAdapter.sent[1][0]
+        assert transport.sessions['betting'] is not transport.sessions['account']
+        stats = transport.get_stats()
+        assert stats['betting']['requests'] == 1 and stats['account']['requests'] == 1
+        assert stats['identitysso']['requests'] == 0
+
+    def test_counts_handshakes_and_reused_connections(self):
+        server = HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        transport = Transport()
+        try:
+            for i in range(3):
+                transport.send('http://127.0.0.1:%s/' % server.server_port, '{"id": %s}' % i)
+            assert transport.get_stats()['other'] == {'requests': 3, 'handshakes': 1, 'reused': 2}
+        finally:
+            transport.close()
+            server.shutdown()
+            server.server_close()
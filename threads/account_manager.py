@@ -27,10 +27,7 @@ class AccountManager(threading.Thread):
         self.logger.info('Started Account Manager...')
         while True:
             try:
-                self.logger.info("Refreshing account funds.")
-                account_funds = self.api.get_account_funds()
-                betbot_db.account_funds_repo.upsert(account_funds)
-                sleep(10 * 60)
+                sleep(self.tick())
             except Exception as exc:
                 msg = traceback.format_exc()
                 http_err = 'ConnectionError:'
@@ -38,3 +35,9 @@ class AccountManager(threading.Thread):
                     msg = '%s%s' % (http_err, msg.rpartition(http_err)[2])
                 self.logger.error('Account Manager Crashed: %s' % msg)
                 sleep(1 * 60)  # Wait for 1 minute before attempting to log in again.
+
+    def tick(self):
+        self.logger.info("Refreshing account funds.")
+        account_funds = self.api.get_account_funds()
+        betbot_db.account_funds_repo.upsert(account_funds)
+        return 10 * 60
@@ -19,43 +19,17 @@ logger.addHandler(ch)
 # If less than 60 seconds after, or prior to, a played market try again in 5 minutes.
 # This avoids a race condition that could cause a market to be played twice.
 class MarketManager(threading.Thread):
-    def __init__(self, api):
+    def __init__(self, api, scheduler=None):
         threading.Thread.__init__(self)
         self.api = api
+        self.scheduler = scheduler
         self.logger = logging.getLogger('MARKM')
 
     def run(self):
         self.logger.info('Started Market Manager...')
         while True:
             try:
-                if self.market_recently_played():
-                    self.logger.info('Skipping market refresh due to last played market proximity.')
-                    # Refresh in 5 minutes.
-                    sleep(5 * 60)
-                else:
-                    self.logger.info('Refreshing the list of markets.')
-                    params = {
-                       'filter': {
-                           'eventTypeIds': ['7'],  # horse racing
-                           'marketTypeCodes': ['WIN'],
-                           'marketBettingTypes': ['ODDS'],
-                           'marketCountries': ['GB'],  # UK markets
-                           'turnInPlayEnabled': True,  # will go in-play
-                           'inPlayOnly': False  # market NOT currently in-play
-                       },
-                       'marketProjection': ['EVENT', 'RUNNER_DESCRIPTION', 'MARKET_START_TIME'],
-                       'maxResults': 1000,  # maximum allowed by Betfair
-                       'sort': 'FIRST_TO_START'  # order so the next market by start time comes first
-                    }
-                    markets = self.api.get_markets(params)
-                    if type(markets) is list:  # upsert into the DB
-                        self.logger.info('Retrieved %s markets.' % len(markets))
-                        for market in markets:
-                            betbot_db.market_repo.upsert(market)
-                    else:
-                        self.logger.error('Failed to retrieve markets: resp = %s' % markets)
-                    # Refresh in 15 minutes.
-                    sleep(15 * 60)
+                sleep(self.tick())
             except Exception as exc:
                 msg = traceback.format_exc()
                 http_err = 'ConnectionError:'
@@ -65,8 +39,39 @@ class MarketManager(threading.Thread):
                 # Wait for 1 minute before continuing.
                 sleep(1 * 60)
 
-    @staticmethod
-    def market_recently_played():
+    def tick(self):
+        if self.scheduler and not self.scheduler.has_markets():  # e.g. after a restart
+            self.scheduler.load(betbot_db.market_repo.get_upcoming())
+        if self.market_recently_played():
+            self.logger.info('Skipping market refresh due to last played market proximity.')
+            return 5 * 60  # Refresh in 5 minutes.
+        self.logger.info('Refreshing the list of markets.')
+        params = {
+           'filter': {
+               'eventTypeIds': ['7'],  # horse racing
+               'marketTypeCodes': ['WIN'],
+               'marketBettingTypes': ['ODDS'],
+               'marketCountries': ['GB'],  # UK markets
+               'turnInPlayEnabled': True,  # will go in-play
+               'inPlayOnly': False  # market NOT currently in-play
+           },
+           'marketProjection': ['EVENT', 'RUNNER_DESCRIPTION', 'MARKET_START_TIME'],
+           'maxResults': 1000,  # maximum allowed by Betfair
+           'sort': 'FIRST_TO_START'  # order so the next market by start time comes first
+        }
+        markets = self.api.get_markets(params)
+        if type(markets) is list:  # upsert into the DB
+            self.logger.info('Retrieved %s markets.' % len(markets))
+            betbot_db.market_repo.bulk_upsert(markets)
+            if self.scheduler:
+                self.scheduler.load(markets)
+        else:
+            self.logger.error('Failed to retrieve markets: resp = %s' % markets)
+        return 15 * 60  # Refresh in 15 minutes.
+
+    def market_recently_played(self):
+        if self.scheduler:
+            return self.scheduler.market_in_progress(60)
         last_market = betbot_db.market_repo.get_most_recently_played()
         if last_market:
             now = time()
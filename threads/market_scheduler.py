@@ -0,0 +1,139 @@
+import heapq
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from time import time
+
+import settings
+from strategies import helpers
+
+# Set up logging
+logger = logging.getLogger('MARKS')
+logger.setLevel(helpers.get_log_level())
+ch = logging.StreamHandler()
+ch.setLevel(helpers.get_log_level())
+formatter = logging.Formatter('(%(name)s) - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+
+def get_start_timestamp(market=None):
+    # Start times are naive UTC, whether parsed by betbot_db.parse_date or read back from MongoDB.
+    return market['marketStartTime'].replace(tzinfo=timezone.utc).timestamp()
+
+
+# Holds the start times of all upcoming markets in a heap and fires subscriber callbacks at fixed offsets
+# before each market starts (e.g. T-30s strategy fire, T-5s book watch), instead of every manager polling
+# MongoDB for the next market and sleeping. Markets are (re)loaded on every Market Manager refresh, and
+# loading wakes the scheduler so a late-added market is never missed.
+class MarketScheduler(threading.Thread):
+    def __init__(self, max_workers=None):
+        threading.Thread.__init__(self, name='MarketScheduler', daemon=True)
+        self.logger = logging.getLogger('MARKS')
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers or settings.scheduler_max_workers)
+        self.serial_executor = ThreadPoolExecutor(1)  # runs serial callbacks one market at a time
+        self.subscribers = []  # list of (seconds before market start, callback, serial)
+        self.markets = {}  # keys = market ids, vals = markets
+        self.scheduled = {}  # keys = (market id, offset), vals = fire time
+        self.fired = set()  # (market id, offset) already dispatched
+        self.heap = []  # (fire time, market id, offset)
+
+    def subscribe(self, offset=0, callback=None, serial=False):
+        """call callback(market) offset seconds before each market starts. Serial callbacks are never
+           run for two markets at the same time, e.g. when races at different meetings are due together.
+        """
+        with self.condition:
+            self.subscribers.append((offset, callback, serial))
+            for market_id in self.markets:
+                self.schedule(market_id, offset)
+            self.condition.notify()
+
+    def load(self, markets=None):
+        """add or update the given markets, markets that have already started are ignored"""
+        now = time()
+        with self.condition:
+            for market in markets:
+                if get_start_timestamp(market) <= now:
+                    continue
+                self.markets[market['marketId']] = market
+                for offset, callback, serial in self.subscribers:
+                    self.schedule(market['marketId'], offset)
+            self.condition.notify()
+        self.logger.info('Scheduling %s upcoming market(s).' % len(self.markets))
+
+    def has_markets(self):
+        with self.condition:
+            return len(self.markets) > 0
+
+    def schedule(self, market_id='', offset=0):
+        # Must be called holding the condition. A changed start time pushes a new entry and the old one is
+        # discarded when popped, as it no longer matches the scheduled fire time.
+        key = (market_id, offset)
+        if key in self.fired:
+            return
+        fire_time = get_start_timestamp(self.markets[market_id]) - offset
+        if self.scheduled.get(key) != fire_time:
+            self.scheduled[key] = fire_time
+            heapq.heappush(self.heap, (fire_time, market_id, offset))
+
+    def market_in_progress(self, grace=60):
+        """True if an event has fired for a market that started less than grace seconds ago"""
+        now = time()
+        with self.condition:
+            for market_id, offset in self.fired:
+                market = self.markets.get(market_id)
+                if market and now - get_start_timestamp(market) < grace:
+                    return True
+        return False
+
+    def pop_due(self):
+        # Must be called holding the condition. Returns the due (offset, market) events, and the
+        # seconds until the next event (None if there are none).
+        due = []
+        now = time()
+        while self.heap and self.heap[0][0] <= now:
+            fire_time, market_id, offset = heapq.heappop(self.heap)
+            key = (market_id, offset)
+            if self.scheduled.get(key) != fire_time:
+                continue  # superseded by a start time change
+            del self.scheduled[key]
+            self.fired.add(key)
+            due.append((offset, self.markets[market_id]))
+        wait = self.heap[0][0] - now if self.heap else None
+        return due, wait
+
+    def prune(self):
+        # Must be called holding the condition. Forgets markets that have been over for a while.
+        cutoff = time() - 60 * 60
+        for market_id in [k for k, v in self.markets.items() if get_start_timestamp(v) < cutoff]:
+            del self.markets[market_id]
+            self.fired = set(key for key in self.fired if key[0] != market_id)
+
+    def dispatch(self, callback=None, market=None):
+        try:
+            callback(market)
+        except Exception as exc:
+            msg = traceback.format_exc()
+            http_err = 'ConnectionError:'
+            if http_err in msg:
+                msg = '%s%s' % (http_err, msg.rpartition(http_err)[2])
+            self.logger.error('Scheduled callback for market %s crashed: %s' % (market['marketId'], msg))
+
+    def run(self):
+        self.logger.info('Started Market Scheduler...')
+        while True:
+            with self.condition:
+                due, wait = self.pop_due()
+                if not due:
+                    self.prune()
+                    self.condition.wait(wait)
+                    continue
+                subscribers = list(self.subscribers)
+            for offset, market in due:
+                for subscriber_offset, callback, serial in subscribers:
+                    if subscriber_offset == offset:
+                        executor = self.serial_executor if serial else self.executor
+                        executor.submit(self.dispatch, callback, market)
@@ -6,6 +6,8 @@ from datetime import datetime
 from strategies import helpers
 
 import betbot_db
+import betbot_cache
+from .statistics_manager import update_statistics
 
 # Set up logging
 logger = logging.getLogger('ORDEM')
@@ -30,9 +32,7 @@ class OrderManager(threading.Thread):
         self.logger.info('Started Order Manager...')
         while True:
             try:
-                self.process_live_instructions()
-                self.process_simulated_instructions()
-                sleep(20)
+                sleep(self.tick())
             except Exception as exc:
                 msg = traceback.format_exc()
                 http_err = 'ConnectionError:'
@@ -41,8 +41,21 @@ class OrderManager(threading.Thread):
                 self.logger.error('Order Manager Crashed: %s' % msg)
                 sleep(1 * 60)  # Wait for 1 minute before attempting to log in again.
 
+    def tick(self):
+        self.process_live_instructions()
+        self.process_simulated_instructions()
+        return 20
+
     def get_runner_book(self, market_id='', selection_id=''):
-        runner_book = betbot_db.runner_book_result_repo.get_recent_snapshot(selection_id)
+        # A book already held in memory (e.g. the CLOSED book captured by the market book watcher) is used first.
+        market_book = betbot_cache.market_book_cache.get(market_id)
+        if market_book:
+            for runner in market_book['runners']:
+                if runner['selectionId'] == selection_id:
+                    runner_book = dict(market_book)
+                    runner_book['runners'] = [runner]
+                    return runner_book
+        runner_book = betbot_db.runner_book_result_repo.get_recent_snapshot(market_id, selection_id)
         if not runner_book:
             runner_book = self.api.get_runner_book(market_id, selection_id)
             betbot_db.runner_book_result_repo.upsert(runner_book)
@@ -50,14 +63,14 @@ class OrderManager(threading.Thread):
 
     def get_outcome(self, market_id='', selection_id='', side='', simulated=False):
         indicative = False
-        winner = betbot_db.winners_repo.get_by_market(market_id)
+        winner = betbot_cache.winners_registry.get(market_id)
         runner_status = None
         if simulated:
             runner_book = self.get_runner_book(market_id, selection_id)
             runner_status = runner_book['runners'][0]['status']
-        if winner and not runner_status == 'WINNER' and not runner_status == 'LOSER':
+        if winner is not None and not runner_status == 'WINNER' and not runner_status == 'LOSER':
             indicative = True
-            if winner['selectionId'] == selection_id:
+            if winner == selection_id:
                 runner_status = 'WINNER'
             else:
                 runner_status = 'LOSER'
@@ -102,6 +115,7 @@ class OrderManager(threading.Thread):
         instructions = betbot_db.instruction_repo.get_active_simulated()
         if instructions:
             self.logger.info('Updating order(s) on %s SIMULATED active instruction(s).' % len(instructions))
+            orders = []
             for instruction in instructions:
                 market_id = instruction['marketId']
                 selection_id = instruction['instruction']['selectionId']
@@ -170,51 +184,20 @@ class OrderManager(threading.Thread):
                         'priceMatched': price,
                         'priceReduced': False,
                         'sizeSettled': size,
-                        'profit': self.calculate_profit(side, size, price, outcome['result']),
+                        'profit': helpers.calculate_profit(side, size, price, outcome['result']),
                         'customerStrategyRef': strategy_ref
                     }
-                betbot_db.order_repo.upsert([order])
-                if 'settledDate' in order:
-                    betbot_db.instruction_repo.set_settled([order])
-                    self.delta_update_statistics([order])
-
-    # TODO: Check calculation for LAY profit/loss
-    # TODO: Factor in Betfair commission including point reduction
-    def calculate_profit(self, side='', size=0.0, price=0.0, bet_outcome=''):
-        if side == "BACK":
-            if bet_outcome == 'WON':
-                return size * (price - 1.0)
-            else:  # LOST
-                return size * -1.0
-        else:  # side == 'LAY'
-            if bet_outcome == 'WON':
-                return size
-            else:
-                return size * price * -1
+                orders.append(order)
+            # Written in one bulk write and one update, as for live orders.
+            betbot_db.order_repo.upsert(orders)
+            cleared_orders = [order for order in orders if 'settledDate' in order]
+            if cleared_orders:
+                betbot_db.instruction_repo.set_settled(cleared_orders)
+                self.delta_update_statistics(cleared_orders)
 
     def delta_update_statistics(self, cleared_orders):
         self.logger.info('Doing a delta strategy statistics update.')
-        strategy_pnls = {}
-        for cleared_order in cleared_orders:
-            strategy_ref = cleared_order['customerStrategyRef']
-            if strategy_ref in strategy_pnls:
-                strategy_pnls[strategy_ref] += cleared_order['profit']
-            else:
-                strategy_pnls[strategy_ref] = cleared_order['profit']
-        total_statistic = betbot_db.statistic_repo.get_by_reference('TOTALS')
-        for strategy_ref, pnl in strategy_pnls.items():
-            statistics = betbot_db.statistic_repo.get_by_reference(strategy_ref)
-            if statistics['updatedDate'] < helpers.get_start_of_day():
-                statistics['dailyPnL'] = 0.0
-            statistics['dailyPnL'] += pnl
-            total_statistic['dailyPnL'] += pnl
-            statistics['weeklyPnL'] += pnl
-            total_statistic['weeklyPnL'] += pnl
-            statistics['monthlyPnL'] += pnl
-            total_statistic['monthlyPnL'] += pnl
-            statistics['yearlyPnL'] += pnl
-            total_statistic['yearlyPnL'] += pnl
-            statistics['lifetimePnL'] += pnl
-            total_statistic['lifetimePnL'] += pnl
-            betbot_db.statistic_repo.upsert(statistics)
-        betbot_db.statistic_repo.upsert(total_statistic)
+        betbot_cache.strategy_ledger.record(cleared_orders)
+        strategy_refs = betbot_db.pnl_ledger_repo.record(cleared_orders)
+        if strategy_refs:
+            update_statistics(strategy_refs)
@@ -1,6 +1,10 @@
+import csv
+import gzip
+import io
 import logging
 import threading
 import traceback
+from collections import OrderedDict
 from time import sleep, time
 from datetime import timedelta
 
@@ -17,46 +21,25 @@ formatter = logging.Formatter('(%(name)s) - %(message)s')
 ch.setFormatter(formatter)
 logger.addHandler(ch)
 
+REPORT_COLUMNS = ['PlacedDate', 'PlacedTime', 'SettledDate', 'SettledTime', 'Strategy', 'Market', 'Runner', 'Side',
+                  'Stake', 'Price', 'Outcome', 'PnL']
+# Number of daily reports kept in memory
+REPORT_CACHE_SIZE = 7
+
 
 class ReportManager(threading.Thread):
     def __init__(self, api):
         threading.Thread.__init__(self)
         self.logger = logging.getLogger('REPOM')
         self.api = api
+        self.next_report_time = helpers.get_tomorrow_start_of_day() + timedelta(hours=1)
+        self.reports = OrderedDict()  # keys = report days, vals = gzipped csv
 
     def run(self):
         self.logger.info('Started Report Manager...')
         while True:
             try:
-                now = time()
-                tomorrow1am = helpers.get_tomorrow_start_of_day() + timedelta(hours=1)
-                sleep(tomorrow1am.timestamp() - now)  # Wait until 01:00 tomorrow.
-                self.logger.info("Sending T-1 summary email.")
-                csv = "PlacedDate,PlacedTime,SettledDate,SettledTime,Strategy,Market,Runner,Side,Stake,Price,Outcome,PnL\n"
-                strategies = betbot_db.strategy_repo.get_all()
-                for strategy in strategies:
-                    strategy_ref = strategy['strategyRef']
-                    orders = betbot_db.order_repo.get_settled_yesterday_by_strategy(strategy_ref)
-                    for order in orders:
-                        market = betbot_db.market_repo.get_by_id(order['marketId'])
-                        runner = betbot_db.runner_repo.get_by_id(order['selectionId'])
-                        venue = market['event']['venue']
-                        race = market['marketName']
-                        market_name = "%s %s" % (venue, race)
-                        runner_name = runner['runnerName']
-                        placed = order['placedDate']
-                        settled = order['settledDate']
-                        placed_date = placed.strftime('%d-%b-%Y')
-                        placed_time = placed.strftime('%H:%M:%S')
-                        settled_date = settled.strftime('%d-%b-%Y')
-                        settled_time = settled.strftime('%H:%M:%S')
-                        side = order['side']
-                        size = order['sizeSettled']
-                        price = order['priceMatched']
-                        outcome = order['betOutcome']
-                        profit = order['profit']
-                        csv += "%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s\n" % (placed_date, placed_time, settled_date, settled_time, strategy_ref, market_name, runner_name, side, size, price, outcome, profit)
-                email.send_with_csv("", "SSS EOD Summary", csv)
+                sleep(self.tick())
             except Exception as exc:
                 msg = traceback.format_exc()
                 http_err = 'ConnectionError:'
@@ -64,3 +47,59 @@ class ReportManager(threading.Thread):
                     msg = '%s%s' % (http_err, msg.rpartition(http_err)[2])
                 self.logger.error('Report Manager Crashed: %s' % msg)
                 sleep(1 * 60)  # Wait for 1 minute before attempting to restart
+
+    def tick(self):
+        now = time()
+        if now < self.next_report_time.timestamp():
+            return self.next_report_time.timestamp() - now  # Wait until 01:00 tomorrow.
+        self.next_report_time = helpers.get_tomorrow_start_of_day() + timedelta(hours=1)
+        self.logger.info("Sending T-1 summary email.")
+        yesterday = helpers.get_start_of_day() - timedelta(days=1)
+        report = self.get_report(yesterday)
+        filename = "summary-%s.csv.gz" % yesterday.strftime('%Y-%m-%d')
+        email.send_with_gzip(self.get_pnl_summary(yesterday), "SSS EOD Summary", report, filename)
+        return self.next_report_time.timestamp() - time()
+
+    def get_report(self, day=None):
+        """returns the gzipped csv of the orders settled on the day, generated once per day"""
+        report = self.reports.get(day)
+        if report is None:
+            report = self.reports[day] = self.generate_report(day)
+            while len(self.reports) > REPORT_CACHE_SIZE:
+                self.reports.popitem(last=False)
+        return report
+
+    def generate_report(self, day=None):
+        # Rows are streamed from the database cursor through the csv writer into the compressed buffer.
+        buffer = io.BytesIO()
+        row_count = 0
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as gzip_file:
+            text_file = io.TextIOWrapper(gzip_file, encoding='utf-8', newline='')
+            writer = csv.writer(text_file, lineterminator='\n')
+            writer.writerow(REPORT_COLUMNS)
+            for order in betbot_db.order_repo.get_settled_report_rows(day, day + timedelta(days=1)):
+                placed = order['placedDate']
+                settled = order['settledDate']
+                market_name = "%s %s" % (order.get('venue', ''), order.get('marketName', ''))
+                writer.writerow([
+                    placed.strftime('%d-%b-%Y'), placed.strftime('%H:%M:%S'), settled.strftime('%d-%b-%Y'),
+                    settled.strftime('%H:%M:%S'), order['customerStrategyRef'], market_name.strip(),
+                    order.get('runnerName', ''), order['side'], order['sizeSettled'], order['priceMatched'],
+                    order['betOutcome'], order['profit']
+                ])
+                row_count += 1
+            text_file.flush()
+            text_file.detach()
+        self.logger.info("Generated the %s report, %s orders." % (day.strftime('%d-%b-%Y'), row_count))
+        return buffer.getvalue()
+
+    @staticmethod
+    def get_pnl_summary(day=None):
+        """the PnLs of every strategy as at the end of the day, i.e. Daily is the day's PnL"""
+        lines = ["PnL as at the end of %s" % day.strftime('%d-%b-%Y'), "Strategy,Daily,WTD,MTD,YTD,Lifetime"]
+        pnls = betbot_db.order_repo.get_period_pnls(date=day, end_date=day + timedelta(days=1))
+        for strategy_ref in sorted(pnls):
+            pnl = pnls[strategy_ref]
+            lines.append("%s,%.2f,%.2f,%.2f,%.2f,%.2f" % (strategy_ref, pnl['dailyPnL'], pnl['weeklyPnL'],
+                                                         pnl['monthlyPnL'], pnl['yearlyPnL'], pnl['lifetimePnL']))
+        return "\n".join(lines)
@@ -26,16 +26,16 @@ class SessionManager(threading.Thread):
         self.password = password
         self.api.app_key = app_key
         self.session = False
+        self.subscribers = []  # callbacks called after each successful login
+
+    def subscribe(self, callback=None):
+        self.subscribers.append(callback)
 
     def run(self):
         self.logger.info('Started Session Manager...')
         while True:
             try:
-                self.do_login()
-                sleep(1 * 60)  # Wait for 1 minute before triggering the keep alive loop.
-                while self.session:
-                    self.keep_alive()
-                    sleep(15 * 60)
+                sleep(self.tick())
             except Exception as exc:
                 msg = traceback.format_exc()
                 http_err = 'ConnectionError:'
@@ -44,6 +44,14 @@ class SessionManager(threading.Thread):
                 self.logger.error('Session Manager Crashed: %s' % msg)
                 sleep(1 * 60)  # Wait for 1 minute before attempting to log in again.
 
+    def tick(self):
+        # Logs in if there is no session, otherwise keeps it alive. Returns the seconds to wait before the next tick.
+        if not self.session:
+            self.do_login()
+            return 1 * 60  # Wait for 1 minute before triggering the keep alive loop.
+        self.keep_alive()
+        return 15 * 60
+
     def do_login(self):
         # Logs in to Betfair and sets session status; True on successful login, False otherwise.
         self.session = False
@@ -51,6 +59,8 @@ class SessionManager(threading.Thread):
         if resp == 'SUCCESS':
             self.logger.info('Logged into Betfair API-NG.')
             self.session = True
+            for callback in self.subscribers:
+                callback()
         else:
             self.logger.error('Failed to log into Betfair API-NG.')
             self.session = False
@@ -63,6 +73,7 @@ class SessionManager(threading.Thread):
         resp = self.api.keep_alive()
         if resp == 'SUCCESS':
             self.session = True
+            self.logger.info('Transport connection stats: %s' % self.api.get_transport_stats())
         else:
             self.session = False
             msg = 'api.keep_alive() resp = %s' % resp
@@ -2,13 +2,18 @@ import logging
 import threading
 import traceback
 import random
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, monotonic
 from datetime import datetime
 
 import betbot_db
-import strategies
+import betbot_cache
+import history
+import settings
 from comms import ChatManager
 from strategies import helpers
+from strategies.features import get_features
+from strategies.registry import StrategyRegistry
 
 # Set up logging
 logger = logging.getLogger('STRAM')
@@ -21,50 +26,21 @@ logger.addHandler(ch)
 
 
 class StrategyManager(threading.Thread):
-    def __init__(self, api, live_mode=False):
+    def __init__(self, api, book_batcher, live_mode=False):
         threading.Thread.__init__(self)
         self.logger = logging.getLogger('STRAM')
         self.api = api
+        self.book_batcher = book_batcher
         self.live_mode = live_mode
-        self.bet_all_strategy = strategies.BetAllStrategy()
-        self.lay_all_strategy = strategies.LayAllStrategy()
-        self.bet_12_strategy = strategies.Bet12Strategy()
-        self.bet_odds_strategy = strategies.BetOddsStrategy()
-        self.g5_bet_12_strategy = strategies.Group5Bet12Strategy()
+        self.strategy_registry = StrategyRegistry()
+        self.executor = ThreadPoolExecutor(settings.order_placement_workers)
 
     def run(self):
         self.logger.info('Started Strategy Manager...')
         self.logger.info('Strategy Manager is in %s mode!' % ('LIVE' if self.live_mode else 'SIMULATION'))
         while True:
             try:
-                next_market = betbot_db.market_repo.get_next_playable()
-                if next_market:
-                    name = next_market['marketName']
-                    venue = next_market['event']['venue']
-                    start_time = next_market['marketStartTime']
-                    self.logger.info('Next market is the %s %s at %s.' % (venue, name, start_time))
-                    now = datetime.utcnow()
-                    wait = (start_time - now).total_seconds()
-                    if wait < 0:  # "Next" market is in the past and can't be played
-                        msg = "%s %s has already started, skipping." % (venue, name)
-                        self.logger.warning(msg)
-                        betbot_db.market_repo.set_skipped(next_market, 'MARKET_IN_PAST')
-                    else:
-                        if wait < 30:  # Process the next market, less than a minute to go before start!
-                            strategy_bets = self.create_bets(next_market)
-                            if strategy_bets:
-                                self.logger.info('Generated bets on %s %s.' % (venue, name))
-                                self.logger.info(strategy_bets)
-                                self.place_bets(next_market, strategy_bets)
-                                betbot_db.market_repo.set_played(next_market)
-                            else:
-                                self.logger.info('No bets generated on %s %s, skipping.')
-                                betbot_db.market_repo.set_skipped(next_market, 'NO_BETS_CREATED')
-                        else:  # wait until a minute before the next market is due to start
-                            self.logger.info("Sleeping until 30 seconds before %s %s starts." % (venue, name))
-                            sleep(wait - 30)
-                else:  # No active markets so sleep to save CPU until some new markets appear.
-                    sleep(1 * 60)
+                sleep(self.tick())
             except Exception as exc:
                 msg = traceback.format_exc()
                 http_err = 'ConnectionError:'
@@ -73,29 +49,81 @@ class StrategyManager(threading.Thread):
                 self.logger.error('Strategy Manager Crashed: %s' % msg)
                 sleep(1 * 60)
 
+    def tick(self):
+        next_market = betbot_db.market_repo.get_next_playable()
+        if next_market:
+            name = next_market['marketName']
+            venue = next_market['event']['venue']
+            start_time = next_market['marketStartTime']
+            self.logger.info('Next market is the %s %s at %s.' % (venue, name, start_time))
+            now = datetime.utcnow()
+            wait = (start_time - now).total_seconds()
+            if wait < 30:  # Process the next market, less than a minute to go before start!
+                self.play_market(next_market)
+                return 0
+            else:  # wait until a minute before the next market is due to start
+                self.logger.info("Sleeping until 30 seconds before %s %s starts." % (venue, name))
+                return wait - 30
+        else:  # No active markets so sleep to save CPU until some new markets appear.
+            return 1 * 60
+
+    def on_market_due(self, market=None):
+        # Called by the market scheduler shortly before the market starts.
+        market = betbot_db.market_repo.get_by_id(market['marketId'])
+        if market and 'played' not in market:
+            self.play_market(market)
+
+    def play_market(self, market=None):
+        name = market['marketName']
+        venue = market['event']['venue']
+        wait = (market['marketStartTime'] - datetime.utcnow()).total_seconds()
+        if wait < 0:  # "Next" market is in the past and can't be played
+            msg = "%s %s has already started, skipping." % (venue, name)
+            self.logger.warning(msg)
+            betbot_db.market_repo.set_skipped(market, 'MARKET_IN_PAST')
+            return
+        strategy_bets = self.create_bets(market)
+        if strategy_bets:
+            self.logger.info('Generated bets on %s %s.' % (venue, name))
+            self.logger.info(strategy_bets)
+            self.place_bets(market, strategy_bets)
+            betbot_db.market_repo.set_played(market)
+        else:
+            self.logger.info('No bets generated on %s %s, skipping.')
+            betbot_db.market_repo.set_skipped(market, 'NO_BETS_CREATED')
+
     def get_market_book(self, market_id=''):
-        market_book = betbot_db.market_book_repo.get_recent_snapshot(market_id)
+        market_book = betbot_cache.market_book_cache.get(market_id)
         if not market_book:
-            market_book = self.api.get_market_book(market_id)
-            betbot_db.market_book_repo.insert(market_book)
+            market_book = self.fetch_market_book(market_id)
+        return market_book
+
+    def fetch_market_book(self, market_id=''):
+        # One listMarketBook refreshes the market book and the runner book of every runner in it.
+        market_book = self.book_batcher.get_market_book(market_id)
+        betbot_cache.market_book_cache.put(market_book)
+        runner_books = betbot_cache.runner_book_cache.put_market_book(market_book)
+        betbot_db.market_book_repo.insert_async(market_book)
+        history.record_async(market_book)
+        betbot_db.runner_book_repo.bulk_upsert_async(runner_books)
         return market_book
 
     def get_runner_book(self, market_id='', selection_id=''):
-        runner_book = betbot_db.runner_book_repo.get_recent_snapshot(selection_id)
+        runner_book = betbot_cache.runner_book_cache.get(market_id, selection_id)
+        if not runner_book:
+            runner_book = betbot_db.runner_book_repo.get_recent_snapshot(market_id, selection_id)
         if not runner_book:
-            runner_book = self.api.get_runner_book(market_id, selection_id, ['EX_ALL_OFFERS'])
-            betbot_db.runner_book_repo.upsert(runner_book)
+            self.fetch_market_book(market_id)
+            runner_book = betbot_cache.runner_book_cache.get(market_id, selection_id)
+        if not runner_book:
+            msg = 'Failed to get runner book for selection %s in market %s.' % (selection_id, market_id)
+            raise Exception(msg)
         return runner_book
 
     def create_bets(self, market=None):
         market_book = self.get_market_book(market['marketId'])
-        return {
-            self.bet_all_strategy.reference: self.bet_all_strategy.create_bets(market, market_book),
-            self.lay_all_strategy.reference: self.lay_all_strategy.create_bets(market, market_book),
-            self.bet_12_strategy.reference: self.bet_12_strategy.create_bets(market, market_book),
-            self.bet_odds_strategy.reference: self.bet_odds_strategy.create_bets(market, market_book),
-            self.g5_bet_12_strategy.reference: self.g5_bet_12_strategy.create_bets(market, market_book)
-        }
+        get_features(market_book)  # derived once here, every strategy reads the memoized features
+        return self.strategy_registry.evaluate(market, market_book)
 
     def determine_price(self, side='', size=0.0, runner_book=None):
         runner = runner_book['runners'][0]
@@ -111,54 +139,92 @@ class StrategyManager(threading.Thread):
         venue = market['event']['venue']
         name = market['marketName']
         if market_bets:
-            for strategy_ref, strategy_bets in market_bets.items():
-                live_strategy = betbot_db.strategy_repo.is_live(strategy_ref)
-                retry_count = 0
-                while len(strategy_bets) > 0:  # Some orders may not execute first time around.
-                    # Set limit order prices as this may be an order re-submission.
-                    for strategy_bet in strategy_bets:
-                        runner_book = self.get_runner_book(market['marketId'], strategy_bet['selectionId'])
-                        size = strategy_bet['limitOrder']['size']
-                        side = strategy_bet['side']
-                        strategy_bet['limitOrder']['price'] = self.determine_price(side, size, runner_book)
-                    # Place bets via the Betfair API (or simulate it).
-                    if self.live_mode and live_strategy:
-                        resp = self.api.place_bets(market['marketId'], strategy_bets, strategy_ref)
-                    else:
-                        resp = self.simulate_place_bets(market, strategy_bets, strategy_ref)
-                    # Evaluate the API response.
-                    if type(resp) is dict and 'status' in resp:
-                        if resp['status'] == 'SUCCESS':
-                            # Check for execution and persist.
-                            success_refs = []
-                            for instruction in resp['instructionReports']:
-                                # If the order didn't execute, mark the instruction as settled immediately.
-                                if 'orderStatus' in instruction and instruction['orderStatus'] == 'EXECUTION_COMPLETE':
-                                    instruction['settled'] = False
-                                    success_refs.append(instruction['instruction']['customerOrderRef'])
-                                else:  # Fill-or-Kill Limit Order EXPIRED so nothing to settle.
-                                    instruction['settled'] = True
-                                # Add the strategy reference for display purposes.
-                                instruction['customerStrategyRef'] = strategy_ref
-                                betbot_db.instruction_repo.insert(market, instruction)
-                            # Remove any instructions that have executed, leaving any that EXPIRED.
-                            strategy_bets = [x for x in strategy_bets if x['customerOrderRef'] not in success_refs]
-                            self.logger.info('Successfully placed %s bet(s) on %s %s.' % (strategy_ref, venue, name))
-                        else:
-                            self.logger.error(
-                                'Failed to place %s bet(s) on %s %s. (Error: %s)' %
-                                (strategy_ref, venue, name, resp['errorCode']))
-                            # Set the market as skipped, it's too late to try again.
-                            betbot_db.market_repo.set_skipped(market, resp['errorCode'])
-                    else:
-                        msg = 'Failed to place %s bet(s) on %s %s - resp = %s' % (strategy_ref, venue, name, resp)
-                        raise Exception(msg)
-                    retry_count += 1
-                    if retry_count == 5:
-                        self.logger.warn("Failed to place one or more %s bets 5 times, giving up." % strategy_ref)
-                        break
-                    # Throttle order re-submissions.
-                    sleep(1)
+            started = monotonic()
+            error_codes = []  # of the placeOrders that failed, the market is set skipped once all are done
+            errors = []
+            if settings.parallel_order_placement:
+                # One job per strategy, so each strategy has at most one placeOrders in flight.
+                futures = {
+                    strategy_ref: self.executor.submit(self.place_strategy_bets, market, strategy_ref, strategy_bets)
+                    for strategy_ref, strategy_bets in market_bets.items()
+                }
+                for strategy_ref, future in futures.items():
+                    try:
+                        error_codes.extend(future.result())
+                    except Exception as exc:
+                        self.logger.error('Failed to place %s bet(s) on %s %s: %s' % (strategy_ref, venue, name, exc))
+                        errors.append(exc)
+            else:
+                for strategy_ref, strategy_bets in market_bets.items():
+                    error_codes.extend(self.place_strategy_bets(market, strategy_ref, strategy_bets))
+            if error_codes:
+                betbot_db.market_repo.set_skipped(market, error_codes[-1])
+            if errors:
+                raise errors[0]
+            self.logger.info('Placed all bets on %s %s in %.3fs.' % (venue, name, monotonic() - started))
+
+    def place_strategy_bets(self, market=None, strategy_ref='', strategy_bets=None):
+        """place (and retry) the bets of a single strategy on a given market, returns the error codes of
+           the placeOrders that failed. The market is only read, strategies may be placing concurrently.
+        """
+        venue = market['event']['venue']
+        name = market['marketName']
+        started = monotonic()
+        error_codes = []
+        live_strategy = betbot_db.strategy_repo.is_live(strategy_ref)
+        retry_count = 0
+        while len(strategy_bets) > 0:  # Some orders may not execute first time around.
+            # Set limit order prices as this may be an order re-submission.
+            for strategy_bet in strategy_bets:
+                runner_book = self.get_runner_book(market['marketId'], strategy_bet['selectionId'])
+                size = strategy_bet['limitOrder']['size']
+                side = strategy_bet['side']
+                strategy_bet['limitOrder']['price'] = self.determine_price(side, size, runner_book)
+            # Place bets via the Betfair API (or simulate it).
+            submitted = monotonic()
+            if self.live_mode and live_strategy:
+                resp = self.api.place_bets(market['marketId'], strategy_bets, strategy_ref)
+            else:
+                resp = self.simulate_place_bets(market, strategy_bets, strategy_ref)
+            self.logger.info('%s placeOrders on %s %s took %.3fs (submitted %.3fs after start, attempt %s).' %
+                             (strategy_ref, venue, name, monotonic() - submitted, submitted - started,
+                              retry_count + 1))
+            # Evaluate the API response.
+            if type(resp) is dict and 'status' in resp:
+                if resp['status'] == 'SUCCESS':
+                    # Check for execution and persist.
+                    success_refs = []
+                    for instruction in resp['instructionReports']:
+                        # If the order didn't execute, mark the instruction as settled immediately.
+                        if 'orderStatus' in instruction and instruction['orderStatus'] == 'EXECUTION_COMPLETE':
+                            instruction['settled'] = False
+                            success_refs.append(instruction['instruction']['customerOrderRef'])
+                        else:  # Fill-or-Kill Limit Order EXPIRED so nothing to settle.
+                            instruction['settled'] = True
+                        # Add the strategy reference for display purposes.
+                        instruction['customerStrategyRef'] = strategy_ref
+                        betbot_db.instruction_repo.insert(market, instruction)
+                    # Remove any instructions that have executed, leaving any that EXPIRED.
+                    strategy_bets = [x for x in strategy_bets if x['customerOrderRef'] not in success_refs]
+                    self.logger.info('Successfully placed %s bet(s) on %s %s.' % (strategy_ref, venue, name))
+                else:
+                    self.logger.error(
+                        'Failed to place %s bet(s) on %s %s. (Error: %s)' %
+                        (strategy_ref, venue, name, resp['errorCode']))
+                    # The market is set as skipped, it's too late to try again.
+                    error_codes.append(resp['errorCode'])
+            else:
+                msg = 'Failed to place %s bet(s) on %s %s - resp = %s' % (strategy_ref, venue, name, resp)
+                raise Exception(msg)
+            retry_count += 1
+            if retry_count == 5:
+                self.logger.warn("Failed to place one or more %s bets 5 times, giving up." % strategy_ref)
+                break
+            # Throttle order re-submissions.
+            sleep(1)
+        self.logger.info('%s bet placement on %s %s finished in %.3fs.' % (strategy_ref, venue, name,
+                                                                            monotonic() - started))
+        return error_codes
 
     def simulate_place_bets(self, market=None, strategy_bets=None, strategy_ref=''):
         self.logger.debug('Simulating receipt of instruction reports.')